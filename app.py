@@ -1,14 +1,19 @@
 import streamlit as st
 import os
+import json
+import hashlib
 import time
-from PIL import Image
 from tqdm import tqdm
 
 try:
     from src.vision_expert import VisionExpert
     from src.db_manager import DBManager
-    from src.llm_client import LLMClient
-    from src.file_handler import extract_text_from_pdf, move_file_to_category
+    from src.llm_client import LLMClient, AsyncLLMClient
+    from src.paper_ingest import INDEXED, MOVED, EMPTY, FAILED
+    from src.ingest_pipeline import IngestPipeline
+    from src.file_handler import format_page_span
+    from src.config import Config
+    from src.profiling import PROFILER
 except ImportError as e:
     st.error(f"❌ 导入模块失败: {e}")
     st.stop()
@@ -42,18 +47,28 @@ def load_models():
     llm = LLMClient()
     return vision, db, llm
 
+@st.cache_resource
+def load_async_llm():
+    # 批量分类用的异步客户端 (并发 + 限速 + 重试)
+    return AsyncLLMClient()
+
 # 加载模型
 with st.sidebar:
     st.write("系统状态检测...")
     try:
         vision_expert, db_manager, llm_client = load_models()
-        st.success("✅ 全系统模型已就绪")
+        st.success("✅ 系统已就绪 (模型按需加载)")
         st.session_state.agent_loaded = True
         
         st.divider()
         st.info(f"📂 知识库路径: {os.path.abspath('./data/chroma_db')}")
         st.info(f"🖼️ 视觉模型: Florence-2-Large")
         st.info(f"🧠 推理模型: Qwen-2.5") 
+
+        with st.expander("📊 查询缓存"):
+            for name, stats in db_manager.cache_stats().items():
+                st.caption(f"{name}: 命中 {stats['hits']} / 未命中 {stats['misses']} "
+                           f"(命中率 {stats['hit_rate']:.0%}, {stats['size']}/{stats['maxsize']} 条)")
     except Exception as e:
         st.error(f"模型加载失败: {e}")
         st.stop()
@@ -105,73 +120,66 @@ with tab_knowledge:
                     status_text = st.empty()
                     log_area = st.container() # 用于显示日志
                     
-                    processed_count = 0
-                    
-                    for i, file_path in enumerate(pdf_files):
+                    # 计数放在本次运行自己的对象里: 脚本每次交互都会重跑，模块级全局变量还会被所有会话共享
+                    progress = {"done": 0}
+
+                    def on_result(file_path, status, category, detail):
+                        progress["done"] += 1
                         filename = os.path.basename(file_path)
-                        status_text.text(f"正在处理: {filename} ...")
-                        
-                        try:
-                            # 1. 提取文本
-                            chunks = extract_text_from_pdf(file_path)
-                            if not chunks:
-                                continue
-                                
-                            # 2. LLM 分类
-                            first_page = chunks[0]['text']
-                            category = llm_client.classify_paper(first_page, topics_str)
-                            
-                            # 3. 移动文件
-                            new_path = move_file_to_category(file_path, category)
-                            
-                            # 4. 存入向量库
-                            db_manager.add_paper_chunks(new_path, chunks, category)
-                            
-                            # 5. UI 反馈
-                            with log_area:
+                        status_text.text(f"已处理: {filename} ...")
+                        # UI 反馈
+                        with log_area:
+                            if status == INDEXED:
                                 st.success(f"✅ {filename} -> 📂 **{category}** (已入库)")
-                            
-                            processed_count += 1
-                        except Exception as e:
-                            st.error(f"处理 {filename} 失败: {e}")
-                        
+                            elif status == MOVED:
+                                st.info(f"🔁 {filename} -> 📂 **{category}** (已入库论文，仅更新路径)")
+                            elif status == EMPTY:
+                                st.warning(f"⚠️ {filename} 未提取到文本")
+                            elif status == FAILED:
+                                st.error(f"处理 {filename} 失败: {detail}")
+                            else:
+                                st.info(f"♻️ {filename} 已在知识库中，跳过")
                         # 更新进度条
-                        progress_bar.progress((i + 1) / len(pdf_files))
-                    
+                        progress_bar.progress(progress["done"] / len(pdf_files))
+
+                    # 解析 / 分类 / 编码 三个阶段流水线并行
+                    IngestPipeline(db_manager, load_async_llm(), topics_str, on_result=on_result).run(pdf_files)
+
                     status_text.text("🎉 处理完成！")
                     st.balloons()
 
     elif k_mode == "语义检索 (RAG Search)":
         st.markdown("#### 🧠 知识库问答")
         query = st.text_input("请输入学术问题:", placeholder="例如: Transformer 的自注意力机制是如何工作的？")
+        use_rerank = st.checkbox("🎯 交叉编码器重排 (更准，略慢)", value=Config.RERANK_ENABLED)
         
         if st.button("🔍 搜索并回答"):
             if query:
                 with st.spinner("正在检索向量数据库并生成回答..."):
                     # 1. 检索
-                    results = db_manager.search_papers(query, n_results=3)
+                    results = db_manager.search_papers(query, n_results=Config.CONTEXT_CHUNKS, rerank=use_rerank)
                     
                     if not results['ids'][0]:
                         st.warning("📭 知识库中没有找到相关内容。")
                     else:
-                        # 2. 构建上下文
-                        context_str = ""
                         st.markdown("### 📄 参考来源")
                         for i in range(len(results['ids'][0])):
                             meta = results['metadatas'][0][i]
                             text = results['documents'][0][i]
                             score = 1 - results['distances'][0][i]
                             
-                            with st.expander(f"来源 {i+1}: {os.path.basename(meta['source'])} (Page {meta['page']}) - 相关度 {score:.2f}"):
+                            with st.expander(f"来源 {i+1}: {os.path.basename(meta['source'])} (Page {format_page_span(meta)}) - 相关度 {score:.2f}"):
                                 st.write(text)
                                 st.caption(f"分类: {meta['category']}")
-                            
-                            context_str += f"文档: {meta['source']} (Page {meta['page']})\n内容: {text}\n\n"
-                        
+
+                        # 2. 构建上下文: 按 token 预算挑选最相关的句子，去重并保留引用
+                        built = db_manager.build_context(query, results)
+                        with st.expander(f"🧾 发送给 LLM 的上下文 ({built['sentences']} 句 / 约 {built['tokens']} tokens)"):
+                            st.text(built['context'])
+
                         # 3. LLM 回答
                         st.markdown("### 🤖 AI 回答")
-                        answer = llm_client.chat_with_context(query, context_str)
-                        st.write(answer)
+                        st.write_stream(llm_client.stream_chat_with_context(query, built['context']))
 
 # --- TAB 2: 视觉功能 (核心修改区域) ---
 with tab_vision:
@@ -184,17 +192,15 @@ with tab_vision:
         with col_img:
             uploaded_file = st.file_uploader("上传图片", type=["jpg", "png", "webp", "jpeg"])
             if uploaded_file:
-                image = Image.open(uploaded_file)
-                st.image(image, caption="预览", use_container_width=True)
-                
-                # 保存临时文件供模型读取路径
-                temp_path = f"temp_{uploaded_file.name}"
-                image.save(temp_path)
-                
-                # 换图片时清空缓存
-                if 'last_img' not in st.session_state or st.session_state.last_img != uploaded_file.name:
+                # 上传内容只保存在本会话内存中，按内容哈希识别，不写临时文件
+                image_bytes = uploaded_file.getvalue()
+                image_key = hashlib.sha256(image_bytes).hexdigest()
+                st.image(image_bytes, caption="预览", use_container_width=True)
+
+                # 换图片时清空缓存 (同名的不同图片也能区分)
+                if st.session_state.get('last_img') != image_key:
                     st.session_state.img_description = None
-                    st.session_state.last_img = uploaded_file.name
+                    st.session_state.last_img = image_key
         
         with col_desc:
             if uploaded_file:
@@ -203,7 +209,7 @@ with tab_vision:
                 if st.button("📝 生成描述"):
                     with st.spinner("Florence-2 正在观察图片细节..."):
                         # 使用 MORE_DETAILED_CAPTION 生成最详细的文本
-                        res = vision_expert.analyze_image(temp_path, prompt_type="<MORE_DETAILED_CAPTION>")
+                        res = vision_expert.analyze_image(image_bytes, prompt_type="<MORE_DETAILED_CAPTION>")
                         st.session_state.img_description = res # 存入缓存
                         st.success("分析完成")
                         st.info(res)
@@ -217,14 +223,17 @@ with tab_vision:
                 user_q = st.text_input("问图片一个问题:", placeholder="这只羊是什么颜色的？/ What is this?")
                 
                 if st.button("❓ 提问"):
-                    # 1. 确保有全局描述
-                    if not st.session_state.img_description:
-                        with st.spinner("👀 AI 正在阅读图片全局内容..."):
-                            st.session_state.img_description = vision_expert.analyze_image(temp_path, prompt_type="<MORE_DETAILED_CAPTION>")
+                    # 全局描述与局部细节一次完成：图片只编码一次，已分析过的任务直接命中缓存
+                    tasks = ["<MORE_DETAILED_CAPTION>"]
+                    if user_q:
+                        tasks.append("<DENSE_REGION_CAPTION>")
+                    with st.spinner("👀 AI 正在阅读图片并搜集细节..."):
+                        results = vision_expert.analyze_image_tasks(image_bytes, tasks)
+                    st.session_state.img_description = results[0]
                     
                     if user_q:
-                        with st.spinner("🧠 AI 正在搜集细节并思考..."):
-                            dense_data = vision_expert.analyze_image(temp_path, prompt_type="<DENSE_REGION_CAPTION>")
+                        with st.spinner("🧠 AI 正在思考..."):
+                            dense_data = results[1]
                             
                             # 解析密集描述的数据 (它返回的是字典或者字符串)
                             dense_text = ""
@@ -244,10 +253,8 @@ with tab_vision:
                             {dense_text}
                             """
                             
-                            answer = llm_client.chat_with_context(user_q, context)
-                            
                             st.markdown("### 🤖 回答:")
-                            st.success(answer)
+                            st.write_stream(llm_client.stream_chat_with_context(user_q, context))
                             
                             with st.expander("查看 AI 看到的完整视觉信息"):
                                 st.text(context)
@@ -258,27 +265,27 @@ with tab_vision:
         # 索引构建工具
         with st.expander("⚙️ 索引管理 (如果搜不到图，请先点这里)"):
             img_dir = st.text_input("图片文件夹路径:", value="./images")
+            force_rebuild = st.checkbox("强制全部重新编码 (忽略增量清单)")
             if st.button("🔄 重建图片索引"):
-                count = 0
-                image_exts = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
                 progress = st.progress(0)
-                files = []
-                for root, _, fs in os.walk(img_dir):
-                    for f in fs:
-                        if os.path.splitext(f)[1].lower() in image_exts:
-                            files.append(os.path.join(root, f))
-                
-                for i, path in enumerate(files):
-                    db_manager.add_image_embedding(path)
-                    progress.progress((i+1)/len(files))
-                    count += 1
-                st.success(f"已索引 {count} 张图片！")
+                stats = db_manager.sync_images(
+                    img_dir,
+                    force=force_rebuild,
+                    progress_callback=lambda done, total: progress.progress(done / total)
+                )
+                st.success(f"新索引 {stats['indexed']} 张，未变化 {stats['unchanged']} 张，移除 {stats['removed']} 张。")
+                for path, err in stats['failed']:
+                    st.error(f"❌ {os.path.basename(path)}: {err}")
 
         # 搜索界面
         search_q = st.text_input("描述你要找的画面:", placeholder="一只在睡觉的猫")
+        search_mode = st.radio("检索方式:", ["CLIP 图像向量", "Florence-2 描述 (需先运行 describe_images)"], horizontal=True)
         if st.button("🖼️ 搜索图片"):
             if search_q:
-                results = db_manager.search_images(search_q)
+                if search_mode.startswith("CLIP"):
+                    results = db_manager.search_images(search_q)
+                else:
+                    results = db_manager.search_captions(search_q)
                 if not results['ids'][0]:
                     st.warning("未找到匹配图片。")
                 else:
@@ -287,5 +294,37 @@ with tab_vision:
                         img_path = results['ids'][0][i]
                         score = 1 - results['distances'][0][i]
                         if os.path.exists(img_path):
-                            cols[i % 3].image(img_path, caption=f"匹配度: {score:.2f}")
-                            cols[i % 3].caption(os.path.basename(img_path))
\ No newline at end of file
+                            # 卡片只显示缩略图，原图不必整张解码、传给浏览器
+                            shown = db_manager.image_cache.thumbnail(img_path) if db_manager.image_cache else img_path
+                            cols[i % 3].image(shown, caption=f"匹配度: {score:.2f}")
+                            cols[i % 3].caption(os.path.basename(img_path))
+
+# ==========================================
+# 4. 侧边栏：性能剖析 (放在最后渲染，包含本次交互的耗时)
+# ==========================================
+with st.sidebar.expander("⏱️ 性能剖析"):
+    rows = PROFILER.summary()
+    if not rows:
+        st.caption("暂无记录，执行一次入库或检索后再查看。")
+    else:
+        st.dataframe(
+            [{
+                "阶段": r["span"],
+                "次数": r["count"],
+                "总耗时(s)": round(r["total_s"], 3),
+                "平均(ms)": round(r["mean_ms"], 1),
+                "p95(ms)": round(r["p95_ms"], 1),
+                "条数": r["items"],
+                "条/秒": round(r["items_per_sec"], 1),
+                "峰值内存(MB)": round(r["peak_rss_mb"], 1),
+            } for r in rows],
+            hide_index=True,
+            use_container_width=True
+        )
+        st.download_button("下载 JSON", json.dumps(PROFILER.to_dict(), ensure_ascii=False, indent=2),
+                           file_name="profile.json", mime="application/json")
+        st.download_button("下载 Prometheus 指标", PROFILER.prometheus_text(),
+                           file_name="profile.prom", mime="text/plain")
+        if st.button("清空统计"):
+            PROFILER.reset()
+            st.rerun()
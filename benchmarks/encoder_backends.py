@@ -0,0 +1,164 @@
+"""
+对比 fp32 与 int8 (动态量化) 推理后端下 MiniLM / CLIP 的编码吞吐与检索召回。
+召回率以 fp32 的 top-k 结果为基准: recall@k = |int8 top-k ∩ fp32 top-k| / k。
+
+    python -m benchmarks.encoder_backends --texts 2000 --images 256 --threads 4
+    python -m benchmarks.encoder_backends --corpus my_chunks.txt --image-dir images/
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+
+VOCAB = (
+    "attention transformer convolution gradient descent policy reward graph neural network "
+    "embedding retrieval diffusion segmentation detection language vision robot control "
+    "optimization benchmark dataset pretraining contrastive latent variational sparse kernel"
+).split()
+
+
+def synthetic_texts(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(VOCAB) for _ in range(rng.randint(8, 40))) for _ in range(n)]
+
+
+def synthetic_images(n, seed=0):
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    images = []
+    for _ in range(n):
+        image = Image.new("RGB", (320, 240), tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(2, 8)):
+            x0, y0 = rng.randrange(300), rng.randrange(220)
+            box = (x0, y0, x0 + rng.randint(10, 120), y0 + rng.randint(10, 120))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=color)
+        images.append(image)
+    return images
+
+
+def load_lines(path, limit):
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    return lines[:limit]
+
+
+def load_images(directory, limit):
+    from src.image_loader import list_image_files, load_image_rgb
+    return [load_image_rgb(p, 224) for p in list_image_files(directory)[:limit]]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def top_k(queries, corpus, k):
+    import torch
+    scores = torch.as_tensor(queries) @ torch.as_tensor(corpus).T
+    return scores.topk(min(k, scores.shape[1]), dim=1).indices.tolist()
+
+
+def recall_at_k(reference, candidate):
+    hits = sum(len(set(r) & set(c)) for r, c in zip(reference, candidate))
+    return hits / sum(len(r) for r in reference)
+
+
+def run_backend(backend, texts, queries, images):
+    from src.db_manager import DBManager
+    Config.INFERENCE_BACKEND = backend
+    db = DBManager()
+
+    # 预热 (同时完成模型加载与 int8 偏差检查)，不计入计时
+    db.text_model.encode(texts[:8])
+    db._embed_images(images[:2])
+
+    def encode_texts():
+        return db.text_model.encode(texts, batch_size=Config.TEXT_ENCODE_BATCH_SIZE, normalize_embeddings=True)
+
+    def encode_queries():
+        return [db.text_model.encode([q], normalize_embeddings=True)[0] for q in queries]
+
+    def embed_images():
+        embeddings = []
+        for i in range(0, len(images), Config.IMAGE_BATCH_SIZE):
+            embeddings.extend(db._embed_images(images[i:i + Config.IMAGE_BATCH_SIZE]))
+        return embeddings
+
+    def clip_queries():
+        return db._clip_features(db.clip_model, texts=queries)
+
+    text_emb, text_time = timed(encode_texts)
+    query_emb, query_time = timed(encode_queries)
+    image_emb, image_time = timed(embed_images)
+    clip_query_emb, clip_query_time = timed(clip_queries)
+
+    metrics = {
+        "text_chunks_per_sec": len(texts) / text_time,
+        "text_query_ms": query_time / len(queries) * 1000,
+        "images_per_sec": len(images) / image_time,
+        "clip_queries_per_sec": len(queries) / clip_query_time,
+    }
+    embeddings = {
+        "text": ([list(map(float, e)) for e in query_emb], [list(map(float, e)) for e in text_emb]),
+        "image": (clip_query_emb, image_emb),
+    }
+    return metrics, embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="fp32 vs int8 encoder throughput and recall")
+    parser.add_argument("--texts", type=int, default=2000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--images", type=int, default=256, help="Synthetic image count")
+    parser.add_argument("--corpus", default=None, help="Text file, one chunk per line (replaces synthetic texts)")
+    parser.add_argument("--image-dir", default=None, help="Image directory (replaces synthetic images)")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=0, help="torch threads, 0 = default")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file")
+    args = parser.parse_args()
+
+    Config.TORCH_THREADS = args.threads
+    Config.QUANT_DRIFT_CHECK = True
+    texts = load_lines(args.corpus, args.texts) if args.corpus else synthetic_texts(args.texts)
+    queries = synthetic_texts(args.queries, seed=1)
+    images = load_images(args.image_dir, args.images) if args.image_dir else synthetic_images(args.images)
+
+    report = {"texts": len(texts), "queries": len(queries), "images": len(images), "k": args.k, "backends": {}}
+    results = {}
+    for backend in ("fp32", "int8"):
+        print(f"⏳ 正在测试 {backend} ...")
+        metrics, embeddings = run_backend(backend, texts, queries, images)
+        results[backend] = embeddings
+        report["backends"][backend] = metrics
+
+    for name in ("text", "image"):
+        reference = top_k(*results["fp32"][name], args.k)
+        candidate = top_k(*results["int8"][name], args.k)
+        report["backends"]["int8"][f"{name}_recall_at_{args.k}"] = recall_at_k(reference, candidate)
+
+    fp32, int8 = report["backends"]["fp32"], report["backends"]["int8"]
+    print(f"\n{'指标':<24}{'fp32':>12}{'int8':>12}{'加速比':>10}")
+    for key in ("text_chunks_per_sec", "images_per_sec", "clip_queries_per_sec"):
+        print(f"{key:<24}{fp32[key]:>12.1f}{int8[key]:>12.1f}{int8[key] / fp32[key]:>9.2f}x")
+    print(f"{'text_query_ms':<24}{fp32['text_query_ms']:>12.2f}{int8['text_query_ms']:>12.2f}"
+          f"{fp32['text_query_ms'] / int8['text_query_ms']:>9.2f}x")
+    for name in ("text", "image"):
+        print(f"int8 {name} recall@{args.k}: {int8[f'{name}_recall_at_{args.k}']:.3f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"📝 结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
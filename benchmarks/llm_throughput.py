@@ -0,0 +1,71 @@
+"""
+对比同步 LLMClient 与 AsyncLLMClient (批量 prompt) 的分类吞吐与请求数
+(使用本地桩服务，不访问真实 API)。
+
+    python -m benchmarks.llm_throughput --papers 200 --latency 0.2 --error-rate 0.05 --batch-size 8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.config import Config
+from benchmarks.stub_llm_server import start_stub_server
+
+TOPICS = "Computer Vision, NLP, Reinforcement Learning, Robotics"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM classification throughput against a local stub server")
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=Config.LLM_CONCURRENCY)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Requests per second, 0 = unlimited")
+    parser.add_argument("--batch-size", type=int, default=Config.CLASSIFY_BATCH_SIZE,
+                        help="Papers packed into one classification prompt (1 = one request per paper)")
+    parser.add_argument("--skip-sync", action="store_true")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency=args.latency, error_rate=args.error_rate)
+    Config.BASE_URL = url
+    Config.API_KEY = Config.API_KEY or "stub"
+    # 每次运行使用独立的缓存目录，避免命中分类缓存
+    Config.CACHE_DIR = tempfile.mkdtemp(prefix="llm_bench_")
+
+    from src.llm_client import LLMClient, AsyncLLMClient
+
+    snippets = [f"Paper {i}: a study of attention models for task {i}." for i in range(args.papers)]
+
+    if not args.skip_sync:
+        client = LLMClient()
+        start = time.perf_counter()
+        for s in snippets:
+            client.classify_paper("sync " + s, TOPICS)
+        elapsed = time.perf_counter() - start
+        print(f"🐢 同步客户端: {args.papers / elapsed:.1f} 篇/秒 ({elapsed:.2f}s)")
+
+    client = AsyncLLMClient(concurrency=args.concurrency, rate_limit=args.rate_limit)
+
+    async def run():
+        try:
+            return await client.classify_papers(["async " + s for s in snippets], TOPICS, batch_size=args.batch_size)
+        finally:
+            await client.aclose()
+
+    requests_before = server.RequestHandlerClass.stats['requests']
+    start = time.perf_counter()
+    labels = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for label in labels if label == "Uncategorized")
+    print(f"🚀 异步客户端: {args.papers / elapsed:.1f} 篇/秒 ({elapsed:.2f}s)，"
+          f"未分类 {failed} 篇，服务端请求 {server.RequestHandlerClass.stats['requests'] - requests_before} 次")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
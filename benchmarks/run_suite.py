@@ -0,0 +1,300 @@
+"""
+入库与检索基准测试套件，完全离线、只用 CPU:
+合成 PDF / 图片 + 确定性替身编码器 (benchmarks/stub_models.py) + 本地桩 LLM 服务。
+
+度量: PDF 解析 pages/sec、chunk 编码入库 chunks/sec、图片索引 images/sec、向量库 upsert 吞吐、
+流水线入库 papers/sec，以及不同语料规模下检索延迟的 p50/p95/p99。
+结果写成 JSON (附带当前 git 提交)，便于跨提交对比。
+
+    python -m benchmarks.run_suite --sizes 1000,10000,50000 --output bench.json
+    python -m benchmarks.run_suite --backend numpy --skip-llm
+    python -m benchmarks.run_suite --real-models      # 换成真实的 MiniLM / CLIP
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import platform
+import argparse
+import tempfile
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from src.config import Config
+from benchmarks.synthetic import make_pdfs, make_images, make_chunks, random_queries, term_queries
+
+TOPICS = "Computer Vision, NLP, Reinforcement Learning, Robotics"
+
+
+def git_info():
+    def run(*cmd):
+        return subprocess.run(cmd, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    try:
+        return {"commit": run("git", "rev-parse", "HEAD"), "dirty": bool(run("git", "status", "--porcelain"))}
+    except Exception:
+        return {"commit": None, "dirty": None}
+
+
+def latency_stats(latencies):
+    """
+    延迟列表 (秒) -> 毫秒分位数 (nearest-rank)
+    """
+    values = sorted(latencies)
+
+    def pct(p):
+        return values[min(len(values) - 1, max(0, round(p / 100 * len(values)) - 1))] * 1000
+
+    return {
+        "count": len(values),
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+    }
+
+
+def isolate(root):
+    """
+    所有持久化数据都写到 root 下，不碰真实的 ./data
+    """
+    Config.DB_PATH = os.path.join(root, "chroma_db")
+    Config.VECTOR_STORE_DIR = os.path.join(root, "vector_store")
+    Config.LEXICAL_INDEX_PATH = os.path.join(root, "lexical_index.db")
+    Config.IMAGE_MANIFEST_PATH = os.path.join(root, "image_manifest.db")
+    Config.STORE_GENERATION_PATH = os.path.join(root, "store_generation.db")
+    Config.CACHE_DIR = os.path.join(root, "cache")
+
+
+def new_db(args, root):
+    isolate(root)
+    if args.real_models:
+        from src.db_manager import DBManager
+        return DBManager()
+    from benchmarks.stub_models import StubDBManager
+    return StubDBManager()
+
+
+def bench_pdf_extraction(pdf_paths):
+    from src.file_handler import extract_text_from_pdf, iter_pdf_pages
+    start = time.perf_counter()
+    pages = sum(1 for path in pdf_paths for _ in iter_pdf_pages(path))
+    page_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    papers = [(path, extract_text_from_pdf(path)) for path in pdf_paths]
+    chunk_time = time.perf_counter() - start
+    chunks = sum(len(c) for _, c in papers)
+    return {
+        "pdfs": len(pdf_paths),
+        "pages": pages,
+        "pages_per_sec": pages / page_time,
+        "chunks": chunks,
+        "chunk_pdfs_per_sec": len(pdf_paths) / chunk_time,
+    }, papers
+
+
+def bench_paper_embedding(db, papers):
+    batch = [
+        {"file_path": path, "chunks": chunks, "category": "Synthetic", "doc_hash": f"bench{i}"}
+        for i, (path, chunks) in enumerate(papers)
+    ]
+    chunks = sum(len(p["chunks"]) for p in batch)
+    start = time.perf_counter()
+    for i in range(0, len(batch), 16):
+        db.add_paper_batch(batch[i:i + 16])
+    elapsed = time.perf_counter() - start
+    return {"chunks": chunks, "chunks_per_sec": chunks / elapsed}
+
+
+def bench_upsert(db, count, dim=512, batch_size=1000):
+    rng = random.Random(0)
+    store = db.open_store("bench_upsert")
+    start = time.perf_counter()
+    for i in range(0, count, batch_size):
+        n = min(batch_size, count - i)
+        store.upsert(
+            ids=[f"v{i + j}" for j in range(n)],
+            embeddings=[[rng.gauss(0, 1) for _ in range(dim)] for _ in range(n)],
+            metadatas=[{"source": f"s{(i + j) % 10}"} for j in range(n)],
+        )
+    elapsed = time.perf_counter() - start
+    return {"vectors": count, "dim": dim, "vectors_per_sec": count / elapsed}
+
+
+def bench_images(db, image_dir, count):
+    start = time.perf_counter()
+    stats = db.sync_images(image_dir)
+    elapsed = time.perf_counter() - start
+    # 第二次扫描: 全部命中清单，衡量增量扫描的固定开销
+    start = time.perf_counter()
+    db.sync_images(image_dir)
+    rescan = time.perf_counter() - start
+    return {
+        "images": count,
+        "indexed": stats["indexed"],
+        "images_per_sec": stats["indexed"] / elapsed,
+        "rescan_sec": rescan,
+    }
+
+
+def bench_ingest_pipeline(db, pdf_paths, work_dir, latency):
+    from benchmarks.stub_llm_server import start_stub_server
+    from src.ingest_pipeline import IngestPipeline
+    from src.llm_client import AsyncLLMClient
+
+    # 流水线会把论文移动到分类目录，先复制一份
+    ingest_dir = os.path.join(work_dir, "ingest")
+    os.makedirs(ingest_dir, exist_ok=True)
+    files = [shutil.copy(p, ingest_dir) for p in pdf_paths]
+
+    server, url = start_stub_server(latency=latency)
+    Config.BASE_URL = url
+    Config.API_KEY = Config.API_KEY or "stub"
+    try:
+        start = time.perf_counter()
+        stats = IngestPipeline(db, AsyncLLMClient(rate_limit=0), TOPICS).run(files)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+    return {"papers": len(files), "papers_per_sec": len(files) / elapsed, "llm_latency_sec": latency, "status": stats}
+
+
+def bench_queries(args, size, queries, work_dir):
+    db = new_db(args, os.path.join(work_dir, f"corpus_{size}"))
+    papers = make_chunks(size, seed=size)
+    start = time.perf_counter()
+    for i in range(0, len(papers), 100):
+        db.add_paper_batch(papers[i:i + 100])
+    build_time = time.perf_counter() - start
+
+    rng = random.Random(size)
+    store = db.image_collection
+    for i in range(0, size, 1000):
+        n = min(1000, size - i)
+        store.upsert(
+            ids=[f"img{i + j}.jpg" for j in range(n)],
+            embeddings=[[rng.gauss(0, 1) for _ in range(512)] for _ in range(n)],  # CLIP ViT-B/32 维度
+            metadatas=[{"source": f"img{i + j}.jpg"} for j in range(n)],
+        )
+
+    def measure(fn, queries=queries):
+        fn(queries[0])  # 预热
+        latencies = []
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            latencies.append(time.perf_counter() - start)
+        return latency_stats(latencies)
+
+    result = {"corpus_chunks": size, "build_chunks_per_sec": size / build_time}
+    # 混合检索的对照: 纯向量 top-3，以及用户为弥补漏召回而调大的 top-HYBRID_CANDIDATES
+    terms = term_queries(len(queries), len(papers), seed=size)
+    hybrid = Config.HYBRID_SEARCH
+    try:
+        Config.HYBRID_SEARCH = True
+        result["papers_hybrid"] = measure(lambda q: db.search_papers(q, n_results=3, rerank=False))
+        result["papers_hybrid_terms"] = measure(lambda q: db.search_papers(q, n_results=3, rerank=False), terms)
+        Config.HYBRID_SEARCH = False
+        result["papers_vector"] = measure(lambda q: db.search_papers(q, n_results=3, rerank=False))
+        result["papers_vector_wide"] = measure(
+            lambda q: db.search_papers(q, n_results=Config.HYBRID_CANDIDATES, rerank=False)
+        )
+    finally:
+        Config.HYBRID_SEARCH = hybrid
+    result["images"] = measure(lambda q: db.search_images(q, n_results=3))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline ingestion and query benchmark suite")
+    parser.add_argument("--pdfs", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=8, help="Pages per synthetic PDF")
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--upserts", type=int, default=20000)
+    parser.add_argument("--sizes", default="1000,10000,50000", help="Comma separated corpus sizes (chunks)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backend", choices=["chroma", "numpy"], default=None, help="Vector store backend")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Stub LLM latency per request (s)")
+    parser.add_argument("--skip-llm", action="store_true", help="Skip the end-to-end pipeline stage")
+    parser.add_argument("--real-models", action="store_true", help="Use the real encoders instead of stubs")
+    parser.add_argument("--output", default=None, help="JSON report path (default: bench-<commit>.json)")
+    args = parser.parse_args()
+
+    if args.backend:
+        Config.VECTOR_BACKEND = args.backend
+    # 关闭进程内查询缓存，每次检索都真实执行
+    Config.QUERY_EMBED_CACHE_SIZE = 0
+    Config.QUERY_RESULT_CACHE_SIZE = 0
+
+    work_dir = tempfile.mkdtemp(prefix="lma_bench_")
+    report = {
+        **git_info(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "args": vars(args),
+        "config": {
+            "vector_backend": Config.VECTOR_BACKEND,
+            "inference_backend": Config.INFERENCE_BACKEND,
+            "chunk_max_tokens": Config.CHUNK_MAX_TOKENS,
+            "text_encode_batch_size": Config.TEXT_ENCODE_BATCH_SIZE,
+            "image_batch_size": Config.IMAGE_BATCH_SIZE,
+        },
+        "results": {},
+    }
+    results = report["results"]
+
+    try:
+        print("📄 生成合成 PDF 与图片...")
+        pdf_paths = make_pdfs(os.path.join(work_dir, "pdfs"), args.pdfs, pages_per_pdf=args.pages)
+        image_dir = os.path.join(work_dir, "images")
+        make_images(image_dir, args.images)
+
+        print("⏱️ PDF 解析...")
+        results["pdf_extraction"], papers = bench_pdf_extraction(pdf_paths)
+
+        db = new_db(args, os.path.join(work_dir, "ingest_db"))
+        print("⏱️ chunk 编码入库...")
+        results["paper_embedding"] = bench_paper_embedding(db, papers)
+        print("⏱️ 向量库 upsert...")
+        results["upsert"] = bench_upsert(db, args.upserts)
+        print("⏱️ 图片索引...")
+        results["image_indexing"] = bench_images(db, image_dir, args.images)
+
+        if not args.skip_llm:
+            print("⏱️ 流水线入库 (桩 LLM 服务)...")
+            pipeline_db = new_db(args, os.path.join(work_dir, "pipeline_db"))
+            results["ingest_pipeline"] = bench_ingest_pipeline(pipeline_db, pdf_paths, work_dir, args.llm_latency)
+
+        queries = random_queries(args.queries)
+        results["queries"] = []
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            print(f"⏱️ 检索延迟 (语料 {size} 个 chunk)...")
+            results["queries"].append(bench_queries(args, size, queries, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # 每列为 p50 / p99 (ms)；"向量×N" 为纯向量检索取 HYBRID_CANDIDATES 个结果
+    columns = [
+        ("混合", "papers_hybrid"), ("混合(术语)", "papers_hybrid_terms"),
+        ("向量", "papers_vector"), (f"向量×{Config.HYBRID_CANDIDATES}", "papers_vector_wide"), ("图片", "images"),
+    ]
+    print(f"\n{'语料':>8}" + "".join(f"{title:>16}" for title, _ in columns))
+    for q in results["queries"]:
+        print(f"{q['corpus_chunks']:>8}" + "".join(
+            f"{q[key]['p50_ms']:>8.2f}/{q[key]['p99_ms']:<7.2f}" for _, key in columns
+        ))
+
+    output = args.output or f"bench-{(report['commit'] or 'unknown')[:10]}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"📝 结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
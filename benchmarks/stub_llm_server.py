@@ -0,0 +1,178 @@
+"""
+本地 OpenAI 兼容的桩服务，只实现 /v1/chat/completions。
+用于在没有真实 API 的情况下测试 LLM 客户端的并发、限速、重试与流式输出。
+
+    python -m benchmarks.stub_llm_server --port 8765 --latency 0.2 --error-rate 0.1
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 python main.py ...
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TOPICS_RE = re.compile(r"类别之一：(.*?)。")
+_BATCH_DOC_RE = re.compile(r"^\s*\[(\d+)\]\s*\n\s*(.*?)\.\.\.$", re.M)
+
+
+def _pick_topic(topics, text):
+    return topics[zlib.crc32(text.strip().encode("utf-8")) % len(topics)]
+
+
+def _fake_answer(prompt):
+    """
+    分类请求: 根据摘要内容确定性地选一个类别 (批量请求返回 JSON)；其他请求: 返回固定回答
+    """
+    match = _TOPICS_RE.search(prompt)
+    if match:
+        topics = [t.strip() for t in match.group(1).split(',') if t.strip()]
+        if topics:
+            docs = _BATCH_DOC_RE.findall(prompt)
+            if docs:
+                return json.dumps({num: _pick_topic(topics, text) for num, text in docs}, ensure_ascii=False)
+            snippet = prompt.split("论文摘要：", 1)[-1].rsplit("...", 1)[0]
+            return _pick_topic(topics, snippet)
+    return "根据现有文档，这是一个来自本地桩服务的模拟回答。"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    error_rate = 0.0
+    answer_fn = staticmethod(_fake_answer)
+    stats = {"requests": 0, "errors": 0}
+    _stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        with self._stats_lock:
+            self.stats["requests"] += 1
+
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            with self._stats_lock:
+                self.stats["errors"] += 1
+            status = random.choice([429, 500, 503])
+            self._send_json(status, {"error": {"message": "stub failure", "code": status}},
+                            headers={"Retry-After": "0"} if status == 429 else None)
+            return
+
+        messages = request.get("messages", [])
+        prompt = messages[-1]["content"] if messages else ""
+        answer = self.answer_fn(prompt)
+        model = request.get("model", "stub")
+        created = int(time.time())
+
+        if request.get("stream"):
+            self._stream(answer, model, created)
+            return
+
+        self._send_json(200, {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": len(prompt), "completion_tokens": len(answer),
+                      "total_tokens": len(prompt) + len(answer)}
+        })
+
+    def _stream(self, answer, model, created):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_event(payload):
+            data = f"data: {payload}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        for i in range(0, len(answer), 4):
+            write_event(json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": answer[i:i + 4]}, "finish_reason": None}]
+            }, ensure_ascii=False))
+        write_event(json.dumps({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]
+        }))
+        write_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def start_stub_server(host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, answer_fn=None):
+    """
+    在后台线程启动桩服务，返回 (server, base_url)。port=0 时自动分配端口。
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "latency": latency,
+        "error_rate": error_rate,
+        "stats": {"requests": 0, "errors": 0},
+        "_stats_lock": threading.Lock(),
+    })
+    if answer_fn:
+        handler.answer_fn = staticmethod(answer_fn)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for offline testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/5xx")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(args.host, args.port, args.latency, args.error_rate)
+    print(f"🧪 桩服务已启动: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
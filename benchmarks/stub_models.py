@@ -0,0 +1,67 @@
+"""
+确定性的轻量替身编码器: 不加载任何模型权重，只保留 DBManager 对编码器的调用方式，
+基准测试因此只度量解析、存储、索引与检索本身的开销。
+"""
+import zlib
+import types
+import numpy as np
+
+from src.db_manager import DBManager
+from src.lexical_index import tokenize
+
+
+def _hash_embed(texts, dim):
+    """
+    特征哈希词袋: 每个词按 crc32 映射到一个维度和符号，结果 L2 归一化。
+    共享词越多的文本越相似，检索结果有意义且完全可复现。
+    """
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for term in tokenize(text):
+            h = zlib.crc32(term.encode("utf-8"))
+            out[i, h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
+
+
+class StubTextEncoder:
+    """
+    与 SentenceTransformer.encode 调用方式一致
+    """
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def encode(self, sentences, batch_size=None, normalize_embeddings=False, **kwargs):
+        return _hash_embed(list(sentences), self.dim)
+
+
+class StubDBManager(DBManager):
+    """
+    DBManager 的替身子类: 文本模型换成 StubTextEncoder，CLIP 两个塔换成确定性投影，
+    向量库、词法索引、缓存与批处理逻辑全部沿用真实实现。
+    """
+
+    def __init__(self, text_dim=384, image_dim=512):
+        super().__init__()
+        self.image_dim = image_dim
+        self._text_model = StubTextEncoder(text_dim)
+        # 预先占位，DBManager 不会再去加载真实的 CLIP
+        self._clip_model = "stub"
+        self._clip_processor = types.SimpleNamespace(
+            image_processor=types.SimpleNamespace(size={"shortest_edge": 224})
+        )
+        rng = np.random.default_rng(0)
+        self._image_projection = rng.standard_normal((16 * 16 * 3, image_dim)).astype(np.float32)
+
+    def _clip_features(self, model, images=None, texts=None):
+        if images is None:
+            return _hash_embed(texts, self.image_dim).tolist()
+        # 缩成 16x16 缩略图后做固定随机投影
+        pixels = np.stack([
+            np.asarray(image.resize((16, 16)), dtype=np.float32).reshape(-1) / 255.0 for image in images
+        ])
+        features = pixels @ self._image_projection
+        features /= np.linalg.norm(features, axis=1, keepdims=True)
+        return features.tolist()
@@ -0,0 +1,147 @@
+"""
+基准测试用的合成数据: 不依赖任何 PDF 库的最小 PDF 写入器、随机文本与图片。
+同一 seed 生成的内容完全一致，不同提交之间的结果可以直接比较。
+"""
+import os
+import random
+
+VOCAB = (
+    "attention transformer convolution gradient descent policy reward graph neural network embedding "
+    "retrieval diffusion segmentation detection language vision robot control optimization benchmark "
+    "dataset pretraining contrastive latent variational sparse kernel encoder decoder token sequence "
+    "layer normalization dropout residual backbone feature pyramid anchor query key value softmax "
+    "LoRA BERT ResNet ViT CLIP PPO DQN GAN VAE BM25 RRF HNSW"
+).split()
+
+
+def random_words(rng, n):
+    return " ".join(rng.choice(VOCAB) for _ in range(n))
+
+
+def random_queries(n, seed=1):
+    rng = random.Random(seed)
+    return [random_words(rng, rng.randint(3, 8)) for _ in range(n)]
+
+
+def paper_tag(p):
+    """
+    每篇合成论文专有的"术语" (如模型名)，只出现在这篇论文的 chunk 里
+    """
+    return f"Net{p}"
+
+
+def term_queries(n, papers, seed=2):
+    """
+    常用词 + 一个论文专有术语，对应用户按精确术语检索的场景
+    """
+    rng = random.Random(seed)
+    return [f"{random_words(rng, rng.randint(2, 5))} {paper_tag(rng.randrange(papers))}" for _ in range(n)]
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, pages):
+    """
+    写出一个最小的合法 PDF: 每页若干行 Helvetica 文本。
+    pages: [[行文本, ...], ...]
+    """
+    objects = []  # 按对象编号顺序存放对象内容 (bytes)
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)  # 占位，等页面对象编号确定后再填
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    page_ids = []
+    for lines in pages:
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td"]
+        ops += [f"({_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", errors="replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>" % (pages_id, font_id, content_id)
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids).encode("ascii")
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+    objects[catalog_id - 1] = b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_pdfs(directory, count, pages_per_pdf=8, lines_per_page=45, seed=0):
+    """
+    生成 count 篇多页论文，返回文件路径列表
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        pages = [[random_words(rng, 12) for _ in range(lines_per_page)] for _ in range(pages_per_pdf)]
+        # 首行带上编号，保证每篇内容 (哈希) 不同
+        pages[0][0] = f"Synthetic paper {seed}-{i}"
+        path = os.path.join(directory, f"paper_{i:05d}.pdf")
+        write_pdf(path, pages)
+        paths.append(path)
+    return paths
+
+
+def make_images(directory, count, size=(640, 480), seed=0):
+    """
+    生成 count 张带随机色块的 JPEG，返回文件路径列表
+    """
+    from PIL import Image, ImageDraw
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(count):
+        image = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        draw = ImageDraw.Draw(image)
+        for _ in range(rng.randint(3, 10)):
+            x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+            box = (x0, y0, x0 + rng.randint(20, size[0] // 2), y0 + rng.randint(20, size[1] // 2))
+            color = tuple(rng.randrange(256) for _ in range(3))
+            (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=color)
+        path = os.path.join(directory, f"image_{i:05d}.jpg")
+        image.save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def make_chunks(count, seed=0, words=60):
+    """
+    直接生成 add_paper_batch 可用的论文列表 (每篇 10 个 chunk，均带该篇的专有术语)，跳过 PDF 解析，用于构建大语料
+    """
+    rng = random.Random(seed)
+    papers = []
+    for p in range((count + 9) // 10):
+        n = min(10, count - p * 10)
+        papers.append({
+            "file_path": f"synthetic/paper_{p:06d}.pdf",
+            "category": "Synthetic",
+            "doc_hash": f"synthetic{seed}_{p:06d}",
+            "chunks": [
+                {"text": f"{random_words(rng, words)} {paper_tag(p)}", "page": c + 1, "chunk": c} for c in range(n)
+            ],
+        })
+    return papers
@@ -1,36 +1,83 @@
 import argparse
+import json
 import os
+import time
 from tqdm import tqdm
+from src.config import Config
 from src.db_manager import DBManager
-from src.llm_client import LLMClient
 from src.vision_expert import VisionExpert
-from src.file_handler import extract_text_from_pdf, move_file_to_category
+from src.paper_ingest import INDEXED, MOVED, DUPLICATE, SKIPPED, EMPTY, FAILED
+from src.ingest_pipeline import IngestPipeline
+from src.file_handler import format_page_span
+from src.image_loader import list_image_files
+from src.profiling import PROFILER, span
+from src.agent_client import AgentConnection, RemoteDBManager, RemoteVisionExpert, RemoteLLMClient
+
+# 可转发给常驻服务的命令 (入库命令的写入也由服务执行，服务内的索引与缓存保持最新)
+REMOTE_COMMANDS = {
+    "add_paper", "search_paper", "search_image", "search_batch", "scan_images",
+    "describe_image", "describe_images", "ask_image",
+}
 
 def main():
     parser = argparse.ArgumentParser(description="Local Multimodal AI Agent (Ultimate Version)")
+    parser.add_argument("--no-server", action="store_true", help="Do not forward to a running agent server")
+    parser.add_argument("--profile", action="store_true", help="Print per-stage timings and write JSON / Prometheus reports")
+    parser.add_argument("--profile-out", default="profile", help="Report path prefix for --profile (PREFIX.json, PREFIX.prom)")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
+    # Command: serve (warm-model daemon)
+    serve_parser = subparsers.add_parser("serve", help="Run a long-lived server that keeps all models loaded")
+    serve_parser.add_argument("--host", default=None, help="Bind address (default from AGENT_SERVER_URL)")
+    serve_parser.add_argument("--port", type=int, default=None, help="Port (default from AGENT_SERVER_URL)")
+
+    # Command: migrate_store (copy collections between vector backends)
+    migrate_parser = subparsers.add_parser("migrate_store", help="Copy all collections between vector store backends")
+    migrate_parser.add_argument("--source", choices=["chroma", "numpy"], default="chroma")
+    migrate_parser.add_argument("--target", choices=["chroma", "numpy"], default="numpy")
+
     # Command: add_paper
-    add_parser = subparsers.add_parser("add_paper", help="Add and classify papers with page-level indexing")
+    add_parser = subparsers.add_parser("add_paper", help="Add and classify papers with token-window chunk indexing")
     add_parser.add_argument("path", help="Path to the PDF file or directory")
     add_parser.add_argument("--topics", required=True, help="Comma separated topics")
 
     # Command: search_paper (Advanced RAG)
     search_parser = subparsers.add_parser("search_paper", help="Semantic search & Q/A")
     search_parser.add_argument("query", help="Question about papers")
+    search_parser.add_argument("--rerank", action="store_true", help="Rerank candidates with a cross-encoder")
+
+    # Command: search_batch (JSONL in, JSONL out)
+    batch_parser = subparsers.add_parser("search_batch", help="Run many queries from a JSONL file and write JSONL results")
+    batch_parser.add_argument("input", help="JSONL file: one {\"query\": ..., \"id\": ...} object or JSON string per line")
+    batch_parser.add_argument("--output", default=None, help="Output JSONL path (default: INPUT.results.jsonl)")
+    batch_parser.add_argument("--type", choices=["papers", "images", "captions"], default="papers", help="Collection to search")
+    batch_parser.add_argument("--n-results", type=int, default=3, help="Results per query")
+    batch_parser.add_argument("--batch-size", type=int, default=None, help="Queries encoded and searched per batch")
+    batch_parser.add_argument("--answer", action="store_true", help="Also generate an answer with citations (papers only)")
+    batch_parser.add_argument("--with-text", action="store_true", help="Include the matched text in each result")
+    batch_parser.add_argument("--rerank", action="store_true", help="Rerank candidates with a cross-encoder (papers only)")
 
     # Command: scan_images
     scan_img_parser = subparsers.add_parser("scan_images", help="Index all images")
     scan_img_parser.add_argument("path", help="Directory path containing images")
+    scan_img_parser.add_argument("--rebuild", action="store_true", help="Re-embed every image, ignoring the manifest")
 
     # Command: search_image
     img_parser = subparsers.add_parser("search_image", help="Search images by text")
     img_parser.add_argument("query", help="Text description")
+    img_parser.add_argument("--mode", choices=["clip", "caption"], default="clip",
+                            help="Match against CLIP image embeddings or Florence-2 captions")
 
     # Command: describe_image (Florence-2)
     desc_parser = subparsers.add_parser("describe_image", help="Generate detailed caption for an image")
     desc_parser.add_argument("path", help="Path to image file")
 
+    # Command: describe_images (Florence-2, batched)
+    descs_parser = subparsers.add_parser("describe_images", help="Caption every image in a directory and index the captions")
+    descs_parser.add_argument("path", help="Directory path containing images")
+    descs_parser.add_argument("--batch-size", type=int, default=None, help="Images per generate call")
+    descs_parser.add_argument("--rebuild", action="store_true", help="Re-index images that already have a caption")
+
     # Command: ask_image (Florence-2)
     ask_parser = subparsers.add_parser("ask_image", help="Ask questions about an image")
     ask_parser.add_argument("path", help="Path to image file")
@@ -42,14 +89,54 @@ def main():
         parser.print_help()
         return
 
-    print("⏳ 正在初始化 AI Agent (Loading All Models)...")
+    PROFILER.enabled = args.profile or args.command == "serve"
+    if not args.profile:
+        run(args)
+        return
+    try:
+        with span(f"cli.{args.command}"):
+            run(args)
+    finally:
+        print_profile(args.profile_out)
+
+def print_profile(prefix):
+    print("\n⏱️ [各阶段耗时]:")
+    print(PROFILER.format_table())
+    PROFILER.write_json(f"{prefix}.json")
+    PROFILER.write_prometheus(f"{prefix}.prom")
+    print(f"📝 剖析结果已写入 {prefix}.json / {prefix}.prom")
+
+def run(args):
+    if args.command == "serve":
+        from src.agent_server import serve
+        serve(args.host, args.port)
+        return
+
+    # 模型均为按需加载：每条命令只加载自己用到的模型
     db = DBManager()
-    llm = LLMClient()
-    # 注意：首次运行会加载 Florence-2，可能占用 2-3GB 显存
+    # 注意：首次分析图片时才会加载 Florence-2，可能占用 2-3GB 显存
     vision_expert = VisionExpert()
-    print("✅ 全系统初始化完成！\n")
+    llm = None
+
+    # 常驻服务在线时，检索与视觉命令直接转发，免去模型加载
+    if args.command in REMOTE_COMMANDS and not args.no_server:
+        connection = AgentConnection()
+        if connection.is_ready():
+            print(f"🛰️ 已连接常驻服务 {connection.base_url}")
+            if args.profile:
+                print(f"⏱️ 检索/视觉阶段在服务端执行，其耗时见 {connection.base_url}/metrics")
+            db = RemoteDBManager(connection)
+            vision_expert = RemoteVisionExpert(connection)
+            llm = RemoteLLMClient(connection)
 
-    if args.command == "add_paper":
+    if args.command == "migrate_store":
+        from src.vector_store import copy_store
+        for name in ("papers", "images", "captions"):
+            count = copy_store(db.open_store(name, args.source), db.open_store(name, args.target))
+            print(f"📦 {name}: {args.source} -> {args.target} 复制 {count} 条")
+        print("✅ 迁移完成，修改 VECTOR_BACKEND 即可切换后端。")
+
+    elif args.command == "add_paper":
         files_to_process = []
         if os.path.isfile(args.path):
             files_to_process.append(args.path)
@@ -59,64 +146,109 @@ def main():
                     if f.lower().endswith(".pdf"):
                         files_to_process.append(os.path.join(root, f))
         
-        print(f"🚀 开始处理 {len(files_to_process)} 个文件 (按页索引)...")
+        print(f"🚀 开始处理 {len(files_to_process)} 个文件 (按 token 窗口切分索引)...")
         
-        for file_path in tqdm(files_to_process):
-            chunks = extract_text_from_pdf(file_path)
-            if not chunks:
-                continue
-            
-            # 使用第一页内容进行分类
-            first_page_text = chunks[0]['text']
-            category = llm.classify_paper(first_page_text, args.topics)
-            print(f"\n📄 文件: {os.path.basename(file_path)} -> 🏷️ 分类: {category}")
-            
-            new_path = move_file_to_category(file_path, category)
-            db.add_paper_chunks(new_path, chunks, category)
+        bar = tqdm(total=len(files_to_process))
+
+        def on_result(file_path, status, category, detail):
+            bar.update(1)
+            name = os.path.basename(file_path)
+            if status == INDEXED:
+                bar.write(f"📄 文件: {name} -> 🏷️ 分类: {category}")
+            elif status == MOVED:
+                bar.write(f"🔁 已入库论文被移动: {name} -> 📂 {category} (仅更新路径)")
+            elif status == DUPLICATE:
+                bar.write(f"♻️ 重复内容，跳过: {name}")
+            elif status == FAILED:
+                bar.write(f"❌ 处理失败 {name}: {detail}")
+
+        # 分类阶段使用异步客户端，多篇论文并发请求
+        from src.llm_client import AsyncLLMClient
+        pipeline = IngestPipeline(db, AsyncLLMClient(), args.topics, on_result=on_result)
+        stats = pipeline.run(files_to_process)
+        bar.close()
+
+        print(f"\n✅ 处理完成: 新入库 {stats.get(INDEXED, 0)}，已存在 {stats.get(SKIPPED, 0)}，"
+              f"移动 {stats.get(MOVED, 0)}，重复 {stats.get(DUPLICATE, 0)}，无文本 {stats.get(EMPTY, 0)}，"
+              f"失败 {stats.get(FAILED, 0)}")
 
     elif args.command == "search_paper":
         print(f"🔍 正在检索并思考: '{args.query}' ...")
-        results = db.search_papers(args.query, n_results=3)
+        results = db.search_papers(args.query, n_results=Config.CONTEXT_CHUNKS, rerank=True if args.rerank else None)
         
         if not results['ids'][0]:
             print("❌ 未找到相关信息。")
             return
 
-        context_str = ""
         print("\n📚 [检索到的参考片段]:")
         for i in range(len(results['ids'][0])):
             meta = results['metadatas'][0][i]
             dist = results['distances'][0][i]
             text = results['documents'][0][i]
             
-            context_str += f"--- 文档: {meta['source']} (第 {meta['page']} 页) ---\n{text}\n\n"
-            
             print(f"[{i+1}] {os.path.basename(meta['source'])}")
-            print(f"    📍 页码: Page {meta['page']} | 匹配度: {1-dist:.4f}")
+            print(f"    📍 页码: Page {format_page_span(meta)} | 匹配度: {1-dist:.4f}")
             print(f"    📝 片段: \"{text[:100].replace(chr(10), ' ')}...\"\n")
 
-        print("🤖 [AI 智能回答]:")
-        answer = llm.chat_with_context(args.query, context_str)
-        print(f"{answer}\n")
+        # 按 token 预算挑选与问题最相关的句子，去重后带引用编号
+        built = db.build_context(args.query, results)
+        print(f"🧾 上下文: {built['sentences']} 句 / 约 {built['tokens']} tokens，引用:")
+        for cite in built['citations']:
+            print(f"    [{cite['ref']}] {os.path.basename(cite['source'])} 第 {cite['page']} 页")
+
+        if llm is None:
+            from src.llm_client import LLMClient
+            llm = LLMClient()
+        print("\n🤖 [AI 智能回答]:")
+        for delta in llm.stream_chat_with_context(args.query, built['context']):
+            print(delta, end="", flush=True)
+        print("\n")
+
+    elif args.command == "search_batch":
+        from src.batch_search import BatchSearch, read_queries
+        output = args.output or f"{os.path.splitext(args.input)[0]}.results.jsonl"
+        if args.answer and llm is None:
+            # 本地模式用异步客户端并发生成回答
+            from src.llm_client import AsyncLLMClient
+            llm = AsyncLLMClient()
+        print(f"🚀 批量检索 {args.input} ({args.type}) -> {output} ...")
+
+        with open(output, "w", encoding="utf-8") as out, tqdm(unit="q") as bar:
+            def on_result(record):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                bar.update(1)
+
+            searcher = BatchSearch(
+                db, kind=args.type, n_results=args.n_results, batch_size=args.batch_size,
+                llm=llm if args.answer else None, with_text=args.with_text,
+                rerank=True if args.rerank else None, on_result=on_result
+            )
+            try:
+                stats = searcher.run(read_queries(args.input))
+            except ValueError as e:
+                bar.close()
+                print(f"❌ 查询文件格式错误 (此前的 {searcher.stats['queries']} 条结果已写入 {output}): {e}")
+                return
+
+        answered = f"，生成回答 {stats['answered']} 条" if args.answer else ""
+        print(f"\n🎉 完成 {stats['queries']} 条查询{answered}，耗时 {stats['elapsed']:.1f}s ({stats['qps']:.1f} 条/秒)")
 
     elif args.command == "scan_images":
-        image_exts = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff'}
-        count = 0
-        for root, _, files in os.walk(args.path):
-            for f in files:
-                if os.path.splitext(f)[1].lower() in image_exts:
-                    path = os.path.join(root, f)
-                    try:
-                        if db.add_image_embedding(path):
-                            print(f"✅ 索引: {f}")
-                            count += 1
-                    except Exception:
-                        pass
-        print(f"\n🎉 已索引 {count} 张图片。")
+        print(f"🚀 正在增量扫描图片目录: {args.path} ...")
+        with tqdm() as bar:
+            def on_progress(done, total):
+                bar.total = total
+                bar.update(done - bar.n)
+            stats = db.sync_images(args.path, force=args.rebuild, progress_callback=on_progress)
+        print(f"\n🎉 新索引 {stats['indexed']} 张，未变化 {stats['unchanged']} 张，"
+              f"移除 {stats['removed']} 张，失败 {len(stats['failed'])} 张。")
 
     elif args.command == "search_image":
         print(f"🖼️ 正在寻找: '{args.query}'...")
-        results = db.search_images(args.query)
+        if args.mode == "caption":
+            results = db.search_captions(args.query)
+        else:
+            results = db.search_images(args.query)
         if not results['ids'][0]:
             print("未找到相关图片。")
         else:
@@ -124,6 +256,31 @@ def main():
                 doc_id = results['ids'][0][i]
                 dist = results['distances'][0][i]
                 print(f"[{i+1}] {doc_id} - 匹配度: {1-dist:.4f}")
+                if args.mode == "caption":
+                    print(f"    📝 描述: \"{results['documents'][0][i][:100]}...\"")
+
+    elif args.command == "describe_images":
+        paths = list_image_files(args.path)
+        # 已有描述的图片直接跳过，中断后重新执行即可续跑
+        done = set() if args.rebuild else db.captioned_images(paths)
+        todo = [p for p in paths if p not in done]
+        print(f"🚀 共 {len(paths)} 张图片，已有描述 {len(done)} 张，待处理 {len(todo)} 张...")
+
+        captioned, failed = 0, []
+        start = time.perf_counter()
+        with tqdm(total=len(todo)) as bar:
+            for ok_paths, captions, failures in vision_expert.caption_images(todo, batch_size=args.batch_size):
+                # 每批生成后立即入库
+                db.add_image_captions(ok_paths, captions)
+                captioned += len(ok_paths)
+                failed.extend(failures)
+                bar.update(len(ok_paths) + len(failures))
+        elapsed = time.perf_counter() - start
+
+        for path, err in failed:
+            print(f"❌ 图片处理错误 {path}: {err}")
+        rate = captioned / elapsed if elapsed > 0 else 0.0
+        print(f"\n🎉 生成描述 {captioned} 张，失败 {len(failed)} 张，耗时 {elapsed:.1f}s ({rate:.2f} 张/秒)")
 
     elif args.command == "describe_image":
         print(f"🎨 正在深度解析图片: {args.path} ...")
@@ -0,0 +1,170 @@
+import os
+import json
+import codecs
+import urllib.error
+import urllib.request
+from .config import Config
+
+
+class AgentConnection:
+    """
+    常驻服务 (src/agent_server.py) 的轻量 HTTP 客户端，只依赖标准库
+    """
+
+    def __init__(self, base_url=None, timeout=600):
+        self.base_url = (base_url or Config.AGENT_SERVER_URL).rstrip("/")
+        self.timeout = timeout
+
+    def is_ready(self, timeout=0.3):
+        """
+        服务在线且模型已加载完毕时返回 True；服务未启动时快速返回 False
+        """
+        try:
+            with urllib.request.urlopen(self.base_url + "/ready", timeout=timeout) as resp:
+                return resp.status == 200
+        except (urllib.error.URLError, OSError, ValueError):
+            return False
+
+    def _open(self, path, payload):
+        request = urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            return urllib.request.urlopen(request, timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            detail = e.read().decode("utf-8", errors="replace")
+            raise RuntimeError(f"Agent 服务返回错误 {e.code}: {detail}") from e
+
+    def post(self, path, payload):
+        with self._open(path, payload) as resp:
+            return json.loads(resp.read().decode("utf-8"))
+
+    def stream(self, path, payload):
+        # 增量解码，防止把多字节 UTF-8 字符从中间截断
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with self._open(path, payload) as resp:
+            while True:
+                data = resp.read1(4096)
+                if not data:
+                    break
+                text = decoder.decode(data)
+                if text:
+                    yield text
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+
+    def events(self, path, payload):
+        """
+        逐行读取服务端的进度事件 (每行一个 JSON)，最后一个事件为 {"result": ...}
+        """
+        with self._open(path, payload) as resp:
+            for line in resp:
+                if not line.strip():
+                    continue
+                event = json.loads(line.decode("utf-8"))
+                if "error" in event:
+                    raise RuntimeError(f"Agent 服务执行失败: {event['error']}")
+                yield event
+
+
+class RemoteDBManager:
+    """
+    与 DBManager 的检索 (query 可以是列表) 与入库接口一致，请求转发给常驻服务。
+    写入也由服务执行，服务内的向量库与检索缓存不会落后于磁盘上的数据。
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def search_papers(self, query, n_results=3, rerank=None):
+        return self.connection.post("/search_paper", {"query": query, "n_results": n_results, "rerank": rerank})
+
+    def search_images(self, text_query, n_results=3):
+        return self.connection.post("/search_image", {"query": text_query, "n_results": n_results})
+
+    def search_captions(self, query, n_results=3):
+        return self.connection.post("/search_caption", {"query": query, "n_results": n_results})
+
+    def build_context(self, query, results, max_tokens=None):
+        return self.connection.post("/build_context", {"query": query, "results": results, "max_tokens": max_tokens})
+
+    def find_paper(self, doc_hash):
+        return self.connection.post("/find_paper", {"doc_hash": doc_hash})["result"]
+
+    def update_paper_source(self, doc_hash, new_path):
+        self.connection.post("/update_paper_source", {"doc_hash": doc_hash, "new_path": new_path})
+
+    def add_paper_batch(self, papers):
+        self.connection.post("/add_paper_batch", {"papers": papers})
+
+    def sync_images(self, directory, force=False, progress_callback=None):
+        # 服务端工作目录可能不同，传绝对路径
+        payload = {"directory": os.path.abspath(directory), "force": force}
+        for event in self.connection.events("/sync_images", payload):
+            if "result" in event:
+                return event["result"]
+            if progress_callback:
+                progress_callback(event["done"], event["total"])
+
+    def captioned_images(self, paths):
+        originals = {os.path.abspath(p): p for p in paths}
+        done = self.connection.post("/captioned_images", {"paths": list(originals)})["paths"]
+        return {originals[p] for p in done}
+
+    def add_image_captions(self, paths, captions):
+        self.connection.post("/add_image_captions", {
+            "paths": [os.path.abspath(p) for p in paths],
+            "captions": [str(c) for c in captions],
+        })
+
+
+class RemoteVisionExpert:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def analyze_image(self, image_path, prompt_type="<MORE_DETAILED_CAPTION>", user_question=None):
+        # 服务端工作目录可能不同，传绝对路径
+        return self.connection.post("/analyze_image", {
+            "path": os.path.abspath(image_path),
+            "prompt_type": prompt_type,
+            "question": user_question,
+        })["result"]
+
+    def analyze_image_tasks(self, image_path, tasks):
+        return self.connection.post("/analyze_image_tasks", {
+            "path": os.path.abspath(image_path),
+            "tasks": tasks,
+        })["results"]
+
+    def caption_images(self, paths, batch_size=None):
+        """
+        与 VisionExpert.caption_images 一致，每批 yield (成功路径, 描述, [(失败路径, 错误信息)])，路径保持调用方的写法
+        """
+        originals = {os.path.abspath(p): p for p in paths}
+        payload = {"paths": list(originals), "batch_size": batch_size}
+        for event in self.connection.events("/caption_images", payload):
+            if "result" in event:
+                return
+            yield (
+                [originals[p] for p in event["paths"]],
+                event["captions"],
+                [(originals[p], err) for p, err in event["failures"]],
+            )
+
+
+class RemoteLLMClient:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def stream_chat_with_context(self, query, context):
+        try:
+            yield from self.connection.stream("/chat", {"query": query, "context": context})
+        except Exception as e:
+            yield f"生成回答失败: {e}"
+
+    def chat_with_context(self, query, context):
+        return "".join(self.stream_chat_with_context(query, context))
@@ -0,0 +1,335 @@
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+from .config import Config
+from .db_manager import DBManager
+from .profiling import PROFILER
+from .vision_expert import VisionExpert
+
+
+class MicroBatcher:
+    """
+    把多个并发请求的单条编码合并成一次批量调用：
+    收到第一条后最多再等 max_wait_ms，或凑满 max_batch 条就执行。
+    """
+
+    def __init__(self, batch_fn, max_batch=None, max_wait_ms=None):
+        self.batch_fn = batch_fn
+        self.max_batch = max_batch or Config.MICRO_BATCH_MAX
+        self.max_wait = (Config.MICRO_BATCH_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future.result()
+
+    def _worker(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < self.max_batch:
+                    batch.append(self._queue.get(timeout=self.max_wait))
+            except queue.Empty:
+                pass
+
+            items = [item for item, _ in batch]
+            try:
+                outputs = self.batch_fn(items)
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(output)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+def _plain_results(results):
+    """
+    Chroma 结果里只保留可 JSON 序列化、客户端会用到的字段
+    """
+    return {key: results.get(key) for key in ("ids", "documents", "metadatas", "distances")}
+
+
+class AgentService:
+    """
+    常驻进程持有的全部模型，供 HTTP 处理线程共享
+    """
+
+    def __init__(self):
+        from .llm_client import LLMClient
+        self.db = DBManager()
+        self.llm = LLMClient()
+        self.vision = VisionExpert()
+        self.ready = threading.Event()
+        self.settled = threading.Event()  # 预加载结束 (无论成功与否)
+        self.load_error = None
+        self.paper_encoder = MicroBatcher(self.db.encode_queries)
+        self.image_encoder = MicroBatcher(self.db.encode_image_queries)
+        # Florence-2 生成很重，并发调用只会互相抢 CPU/显存，串行执行
+        self.vision_lock = threading.Lock()
+        # 多个客户端的入库请求依次执行
+        self.write_lock = threading.Lock()
+
+    def warm_up(self):
+        """
+        启动时预先加载全部模型与集合，完成后 /ready 返回 200
+        """
+        print("⏳ 正在预加载全部模型...")
+        try:
+            self.db.paper_collection
+            self.db.lexical_index
+            self.db.image_collection
+            self.db.caption_collection
+            self.db.encode_queries(["warm up"])
+            self.db.encode_image_queries(["warm up"])
+            self.vision._ensure_loaded()
+            self.ready.set()
+            print("✅ 全部模型已就绪，开始接受请求")
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"❌ 模型预加载失败: {e}")
+        finally:
+            self.settled.set()
+
+    def search_papers(self, query, n_results=3, rerank=None):
+        if not isinstance(query, str):
+            # 批量查询本身已是一次编码，不再经过微批处理器
+            return [_plain_results(r) for r in self.db.search_papers(query, n_results=n_results, rerank=rerank)]
+        embedding = self.paper_encoder.submit(query)
+        return _plain_results(self.db.search_papers(query, n_results=n_results, query_embedding=embedding, rerank=rerank))
+
+    def search_images(self, query, n_results=3):
+        if not isinstance(query, str):
+            return [_plain_results(r) for r in self.db.search_images(query, n_results=n_results)]
+        embedding = self.image_encoder.submit(query)
+        return _plain_results(self.db.search_images(query, n_results=n_results, query_embedding=embedding))
+
+    def search_captions(self, query, n_results=3):
+        if not isinstance(query, str):
+            return [_plain_results(r) for r in self.db.search_captions(query, n_results=n_results)]
+        # 描述与论文共用文本模型，共享同一个批处理器
+        embedding = self.paper_encoder.submit(query)
+        return _plain_results(self.db.search_captions(query, n_results=n_results, query_embedding=embedding))
+
+    def build_context(self, query, results, max_tokens=None):
+        return self.db.build_context(query, results, max_tokens=max_tokens)
+
+    # ---------- 写入: 服务在线时 CLI 的入库命令转发到这里，服务内的向量库与检索缓存随之更新 ----------
+    def find_paper(self, doc_hash):
+        return self.db.find_paper(doc_hash)
+
+    def update_paper_source(self, doc_hash, new_path):
+        with self.write_lock:
+            self.db.update_paper_source(doc_hash, new_path)
+
+    def add_paper_batch(self, papers):
+        with self.write_lock:
+            self.db.add_paper_batch(papers)
+
+    def sync_images(self, directory, force=False, progress_callback=None):
+        with self.write_lock:
+            return self.db.sync_images(directory, force=force, progress_callback=progress_callback)
+
+    def captioned_images(self, paths):
+        return sorted(self.db.captioned_images(paths))
+
+    def add_image_captions(self, paths, captions):
+        with self.write_lock:
+            self.db.add_image_captions(paths, captions)
+
+    def caption_images(self, paths, batch_size=None):
+        with self.vision_lock:
+            yield from self.vision.caption_images(paths, batch_size=batch_size)
+
+    def analyze_image(self, path, prompt_type="<MORE_DETAILED_CAPTION>", question=None):
+        with self.vision_lock:
+            return self.vision.analyze_image(path, prompt_type=prompt_type, user_question=question)
+
+    def analyze_image_tasks(self, path, tasks):
+        with self.vision_lock:
+            return self.vision.analyze_image_tasks(path, tasks)
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None  # 由 serve() 注入
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health":
+            self._send_json(200, {
+                "status": "ok",
+                "ready": self.service.ready.is_set(),
+                "cache": self.service.db.cache_stats(),
+            })
+        elif path == "/ready":
+            if self.service.ready.is_set():
+                self._send_json(200, {"status": "ready"})
+            elif self.service.load_error:
+                self._send_json(503, {"status": "failed", "error": self.service.load_error})
+            else:
+                self._send_json(503, {"status": "loading"})
+        elif path == "/metrics":
+            # 各阶段耗时 / 条数 / 峰值内存，Prometheus 文本格式
+            body = PROFILER.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/profile":
+            self._send_json(200, PROFILER.to_dict())
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+
+        self.service.settled.wait(timeout=600)
+        if not self.service.ready.is_set():
+            self._send_json(503, {"error": self.service.load_error or "models are still loading"})
+            return
+
+        try:
+            if path == "/search_paper":
+                self._send_json(200, self.service.search_papers(
+                    body["query"], body.get("n_results", 3), body.get("rerank")
+                ))
+            elif path == "/search_image":
+                self._send_json(200, self.service.search_images(body["query"], body.get("n_results", 3)))
+            elif path == "/search_caption":
+                self._send_json(200, self.service.search_captions(body["query"], body.get("n_results", 3)))
+            elif path == "/build_context":
+                self._send_json(200, self.service.build_context(body["query"], body["results"], body.get("max_tokens")))
+            elif path == "/analyze_image":
+                result = self.service.analyze_image(
+                    body["path"], body.get("prompt_type", "<MORE_DETAILED_CAPTION>"), body.get("question")
+                )
+                self._send_json(200, {"result": result})
+            elif path == "/analyze_image_tasks":
+                self._send_json(200, {"results": self.service.analyze_image_tasks(body["path"], body["tasks"])})
+            elif path == "/chat":
+                self._stream_text(self.service.llm.stream_chat_with_context(body["query"], body["context"]))
+            elif path == "/find_paper":
+                self._send_json(200, {"result": self.service.find_paper(body["doc_hash"])})
+            elif path == "/update_paper_source":
+                self.service.update_paper_source(body["doc_hash"], body["new_path"])
+                self._send_json(200, {"status": "ok"})
+            elif path == "/add_paper_batch":
+                self.service.add_paper_batch(body["papers"])
+                self._send_json(200, {"status": "ok"})
+            elif path == "/sync_images":
+                directory, force = body["directory"], body.get("force", False)
+                self._stream_events(lambda emit: self.service.sync_images(
+                    directory, force, progress_callback=lambda done, total: emit({"done": done, "total": total})
+                ))
+            elif path == "/captioned_images":
+                self._send_json(200, {"paths": self.service.captioned_images(body["paths"])})
+            elif path == "/add_image_captions":
+                self.service.add_image_captions(body["paths"], body["captions"])
+                self._send_json(200, {"status": "ok"})
+            elif path == "/caption_images":
+                paths, batch_size = body["paths"], body.get("batch_size")
+
+                def caption(emit):
+                    for ok_paths, captions, failures in self.service.caption_images(paths, batch_size):
+                        emit({"paths": ok_paths, "captions": captions, "failures": failures})
+
+                self._stream_events(caption)
+            else:
+                self._send_json(404, {"error": "not found"})
+        except KeyError as e:
+            self._send_json(400, {"error": f"missing field: {e}"})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _stream_text(self, deltas):
+        """
+        以 chunked 编码逐段转发生成的文本。
+        响应头已发出后出错只能把错误信息作为最后一段文本发出 (与 LLMClient 流式出错时的输出一致)
+        """
+        self._start_chunked("text/plain; charset=utf-8")
+        try:
+            for delta in deltas:
+                self._write_chunk(delta)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已断开，无法再写
+            return
+        except Exception as e:
+            self._write_chunk(f"\n生成回答失败: {e}")
+        self._end_chunked()
+
+    def _stream_events(self, run):
+        """
+        长任务的进度流: run(emit) 执行期间每个事件立即作为一行 JSON 发出，
+        最后一行为 {"result": 返回值}；响应头已发出后出错只能发 {"error": 信息}
+        """
+        self._start_chunked("application/x-ndjson; charset=utf-8")
+        try:
+            result = run(lambda event: self._write_chunk(json.dumps(event, ensure_ascii=False) + "\n"))
+            self._write_chunk(json.dumps({"result": result}, ensure_ascii=False) + "\n")
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        except Exception as e:
+            self._write_chunk(json.dumps({"error": str(e)}, ensure_ascii=False) + "\n")
+        self._end_chunked()
+
+
+def serve(host=None, port=None):
+    """
+    启动常驻服务：先开始监听 (/health 可用)，后台加载模型，加载完成后 /ready 变为 200
+    """
+    default = urlparse(Config.AGENT_SERVER_URL)
+    host = host or default.hostname
+    port = port or default.port
+
+    service = AgentService()
+    handler = type("BoundAgentRequestHandler", (AgentRequestHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=service.warm_up, daemon=True).start()
+
+    print(f"🛰️ Agent 服务监听于 http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 服务已停止")
+    finally:
+        server.server_close()
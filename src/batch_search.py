@@ -0,0 +1,149 @@
+import json
+import time
+import asyncio
+import inspect
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from .config import Config
+from .profiling import span
+
+SEARCH_KINDS = ("papers", "images", "captions")
+
+
+def read_queries(path):
+    """
+    逐行读取查询: JSON 对象 ({"query": ..., "id": 可选}) 或 JSON 字符串，id 缺省为行号。
+    格式不对的行抛出 ValueError，指明文件与行号
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"{path} 第 {line_no} 行不是合法的 JSON: {e}") from None
+            if isinstance(item, str):
+                yield line_no, item
+            elif not isinstance(item, dict):
+                raise ValueError(f"{path} 第 {line_no} 行应为 JSON 对象或字符串，实际为 {type(item).__name__}")
+            elif not isinstance(item.get("query"), str):
+                raise ValueError(f"{path} 第 {line_no} 行缺少字符串类型的 \"query\" 字段")
+            else:
+                yield item.get("id", line_no), item["query"]
+
+
+class BatchSearch:
+    """
+    批量检索 (离线评测 / 批处理):
+      [按批编码 + 一次多向量查询 (单线程)] -> [可选: 组装上下文并发生成回答]
+    下一批的检索与上一批的回答生成重叠执行，结果按输入顺序逐条交给 on_result，内存中最多保留两批。
+    """
+
+    def __init__(self, db, kind="papers", n_results=3, batch_size=None, llm=None,
+                 with_text=False, rerank=None, on_result=None):
+        if kind not in SEARCH_KINDS:
+            raise ValueError(f"未知的检索类型: {kind}")
+        self.db = db
+        self.kind = kind
+        self.n_results = n_results
+        self.batch_size = batch_size or Config.SEARCH_BATCH_SIZE
+        # 只有论文检索可以生成回答
+        self.llm = llm if kind == "papers" else None
+        self.with_text = with_text
+        self.rerank = rerank
+        # on_result(输出记录)，按输入顺序调用
+        self.on_result = on_result
+        self.stats = {}
+
+    def run(self, records):
+        """
+        records: (id, 查询文本) 的可迭代对象，可以是惰性读取的文件。
+        返回 {'queries', 'answered', 'elapsed', 'qps'}
+        """
+        self.stats = {"queries": 0, "answered": 0}
+        start = time.perf_counter()
+        asyncio.run(self._run(iter(records)))
+        elapsed = time.perf_counter() - start
+        self.stats["elapsed"] = elapsed
+        self.stats["qps"] = self.stats["queries"] / elapsed if elapsed > 0 else 0.0
+        return self.stats
+
+    def _search(self, queries):
+        if self.kind == "images":
+            return self.db.search_images(queries, n_results=self.n_results)
+        if self.kind == "captions":
+            return self.db.search_captions(queries, n_results=self.n_results)
+        return self.db.search_papers(queries, n_results=self.n_results, rerank=self.rerank)
+
+    def _search_batch(self, queries):
+        with span(f"batch.search_{self.kind}", items=len(queries)):
+            results = self._search(queries)
+        contexts = None
+        if self.llm is not None:
+            with span("batch.build_context", items=len(queries)):
+                contexts = [self.db.build_context(q, r) for q, r in zip(queries, results)]
+        return results, contexts
+
+    def _record(self, query_id, query, results, built=None, answer=None):
+        hits = []
+        for i, doc_id in enumerate(results['ids'][0]):
+            hit = {
+                "id": doc_id,
+                "score": round(1 - results['distances'][0][i], 6),
+                "metadata": results['metadatas'][0][i],
+            }
+            if self.with_text:
+                hit["document"] = results['documents'][0][i]
+            hits.append(hit)
+        record = {"id": query_id, "query": query, "results": hits}
+        if built is not None:
+            record["answer"] = answer
+            record["citations"] = built['citations']
+        return record
+
+    async def _answer(self, query, context, io_pool):
+        if not context:
+            return None
+        if inspect.iscoroutinefunction(getattr(self.llm, "chat_with_context", None)):
+            # AsyncLLMClient: 并发数与限速由客户端自身控制
+            return await self.llm.chat_with_context(query, context)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(io_pool, self.llm.chat_with_context, query, context)
+
+    async def _finish(self, batch, results, contexts, io_pool):
+        answers = [None] * len(batch)
+        if contexts is not None:
+            answers = await asyncio.gather(*(
+                self._answer(query, built['context'], io_pool)
+                for (_, query), built in zip(batch, contexts)
+            ))
+            self.stats["answered"] += sum(answer is not None for answer in answers)
+        for i, (query_id, query) in enumerate(batch):
+            record = self._record(query_id, query, results[i], contexts[i] if contexts else None, answers[i])
+            self.stats["queries"] += 1
+            if self.on_result:
+                self.on_result(record)
+
+    async def _run(self, records):
+        loop = asyncio.get_running_loop()
+        # 检索始终在同一个线程里执行，模型调用不互相抢占
+        with ThreadPoolExecutor(max_workers=1) as search_pool, \
+                ThreadPoolExecutor(max_workers=Config.LLM_CONCURRENCY) as io_pool:
+            pending = None
+            while True:
+                batch = list(islice(records, self.batch_size))
+                if not batch:
+                    break
+                queries = [query for _, query in batch]
+                results, contexts = await loop.run_in_executor(search_pool, self._search_batch, queries)
+                # 上一批的回答在本批检索期间并发生成，这里等它写完再接上本批，保证输出顺序
+                if pending is not None:
+                    await pending
+                pending = asyncio.create_task(self._finish(batch, results, contexts, io_pool))
+            if pending is not None:
+                await pending
+
+        if self.llm is not None and hasattr(self.llm, "aclose"):
+            await self.llm.aclose()
@@ -1,40 +1,160 @@
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-# 1. 定义默认值
-text_model_path = "all-MiniLM-L6-v2" 
-clip_model_path = "openai/clip-vit-base-patch32"
-vision_model_path = "microsoft/Florence-2-large"
-
-# 2. 尝试读取本地路径文件
-path_file = "model_paths.txt"
-if os.path.exists(path_file):
-    try:
-        with open(path_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith("TEXT_MODEL_PATH="):
-                    text_model_path = line.split("=")[1]
-                elif line.startswith("CLIP_MODEL_PATH="):
-                    clip_model_path = line.split("=")[1]
-                elif line.startswith("VISION_MODEL_PATH="):
-                    vision_model_path = line.split("=")[1]
-        print(f"✅ 已加载本地模型路径配置")
-    except Exception as e:
-        print(f"⚠️ 读取路径文件失败，将使用默认配置: {e}")
+import functools
+
+# 模型路径默认值，可被 model_paths.txt (dw.py 生成) 覆盖
+_MODEL_PATH_FILE = "model_paths.txt"
+_MODEL_PATH_DEFAULTS = {
+    "TEXT_MODEL_PATH": "all-MiniLM-L6-v2",
+    "CLIP_MODEL_PATH": "openai/clip-vit-base-patch32",
+    "VISION_MODEL_PATH": "microsoft/Florence-2-large",
+    "RERANK_MODEL_PATH": "cross-encoder/ms-marco-MiniLM-L-6-v2",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _read_model_paths():
+    """
+    首次访问模型路径时才读取 model_paths.txt，导入本模块不产生任何 IO
+    """
+    paths = dict(_MODEL_PATH_DEFAULTS)
+    if os.path.exists(_MODEL_PATH_FILE):
+        try:
+            with open(_MODEL_PATH_FILE, "r") as f:
+                for line in f:
+                    key, sep, value = line.strip().partition("=")
+                    if sep and key in paths:
+                        paths[key] = value
+        except Exception as e:
+            print(f"⚠️ 读取路径文件失败，将使用默认配置: {e}")
+    return paths
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env():
+    from dotenv import load_dotenv
+    load_dotenv()
+
+
+class _ModelPath:
+    """
+    类属性描述符: Config.XXX_MODEL_PATH 在访问时才解析
+    """
+
+    def __init__(self, key):
+        self.key = key
+
+    def __get__(self, obj, owner):
+        return _read_model_paths()[self.key]
+
+
+class _EnvSetting:
+    """
+    类属性描述符: 访问时才加载 .env 并读取环境变量
+    """
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self.default = default
+
+    def __get__(self, obj, owner):
+        _load_env()
+        return os.getenv(self.name, self.default)
+
 
 class Config:
     # 硅基流动配置
-    API_KEY = os.getenv("SILICON_FLOW_API_KEY")
-    BASE_URL = "https://api.siliconflow.cn/v1"
+    API_KEY = _EnvSetting("SILICON_FLOW_API_KEY")
+    # 可通过环境变量指向本地 OpenAI 兼容服务 (如 benchmarks/stub_llm_server.py)
+    BASE_URL = _EnvSetting("LLM_BASE_URL", "https://api.siliconflow.cn/v1")
     MODEL_NAME = "Qwen/Qwen2.5-7B-Instruct"
+    # 异步客户端: 并发上限、每秒请求数 (0 为不限速)、429/5xx 重试
+    LLM_CONCURRENCY = 8
+    LLM_RATE_LIMIT = 5.0
+    LLM_MAX_RETRIES = 5
+    LLM_BACKOFF_BASE = 0.5
+    LLM_TIMEOUT = 60
     
     # 数据库路径
     DB_PATH = "./data/chroma_db"
+    # 向量库后端: "chroma" (HNSW 近似检索) 或 "numpy" (内存映射矩阵精确检索)
+    VECTOR_BACKEND = _EnvSetting("VECTOR_BACKEND", "chroma")
+    VECTOR_STORE_DIR = "./data/vector_store"   # numpy 后端数据目录，每个集合一个子目录
+    VECTOR_STORE_DTYPE = "float32"             # numpy 后端可选 float16，内存与磁盘占用减半
+    # 图片增量索引清单 (与向量库放在同一目录下)
+    IMAGE_MANIFEST_PATH = "./data/image_manifest.db"
+    # 论文 BM25 倒排索引
+    LEXICAL_INDEX_PATH = "./data/lexical_index.db"
+    # 各集合的写入代数 (多进程共享，检索结果缓存以此判断是否过期)
+    STORE_GENERATION_PATH = "./data/store_generation.db"
+    # 各类持久化缓存目录
+    CACHE_DIR = "./data/cache"
     
     # 模型路径
-    TEXT_MODEL_PATH = text_model_path
-    CLIP_MODEL_PATH = clip_model_path
-    VISION_MODEL_PATH = vision_model_path
\ No newline at end of file
+    TEXT_MODEL_PATH = _ModelPath("TEXT_MODEL_PATH")
+    CLIP_MODEL_PATH = _ModelPath("CLIP_MODEL_PATH")
+    VISION_MODEL_PATH = _ModelPath("VISION_MODEL_PATH")
+    RERANK_MODEL_PATH = _ModelPath("RERANK_MODEL_PATH")
+
+    # CPU 推理后端: "fp32" 或 "int8" (MiniLM 与 CLIP 两个塔的 nn.Linear 动态量化)
+    INFERENCE_BACKEND = _EnvSetting("INFERENCE_BACKEND", "fp32")
+    TORCH_THREADS = 0               # 0 为使用 torch 默认线程数
+    QUANT_DRIFT_CHECK = True        # 加载 int8 模型时报告与 fp32 的向量偏差
+    QUANT_DRIFT_MIN_COSINE = 0.98   # 低于该余弦相似度时给出警告
+
+    # 图片批量索引
+    IMAGE_BATCH_SIZE = 32
+    IMAGE_LOADER_WORKERS = 4
+    # Florence-2 批量生成描述，每批 padding 后一次 generate
+    CAPTION_BATCH_SIZE = 8
+
+    # 论文切分 (all-MiniLM-L6-v2 最长 256 个 WordPiece，留出子词切分余量)
+    CHUNK_MAX_TOKENS = 200
+    CHUNK_OVERLAP_TOKENS = 40
+
+    # 论文流水线入库
+    INGEST_PARSE_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # PDF 解析进程数
+    INGEST_CLASSIFY_CONCURRENCY = 8                             # 同时进行的 LLM 分类请求
+    INGEST_EMBED_BATCH = 256                                    # 每次合并编码/写入的 chunk 数
+    INGEST_QUEUE_SIZE = 16                                      # 各阶段间队列容量 (篇)
+    TEXT_ENCODE_BATCH_SIZE = 64
+
+    # 论文混合检索: BM25 与向量各取候选，按倒数排名融合 (RRF)
+    HYBRID_SEARCH = True
+    HYBRID_CANDIDATES = 20
+    RRF_K = 60
+    LEXICAL_MAX_DF_RATIO = 0.1     # 出现在超过该比例 chunk 中的查询词不参与 BM25 (停用词、常用词)
+    LEXICAL_TERM_POSTINGS = 500    # 每个查询词最多参与打分的倒排条数 (tf 最高的)
+
+    # 论文检索重排: 先取 RERANK_CANDIDATES 个候选，cross-encoder 分批重新打分后保留前 N 个，
+    # 每批开始前按测得的单条耗时预估，会超出时间预算则退回原检索顺序
+    RERANK_ENABLED = False
+    RERANK_CANDIDATES = 20
+    RERANK_BATCH_SIZE = 16
+    RERANK_BUDGET_MS = 300
+
+    # RAG 上下文组装: 从检索到的 chunk 中按与问题的相似度挑选句子，去掉近似重复，总长不超过预算
+    CONTEXT_CHUNKS = 5              # 参与挑选的检索结果数
+    CONTEXT_MAX_TOKENS = 1000       # 上下文 token 预算 (与 chunk 切分共用 file_handler.count_tokens，中文按字计数)
+    CONTEXT_DEDUP_THRESHOLD = 0.92  # 与已选句子的余弦相似度达到该值视为重复
+
+    # 批量检索 (python main.py search_batch)：每批一次编码 + 一次多向量查询
+    SEARCH_BATCH_SIZE = 256
+
+    # 进程内查询缓存 (条目数)；检索结果缓存按集合的持久化写入代数失效，其他进程写入后同样生效
+    QUERY_EMBED_CACHE_SIZE = 4096
+    QUERY_RESULT_CACHE_SIZE = 1024
+
+    # LLM 分类结果缓存
+    CLASSIFY_CACHE_MAX_ENTRIES = 100000
+    # Florence-2 分析结果缓存上限
+    VISION_CACHE_MAX_MB = 256
+    # 缩小后图片的磁盘缓存 (CLIP / Florence-2 输入与图库缩略图)，0 为关闭
+    IMAGE_CACHE_MAX_MB = 2048
+    THUMBNAIL_SIZE = 320   # 图库缩略图长边像素
+    # 每个分类请求打包的论文数
+    CLASSIFY_BATCH_SIZE = 8
+
+    # 常驻服务 (python main.py serve)，CLI 检测到服务在线时自动转发请求
+    AGENT_SERVER_URL = _EnvSetting("AGENT_SERVER_URL", "http://127.0.0.1:8760")
+    MICRO_BATCH_MAX = 64       # 跨客户端合并编码的最大条数
+    MICRO_BATCH_WAIT_MS = 5    # 凑批等待时间
@@ -0,0 +1,101 @@
+import re
+import numpy as np
+from .config import Config
+from .file_handler import format_page_span, count_tokens
+
+# 中文句末标点后直接切分；英文标点要求后面跟空白，避免切开小数和 "e.g." 之类的缩写
+_SENTENCE_END = re.compile(r"(?<=[。！？；])|(?<=[.!?;])\s+")
+# 短于该字符数的片段 (编号、残句) 并入前一句
+MIN_SENTENCE_CHARS = 8
+
+
+def split_sentences(text):
+    sentences = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip() if part else ""
+        if not part:
+            continue
+        if sentences and len(part) < MIN_SENTENCE_CHARS:
+            sentences[-1] += " " + part
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def _header(ref, meta):
+    return f"[{ref}] 文档: {meta['source']} (第 {format_page_span(meta)} 页)"
+
+
+class ContextBuilder:
+    """
+    把检索结果组装成受 token 预算约束的 RAG 上下文:
+    chunk 切成句子，用文本模型按与问题的相似度排序，贪心选入预算内的句子，
+    跳过与已选句子近似重复的句子 (相邻窗口的重叠部分)，最后按原文顺序分组并标注 (来源, 页码)。
+    """
+
+    def __init__(self, encode_fn, max_tokens=None, dedup_threshold=None):
+        # encode_fn(文本列表) -> 向量列表，不要求已归一化
+        self.encode = encode_fn
+        self.max_tokens = max_tokens or Config.CONTEXT_MAX_TOKENS
+        self.dedup_threshold = Config.CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    def build(self, query, results):
+        """
+        results 为 search_papers 的返回格式。
+        返回 {'context', 'citations': [{'ref', 'source', 'page'}], 'tokens', 'sentences'}
+        """
+        metas = results['metadatas'][0]
+        candidates = []  # (chunk 序号, 句子序号, 句子, token 数)
+        for c, doc in enumerate(results['documents'][0]):
+            for s, sentence in enumerate(split_sentences(doc)):
+                candidates.append((c, s, sentence, count_tokens(sentence)))
+        if not candidates:
+            return {"context": "", "citations": [], "tokens": 0, "sentences": 0}
+
+        # 问题与全部句子一次批量编码
+        vectors = np.array(self.encode([query] + [cand[2] for cand in candidates]), dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        sentence_vectors = vectors[1:]
+        scores = sentence_vectors @ vectors[0]
+
+        # 每个被引用的 chunk 还要占用一行来源标注，同样计入预算。
+        # 输出时按被引用的 chunk 重新编号，选句时编号未定，按可能的最大编号计 (只会高估)
+        header_tokens = [count_tokens(_header(len(metas), meta)) for meta in metas]
+        used, chosen, cited = 0, [], set()
+        for i in np.argsort(-scores, kind="stable"):
+            c, _, _, n = candidates[i]
+            # 同一 chunk 的后续句子可能与已选句子不相邻，预留一个省略号
+            cost = n + (1 if c in cited else header_tokens[c])
+            if used + cost > self.max_tokens:
+                continue
+            if chosen and float((sentence_vectors[chosen] @ sentence_vectors[i]).max()) >= self.dedup_threshold:
+                continue
+            chosen.append(i)
+            cited.add(c)
+            used += cost
+            if self.max_tokens - used < 4:
+                break
+
+        # 按检索排名分组，组内恢复原文顺序，不相邻的句子之间用省略号隔开
+        groups = {}
+        for i in chosen:
+            c, s, sentence, _ = candidates[i]
+            groups.setdefault(c, []).append((s, sentence))
+        blocks, citations = [], []
+        for ref, c in enumerate(sorted(groups), start=1):
+            parts, last = [], None
+            for s, sentence in sorted(groups[c]):
+                if last is not None and s != last + 1:
+                    parts.append("…")
+                parts.append(sentence)
+                last = s
+            blocks.append(_header(ref, metas[c]) + "\n" + " ".join(parts))
+            citations.append({"ref": ref, "source": metas[c]['source'], "page": format_page_span(metas[c])})
+
+        context = "\n\n".join(blocks)
+        return {
+            "context": context,
+            "citations": citations,
+            "tokens": count_tokens(context),
+            "sentences": len(chosen),
+        }
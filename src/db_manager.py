@@ -1,110 +1,758 @@
-import chromadb
-from sentence_transformers import SentenceTransformer
-from transformers import CLIPProcessor, CLIPModel
-from PIL import Image
 from .config import Config
+from .image_loader import iter_image_batches, list_image_files
+from .image_manifest import ImageManifest, canonical_path
+from .image_cache import open_image_cache
+from .file_handler import CHUNKER_VERSION
+from .query_cache import LRUCache
+from .lexical_index import LexicalIndex
+from .store_generation import StoreGenerations
+from .profiling import profiled, span
+from .inference import (
+    DRIFT_SAMPLE_TEXTS, configure_torch, drift_sample_images, inference_backend, quantize_dynamic, report_drift
+)
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 import os
-import torch
+import numpy as np
+import threading
+import time
+
+
+def _cosine_distance(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return 1 - float(a @ b) / norm if norm else 1.0
+
+
+_RESULT_KEYS = ("ids", "documents", "metadatas", "distances")
+
+
+def _split_results(results, count):
+    """
+    多个查询向量一次 query 的结果拆成逐条结果，格式与单条查询相同
+    """
+    return [
+        {key: [results[key][j]] for key in _RESULT_KEYS if results.get(key) is not None}
+        for j in range(count)
+    ]
+
 
 class DBManager:
+    """
+    向量库与编码模型都在首次使用时才加载 (chromadb / sentence_transformers / transformers
+    也推迟到那时才 import)，每条命令只为自己用到的模型付出加载时间。
+    """
+
     def __init__(self):
-        os.makedirs(Config.DB_PATH, exist_ok=True)
-        self.client = chromadb.PersistentClient(path=Config.DB_PATH)
-        
-        # 1. 论文集合
-        self.paper_collection = self.client.get_or_create_collection(
-            name="papers",
-            metadata={"hnsw:space": "cosine"}
-        )
-        print(f"📡 正在加载文本模型: {Config.TEXT_MODEL_PATH} ...")
-        self.text_model = SentenceTransformer(Config.TEXT_MODEL_PATH, trust_remote_code=True)
+        self._lock = threading.RLock()
+        self._client = None
+        self._paper_collection = None
+        self._image_collection = None
+        self._caption_collection = None
+        self._text_model = None
+        self._reranker = None
+        self._clip_processor = None
+        self._clip_model = None
+        self._image_manifest = None
+        self._image_cache = None
+        self._lexical_index = None
+        self._generations = None
+        # 最近一次重排测得的单条候选耗时 (ms)，用于在每批之前预估是否会超出预算
+        self._rerank_pair_ms = None
+        # 混合检索时词法查询与向量查询并行执行
+        self._search_pool = ThreadPoolExecutor(max_workers=2)
+        # 查询向量缓存 key: (模型, 推理后端, 文本)；检索结果缓存 key: (集合, 写入代数, 查询向量, n_results)
+        self.embedding_cache = LRUCache(Config.QUERY_EMBED_CACHE_SIZE)
+        self.result_cache = LRUCache(Config.QUERY_RESULT_CACHE_SIZE)
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import chromadb
+                    os.makedirs(Config.DB_PATH, exist_ok=True)
+                    self._client = chromadb.PersistentClient(path=Config.DB_PATH)
+        return self._client
 
-        # 2. 图片集合
-        self.image_collection = self.client.get_or_create_collection(
-            name="images",
+    def open_store(self, name, backend=None):
+        """
+        按 Config.VECTOR_BACKEND 打开集合，两种后端的调用方式与返回格式一致
+        """
+        from .vector_store import ChromaVectorStore, NumpyVectorStore
+        backend = (backend or Config.VECTOR_BACKEND or "chroma").lower()
+        if backend == "numpy":
+            return NumpyVectorStore(os.path.join(Config.VECTOR_STORE_DIR, name), dtype=Config.VECTOR_STORE_DTYPE)
+        if backend != "chroma":
+            raise ValueError(f"未知的向量库后端: {backend}")
+        return ChromaVectorStore(self.client.get_or_create_collection(
+            name=name,
             metadata={"hnsw:space": "cosine"}
-        )
-        
-        print(f"👁️ 正在加载 CLIP 模型 (Transformers原生版): {Config.CLIP_MODEL_PATH} ...")
-        try:
-            self.clip_processor = CLIPProcessor.from_pretrained(Config.CLIP_MODEL_PATH)
-            self.clip_model = CLIPModel.from_pretrained(Config.CLIP_MODEL_PATH)
-        except Exception as e:
-            print(f"❌ CLIP 模型加载失败: {e}")
-            raise e
+        ))
+
+    # 1. 论文集合
+    @property
+    def paper_collection(self):
+        if self._paper_collection is None:
+            with self._lock:
+                if self._paper_collection is None:
+                    self._paper_collection = self.open_store("papers")
+        return self._paper_collection
+
+    @property
+    def text_model(self):
+        if self._text_model is None:
+            with self._lock:
+                if self._text_model is None:
+                    with span("load.text_model"):
+                        from sentence_transformers import SentenceTransformer
+                        configure_torch()
+                        print(f"📡 正在加载文本模型: {Config.TEXT_MODEL_PATH} ...")
+                        model = SentenceTransformer(Config.TEXT_MODEL_PATH, trust_remote_code=True)
+                        if inference_backend() == "int8":
+                            print("⚙️ 文本模型使用 int8 动态量化")
+                            quantized = quantize_dynamic(model)
+                            if Config.QUANT_DRIFT_CHECK:
+                                report_drift("MiniLM", model.encode(DRIFT_SAMPLE_TEXTS), quantized.encode(DRIFT_SAMPLE_TEXTS))
+                            model = quantized
+                        self._text_model = model
+        return self._text_model
+
+    @property
+    def reranker(self):
+        if self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    with span("load.reranker"):
+                        from sentence_transformers import CrossEncoder
+                        print(f"🎯 正在加载重排模型: {Config.RERANK_MODEL_PATH} ...")
+                        self._reranker = CrossEncoder(Config.RERANK_MODEL_PATH)
+        return self._reranker
+
+    # 2. 图片集合
+    @property
+    def image_collection(self):
+        if self._image_collection is None:
+            with self._lock:
+                if self._image_collection is None:
+                    self._image_collection = self.open_store("images")
+        return self._image_collection
+
+    # 3. 图片描述集合 (Florence-2 描述文本，用文本模型编码)
+    @property
+    def caption_collection(self):
+        if self._caption_collection is None:
+            with self._lock:
+                if self._caption_collection is None:
+                    self._caption_collection = self.open_store("captions")
+        return self._caption_collection
+
+    def _load_clip(self):
+        with self._lock:
+            if self._clip_model is not None:
+                return
+            with span("load.clip"):
+                from transformers import CLIPProcessor, CLIPModel
+                configure_torch()
+                print(f"👁️ 正在加载 CLIP 模型 (Transformers原生版): {Config.CLIP_MODEL_PATH} ...")
+                try:
+                    self._clip_processor = CLIPProcessor.from_pretrained(Config.CLIP_MODEL_PATH)
+                    model = CLIPModel.from_pretrained(Config.CLIP_MODEL_PATH)
+                except Exception as e:
+                    print(f"❌ CLIP 模型加载失败: {e}")
+                    raise e
+                if inference_backend() == "int8":
+                    print("⚙️ CLIP 模型使用 int8 动态量化")
+                    quantized = quantize_dynamic(model)
+                    if Config.QUANT_DRIFT_CHECK:
+                        images = drift_sample_images()
+                        report_drift("CLIP 文本塔", self._clip_features(model, texts=DRIFT_SAMPLE_TEXTS),
+                                     self._clip_features(quantized, texts=DRIFT_SAMPLE_TEXTS))
+                        report_drift("CLIP 图像塔", self._clip_features(model, images=images),
+                                     self._clip_features(quantized, images=images))
+                    model = quantized
+                self._clip_model = model
+
+    @property
+    def clip_processor(self):
+        if self._clip_model is None:
+            self._load_clip()
+        return self._clip_processor
+
+    @property
+    def clip_model(self):
+        if self._clip_model is None:
+            self._load_clip()
+        return self._clip_model
+
+    # 4. 图片索引清单 (增量扫描)
+    @property
+    def image_manifest(self):
+        if self._image_manifest is None:
+            with self._lock:
+                if self._image_manifest is None:
+                    manifest = ImageManifest()
+                    manifest.migrate(self._rename_image_ids)
+                    self._image_manifest = manifest
+        return self._image_manifest
+
+    def _rename_image_ids(self, renames):
+        """
+        清单迁移时把图片集合中的旧路径 ID 改为规范路径，向量原样搬过去，不重新编码
+        """
+        found = self.image_collection.get(ids=list(renames), include=["embeddings", "metadatas"])
+        moved = [(i, renames[old]) for i, old in enumerate(found['ids']) if renames[old] is not None]
+        if moved:
+            self.image_collection.upsert(
+                ids=[new for _, new in moved],
+                embeddings=[np.asarray(found['embeddings'][i], dtype=np.float32).tolist() for i, _ in moved],
+                metadatas=[{**(found['metadatas'][i] or {}), "source": new} for i, new in moved]
+            )
+        if found['ids']:
+            self.image_collection.delete(ids=list(found['ids']))
+            self._invalidate("images")
+
+    # 5. 缩小后图片的磁盘缓存 (关闭时为 None)
+    @property
+    def image_cache(self):
+        if self._image_cache is None:
+            with self._lock:
+                if self._image_cache is None:
+                    self._image_cache = open_image_cache() or False
+        return self._image_cache or None
+
+    # 6. 论文 BM25 索引
+    @property
+    def lexical_index(self):
+        if self._lexical_index is None:
+            with self._lock:
+                if self._lexical_index is None:
+                    index = LexicalIndex()
+                    self._sync_lexical_index(index)
+                    self._lexical_index = index
+        return self._lexical_index
+
+    def _sync_lexical_index(self, index, page_size=5000):
+        """
+        词法索引与论文集合条目数不一致时 (旧版本建的库、写入中途中断)，从向量库全量重建
+        """
+        total = self.paper_collection.count()
+        if len(index) == total:
+            return
+        print(f"🔤 正在从向量库重建词法索引 ({total} 个片段)...")
+        with span("lexical.rebuild", items=total):
+            index.clear()
+            for offset in range(0, total, page_size):
+                batch = self.paper_collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+                index.add(batch['ids'], batch['documents'], batch['metadatas'])
+
+    # 7. 集合写入代数 (跨进程共享)
+    @property
+    def generations(self):
+        if self._generations is None:
+            with self._lock:
+                if self._generations is None:
+                    self._generations = StoreGenerations()
+        return self._generations
+
+    def _invalidate(self, collection_name):
+        """
+        集合有写入时递增其持久化的写入代数 (其他进程的结果缓存随之失效)，并清掉本进程中该集合的旧缓存
+        """
+        self.generations.bump(collection_name)
+        self.result_cache.remove_where(lambda key: key[0] == collection_name)
+
+    def cache_stats(self):
+        return {
+            "embedding": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
 
     def _normalize(self, embedding):
+        import torch
         if isinstance(embedding, list):
             embedding = torch.tensor(embedding)
         norm = embedding.norm(p=2, dim=-1, keepdim=True)
         return (embedding / norm).tolist()
 
-    def add_paper_chunks(self, file_path, chunks, category):
+    def find_paper(self, doc_hash):
+        """
+        按内容哈希查找已入库的论文，返回其任一 chunk 的 metadata，未入库返回 None
+        """
+        result = self.paper_collection.get(
+            where={"doc_hash": doc_hash},
+            limit=1,
+            include=["metadatas"]
+        )
+        if result['ids']:
+            return result['metadatas'][0]
+        return None
+
+    def update_paper_source(self, doc_hash, new_path):
+        """
+        论文被移动/重命名后，只更新路径元数据，不重新编码
+        """
+        result = self.paper_collection.get(where={"doc_hash": doc_hash}, include=["metadatas"])
+        if not result['ids']:
+            return
+        metadatas = [{**meta, "source": new_path} for meta in result['metadatas']]
+        self.paper_collection.update(ids=result['ids'], metadatas=metadatas)
+        self.lexical_index.update_source(doc_hash, new_path)
+        self._invalidate("papers")
+
+    def add_paper_chunks(self, file_path, chunks, category, doc_hash=None):
         """
         存入带有页码的 chunks
+        doc_hash 为文件内容哈希，作为 chunk ID 前缀，同一论文无论放在哪里都只索引一次
+        """
+        self.add_paper_batch([{
+            "file_path": file_path,
+            "chunks": chunks,
+            "category": category,
+            "doc_hash": doc_hash,
+        }])
+
+    @profiled("db.add_paper_batch")
+    def add_paper_batch(self, papers):
+        """
+        多篇论文合并入库：所有 chunk 一次 encode，一次 upsert。
+        papers: [{'file_path', 'chunks', 'category', 'doc_hash'}, ...]
         """
         ids = []
-        embeddings = []
         documents = []
         metadatas = []
+        sources = []
+        hashes = []
 
-        texts = [c['text'] for c in chunks]
-        if not texts:
+        for paper in papers:
+            file_path = paper['file_path']
+            doc_hash = paper.get('doc_hash')
+            if not paper['chunks']:
+                continue
+            sources.append(file_path)
+            if doc_hash:
+                hashes.append(doc_hash)
+            for i, chunk in enumerate(paper['chunks']):
+                # ID 格式: 内容哈希_c序号
+                ids.append(f"{doc_hash or file_path}_c{chunk.get('chunk', i)}")
+                documents.append(chunk['text'])
+                meta = {
+                    "source": file_path,
+                    "category": paper['category'],
+                    "page": chunk['page'],
+                    "page_end": chunk.get('page_end', chunk['page']),
+                    "chunker": CHUNKER_VERSION
+                }
+                if doc_hash:
+                    meta["doc_hash"] = doc_hash
+                metadatas.append(meta)
+
+        if not documents:
             return
-            
-        embeddings_list = self.text_model.encode(texts).tolist()
-
-        for i, chunk in enumerate(chunks):
-            # ID 格式: 文件路径_页码
-            chunk_id = f"{file_path}_p{chunk['page']}"
-            ids.append(chunk_id)
-            embeddings.append(embeddings_list[i])
-            documents.append(chunk['text'])
-            metadatas.append({
-                "source": file_path,
-                "category": category,
-                "page": chunk['page']
-            })
 
-        self.paper_collection.upsert(
-            ids=ids,
+        text_model = self.text_model
+        with span("text.encode_chunks", items=len(documents)):
+            embeddings = text_model.encode(documents, batch_size=Config.TEXT_ENCODE_BATCH_SIZE).tolist()
+        lexical_index = self.lexical_index
+
+        # 清理这些论文的旧 chunk (旧切分方式、旧 ID 格式或文件内容已变化)
+        stale = {"source": {"$in": sources}}
+        if hashes:
+            stale = {"$or": [stale, {"doc_hash": {"$in": hashes}}]}
+        with span("store.upsert_papers", items=len(ids)):
+            self.paper_collection.delete(where=stale)
+            self.paper_collection.upsert(
+                ids=ids,
+                embeddings=embeddings,
+                documents=documents,
+                metadatas=metadatas
+            )
+        with span("lexical.add", items=len(ids)):
+            lexical_index.delete_papers(sources, hashes)
+            lexical_index.add(ids, documents, metadatas)
+        self._invalidate("papers")
+
+    def _clip_features(self, model, images=None, texts=None):
+        """
+        CLIP 图像塔 (images) 或文本塔 (texts) 一次前向，返回归一化后的向量列表
+        """
+        import torch
+        with torch.inference_mode():
+            if images is not None:
+                inputs = self._clip_processor(images=images, return_tensors="pt")
+                features = model.get_image_features(**inputs)
+            else:
+                inputs = self._clip_processor(text=texts, return_tensors="pt", padding=True)
+                features = model.get_text_features(**inputs)
+        return self._normalize(features)
+
+    @profiled("clip.embed_images", items=len)
+    def _embed_images(self, images):
+        """
+        一次前向计算整批图片的 CLIP 特征，返回归一化后的向量列表
+        """
+        return self._clip_features(self.clip_model, images=images)
+
+    @profiled("db.add_image_embeddings", items=lambda result: len(result[0]))
+    def add_image_embeddings(self, paths, batch_size=None, num_workers=None,
+                             progress_callback=None, batch_callback=None):
+        """
+        批量索引图片：后台线程预取解码，整批 CLIP 推理，整批 upsert。
+        batch_callback(indexed_paths) 在每批写入后调用。
+        返回 (成功路径列表, [(失败路径, 错误信息), ...])
+        """
+        batch_size = batch_size or Config.IMAGE_BATCH_SIZE
+        num_workers = num_workers or Config.IMAGE_LOADER_WORKERS
+        # 图片 ID 为规范路径，同一文件换一种写法不会重复入库
+        paths = list(dict.fromkeys(canonical_path(p) for p in paths))
+        # CLIP 输入为 224px，解码时直接缩小 (缩小结果缓存在磁盘，重复索引不再解码原图)，减轻 processor 负担
+        size = self.clip_processor.image_processor.size
+        min_side = size.get("shortest_edge") if isinstance(size, dict) else size
+
+        indexed, failures = [], []
+        done = 0
+        for ok_paths, images, errors in iter_image_batches(paths, batch_size, num_workers, min_side, self.image_cache):
+            done += len(images) + len(errors)
+            failures.extend((p, str(e)) for p, e in errors)
+            if images:
+                try:
+                    embeddings = self._embed_images(images)
+                except Exception:
+                    # 整批失败时逐张重试，定位出错的文件，其余照常入库
+                    embeddings, kept = [], []
+                    for path, image in zip(ok_paths, images):
+                        try:
+                            embeddings.extend(self._embed_images([image]))
+                            kept.append(path)
+                        except Exception as e:
+                            failures.append((path, str(e)))
+                    ok_paths = kept
+
+                if ok_paths:
+                    with span("store.upsert_images", items=len(ok_paths)):
+                        self.image_collection.upsert(
+                            ids=ok_paths,
+                            embeddings=embeddings,
+                            metadatas=[{"source": p} for p in ok_paths]
+                        )
+                    self._invalidate("images")
+                    indexed.extend(ok_paths)
+                    if batch_callback:
+                        batch_callback(ok_paths)
+
+            if progress_callback:
+                progress_callback(done, len(paths))
+
+        for path, err in failures:
+            print(f"❌ 图片处理错误 {path}: {err}")
+        return indexed, failures
+
+    @profiled("db.sync_images")
+    def sync_images(self, directory, force=False, progress_callback=None):
+        """
+        增量同步目录与图片索引：只编码新增/修改的文件，删除已消失文件的索引，
+        CLIP 模型变化时全部重新编码。返回各类文件数量统计。
+        """
+        model_id = Config.CLIP_MODEL_PATH
+        directory = canonical_path(directory)
+        paths = list_image_files(directory)
+        to_embed, touched, removed, unchanged = self.image_manifest.plan(paths, directory, model_id, force=force)
+
+        if removed:
+            self.image_collection.delete(ids=removed)
+            self._invalidate("images")
+            self.image_manifest.remove(removed)
+        self.image_manifest.record(touched, model_id)
+        if self.image_cache:
+            # 清单扫描已算过哈希，缓存无需再读一遍文件
+            self.image_cache.remember(to_embed)
+
+        # 每批写入后立即记入清单，中断后重新扫描可从断点继续
+        indexed, failures = self.add_image_embeddings(
+            list(to_embed),
+            progress_callback=progress_callback,
+            batch_callback=lambda done: self.image_manifest.record({p: to_embed[p] for p in done}, model_id)
+        )
+        return {
+            "indexed": len(indexed),
+            "unchanged": unchanged + len(touched),
+            "removed": len(removed),
+            "failed": failures,
+        }
+
+    def add_image_embedding(self, file_path):
+        indexed, _ = self.add_image_embeddings([file_path])
+        return bool(indexed)
+
+    def captioned_images(self, paths):
+        """
+        返回 paths 中已有描述索引的图片路径集合 (批量描述断点续跑)，按规范路径比较，返回调用方的原样路径
+        """
+        paths = list(paths)
+        if not paths:
+            return set()
+        found = set(self.caption_collection.get(ids=list({canonical_path(p) for p in paths}), include=[])['ids'])
+        return {p for p in paths if canonical_path(p) in found}
+
+    @profiled("db.add_image_captions")
+    def add_image_captions(self, paths, captions):
+        """
+        图片描述用文本模型整批编码后写入 captions 集合，ID 为图片的规范路径
+        """
+        # 同一文件的不同写法只保留一条
+        records = dict(zip((canonical_path(p) for p in paths), (str(c) for c in captions)))
+        if not records:
+            return
+        paths, documents = list(records), list(records.values())
+        text_model = self.text_model
+        with span("text.encode_captions", items=len(documents)):
+            embeddings = text_model.encode(documents, batch_size=Config.TEXT_ENCODE_BATCH_SIZE).tolist()
+        self.caption_collection.upsert(
+            ids=list(paths),
             embeddings=embeddings,
             documents=documents,
-            metadatas=metadatas
+            metadatas=[{"source": p, "model": Config.VISION_MODEL_PATH} for p in paths]
         )
+        self._invalidate("captions")
 
-    def add_image_embedding(self, file_path):
-        try:
-            image = Image.open(file_path)
-            inputs = self.clip_processor(images=image, return_tensors="pt")
-            with torch.no_grad():
-                image_features = self.clip_model.get_image_features(**inputs)
-            embedding = self._normalize(image_features[0])
-            self.image_collection.upsert(
-                ids=[file_path],
-                embeddings=[embedding],
-                metadatas=[{"source": file_path}]
-            )
-            return True
-        except Exception as e:
-            print(f"❌ 图片处理错误 {file_path}: {e}")
-            return False
-
-    def search_papers(self, query, n_results=3):
-        query_embedding = self.text_model.encode(query).tolist()
-        results = self.paper_collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
+    def _cached_encode(self, model_key, texts, encode_fn):
+        """
+        先查查询向量缓存，未命中的文本合并成一次批量编码
+        """
+        texts = list(texts)
+        embeddings = [self.embedding_cache.get((model_key, t)) for t in texts]
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if missing:
+            # 同一批里重复的文本只编码一次
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = dict(zip(unique, encode_fn(unique)))
+            for text, embedding in encoded.items():
+                self.embedding_cache.put((model_key, text), embedding)
+            for i in missing:
+                embeddings[i] = encoded[texts[i]]
+        return embeddings
+
+    @profiled("text.encode_queries", items=len)
+    def encode_queries(self, texts):
+        """
+        MiniLM 批量编码查询文本，返回向量列表
+        """
+        return self._cached_encode(
+            ("text", Config.TEXT_MODEL_PATH, inference_backend()), texts,
+            lambda batch: self.text_model.encode(batch, batch_size=Config.TEXT_ENCODE_BATCH_SIZE).tolist()
         )
-        return results
 
-    def search_images(self, text_query, n_results=3):
-        inputs = self.clip_processor(text=[text_query], return_tensors="pt", padding=True)
-        with torch.no_grad():
-            text_features = self.clip_model.get_text_features(**inputs)
-        embedding = self._normalize(text_features[0])
-        results = self.image_collection.query(
-            query_embeddings=[embedding],
-            n_results=n_results
+    @profiled("clip.encode_queries", items=len)
+    def encode_image_queries(self, texts):
+        """
+        CLIP 文本塔批量编码查询文本，返回归一化后的向量列表
+        """
+        return self._cached_encode(
+            ("clip", Config.CLIP_MODEL_PATH, inference_backend()), texts,
+            lambda batch: self._clip_features(self.clip_model, texts=batch)
         )
-        return results
\ No newline at end of file
+
+    def _cached_query(self, collection_name, collection, query_embedding, n_results):
+        return self._cached_query_batch(collection_name, collection, [query_embedding], n_results)[0]
+
+    def _cached_query_batch(self, collection_name, collection, query_embeddings, n_results):
+        """
+        逐条查结果缓存，未命中的查询向量合并成一次多向量查询，返回逐条结果列表
+        """
+        generation = self.generations.get(collection_name)
+        keys = [(collection_name, generation, tuple(e), n_results) for e in query_embeddings]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            with span(f"store.query_{collection_name}", items=len(missing)):
+                found = collection.query(
+                    query_embeddings=[query_embeddings[i] for i in missing],
+                    n_results=n_results
+                )
+            for i, result in zip(missing, _split_results(found, len(missing))):
+                self.result_cache.put(keys[i], result)
+                results[i] = result
+        return results
+
+    @profiled("db.search_papers")
+    def search_papers(self, query, n_results=3, query_embedding=None, rerank=None):
+        """
+        query 为字符串时返回一个结果；为列表时返回结果列表 (一次批量编码、一次多向量查询)，
+        此时 query_embedding 为对应的向量列表
+        """
+        if isinstance(query, str):
+            embeddings = None if query_embedding is None else [query_embedding]
+            return self._search_papers([query], n_results, embeddings, rerank)[0]
+        return self._search_papers(list(query), n_results, query_embedding, rerank)
+
+    def _search_papers(self, queries, n_results, query_embeddings=None, rerank=None):
+        if not queries:
+            return []
+        generation = self.generations.get("papers")
+        if Config.RERANK_ENABLED if rerank is None else rerank:
+            keys = [("papers", generation, "rerank", q, n_results) for q in queries]
+            results = [self.result_cache.get(key) for key in keys]
+            missing = [i for i, r in enumerate(results) if r is None]
+            if missing:
+                candidates = self._search_papers(
+                    [queries[i] for i in missing], max(n_results, Config.RERANK_CANDIDATES),
+                    None if query_embeddings is None else [query_embeddings[i] for i in missing], rerank=False
+                )
+                for i, cands in zip(missing, candidates):
+                    results[i], complete = self._rerank(queries[i], cands, n_results)
+                    # 超时退回的结果不缓存，下次查询仍尝试重排
+                    if complete:
+                        self.result_cache.put(keys[i], results[i])
+            return results
+
+        if not Config.HYBRID_SEARCH:
+            if query_embeddings is None:
+                query_embeddings = self.encode_queries(queries)
+            return self._cached_query_batch("papers", self.paper_collection, query_embeddings, n_results)
+
+        keys = [("papers", generation, "hybrid", q, n_results) for q in queries]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing:
+            if query_embeddings is None:
+                embeddings = self.encode_queries([queries[i] for i in missing])
+            else:
+                embeddings = [query_embeddings[i] for i in missing]
+            fused = self._hybrid_search([queries[i] for i in missing], embeddings, n_results)
+            for i, result in zip(missing, fused):
+                self.result_cache.put(keys[i], result)
+                results[i] = result
+        return results
+
+    def _hybrid_search(self, queries, query_embeddings, n_results):
+        """
+        BM25 与向量检索并行各取候选，按倒数排名融合 (RRF)，返回与 Chroma query 相同格式的逐条结果。
+        向量部分所有查询一次多向量查询，只取 id 与距离；融合后的前 n_results 个再统一取一次文本，
+        只被词法命中的 chunk 用其存储的向量计算距离。
+        """
+        candidates = max(n_results, Config.HYBRID_CANDIDATES)
+        lexical_index = self.lexical_index
+        lexical_future = self._search_pool.submit(lambda: [lexical_index.search(q, candidates) for q in queries])
+        with span("store.query_papers", items=len(queries)):
+            vectors = self.paper_collection.query(
+                query_embeddings=list(query_embeddings), n_results=candidates, include=["distances"]
+            )
+        vectors = _split_results(vectors, len(queries))
+        lexicals = lexical_future.result()
+
+        tops, distances = [], []
+        for vector, lexical in zip(vectors, lexicals):
+            fused = Counter()
+            for rank, doc_id in enumerate(vector['ids'][0]):
+                fused[doc_id] += 1 / (Config.RRF_K + rank + 1)
+            for rank, (doc_id, _) in enumerate(lexical):
+                fused[doc_id] += 1 / (Config.RRF_K + rank + 1)
+            tops.append([doc_id for doc_id, _ in fused.most_common(n_results)])
+            distances.append(dict(zip(vector['ids'][0], vector['distances'][0])))
+
+        wanted = sorted({doc_id for top in tops for doc_id in top})
+        lexical_only = any(doc_id not in dist for top, dist in zip(tops, distances) for doc_id in top)
+        include = ["documents", "metadatas", "embeddings"] if lexical_only else ["documents", "metadatas"]
+        got = self.paper_collection.get(ids=wanted, include=include) if wanted else {'ids': []}
+        found = {
+            doc_id: (got['documents'][i], got['metadatas'][i], got['embeddings'][i] if lexical_only else None)
+            for i, doc_id in enumerate(got['ids'])
+        }
+
+        results = []
+        for query_embedding, top, dist in zip(query_embeddings, tops, distances):
+            # 词法索引里可能残留向量库已删除的条目
+            top = [doc_id for doc_id in top if doc_id in found]
+            results.append({
+                "ids": [top],
+                "documents": [[found[doc_id][0] for doc_id in top]],
+                "metadatas": [[found[doc_id][1] for doc_id in top]],
+                "distances": [[
+                    dist[doc_id] if doc_id in dist else _cosine_distance(query_embedding, found[doc_id][2])
+                    for doc_id in top
+                ]],
+            })
+        return results
+
+    @profiled("rerank")
+    def _rerank(self, query, results, n_results, budget_ms=None):
+        """
+        cross-encoder 分批为候选打分并按分数重排，保留前 n_results 个。
+        每批 (包括第一批) 开始前按测得的单条耗时预估剩余候选能否在时间预算内打完，不能就放弃重排，按原检索顺序截断。
+        返回 (结果, 是否完成重排)
+        """
+        budget_ms = Config.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        documents = results['documents'][0]
+        reranker = self.reranker  # 模型加载不计入预算
+        deadline = time.perf_counter() + budget_ms / 1000
+
+        scores = []
+        i = 0
+        while i < len(documents):
+            pair_ms = self._rerank_pair_ms
+            remaining_ms = (deadline - time.perf_counter()) * 1000
+            size = Config.RERANK_BATCH_SIZE
+            if pair_ms is None:
+                # 还没有测过单条耗时 (首次重排) 时先只打一条，测出耗时再按整批预估
+                size = 1
+            elif pair_ms * (len(documents) - i) > remaining_ms:
+                # 剩余候选预计打不完就放弃。每次查询开头仍先打一条重新测量:
+                # 一次偶然的慢测量 (冷启动、GC、服务内争用) 不会让之后的查询永远跳过重排
+                size = 1 if i == 0 else 0
+            if remaining_ms <= 0 or size == 0:
+                print(f"⏱️ 重排预计超出 {budget_ms}ms 预算，使用原检索顺序")
+                return {key: [results[key][0][:n_results]] for key in _RESULT_KEYS}, False
+            batch = documents[i:i + size]
+            start = time.perf_counter()
+            scores.extend(float(s) for s in reranker.predict([(query, doc) for doc in batch]))
+            self._rerank_pair_ms = (time.perf_counter() - start) * 1000 / len(batch)
+            i += len(batch)
+
+        order = sorted(range(len(documents)), key=lambda j: scores[j], reverse=True)[:n_results]
+        return {key: [[results[key][0][j] for j in order]] for key in _RESULT_KEYS}, True
+
+    @profiled("context.build")
+    def build_context(self, query, results, max_tokens=None):
+        """
+        检索结果 -> 受 token 预算约束、带 (来源, 页码) 引用的 RAG 上下文，句子用文本模型打分
+        """
+        from .context_builder import ContextBuilder
+        return ContextBuilder(self._encode_sentences, max_tokens=max_tokens).build(query, results)
+
+    def _encode_sentences(self, texts):
+        """
+        上下文候选句子直接编码，不经过查询向量缓存 (每次检索的句子都不同，放进去只会挤掉真正的查询)
+        """
+        with span("text.encode_sentences", items=len(texts)):
+            return self.text_model.encode(
+                list(texts), batch_size=Config.TEXT_ENCODE_BATCH_SIZE, normalize_embeddings=True
+            )
+
+    @profiled("db.search_images")
+    def search_images(self, text_query, n_results=3, query_embedding=None):
+        """
+        text_query 为列表时批量检索 (一次批量编码、一次多向量查询)，返回结果列表
+        """
+        if not isinstance(text_query, str):
+            queries = list(text_query)
+            if query_embedding is None:
+                query_embedding = self.encode_image_queries(queries)
+            return self._cached_query_batch("images", self.image_collection, query_embedding, n_results)
+        if query_embedding is None:
+            query_embedding = self.encode_image_queries([text_query])[0]
+        return self._cached_query("images", self.image_collection, query_embedding, n_results)
+
+    @profiled("db.search_captions")
+    def search_captions(self, query, n_results=3, query_embedding=None):
+        """
+        按 Florence-2 生成的描述文本检索图片，query 为列表时批量检索
+        """
+        if not isinstance(query, str):
+            queries = list(query)
+            if query_embedding is None:
+                query_embedding = self.encode_queries(queries)
+            return self._cached_query_batch("captions", self.caption_collection, query_embedding, n_results)
+        if query_embedding is None:
+            query_embedding = self.encode_queries([query])[0]
+        return self._cached_query("captions", self.caption_collection, query_embedding, n_results)
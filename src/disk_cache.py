@@ -0,0 +1,131 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+
+def make_key(*parts):
+    """
+    把任意可 JSON 序列化的键组成部分压成固定长度的哈希键
+    """
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    基于 SQLite 的持久化键值缓存，值以 JSON 存储，超过容量时按最近访问时间 (近似 LRU) 淘汰。
+    可在多线程间共享。
+    命中时不立即写库: 访问时间只在比记录值新 touch_interval 秒以上时才更新，
+    且先攒在内存里，随下一次 set 或攒满 touch_batch 条时一次提交，读多的场景不再每次命中都 fsync。
+    """
+
+    def __init__(self, path, max_entries=None, max_bytes=None, touch_interval=60, touch_batch=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.touch_batch = touch_batch
+        self._pending_touches = {}  # key -> 待写入的访问时间
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON entries(last_access)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self.conn.execute("SELECT value, last_access FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            now = time.time()
+            if now - row[1] >= self.touch_interval:
+                self._pending_touches[key] = now
+                if len(self._pending_touches) >= self.touch_batch:
+                    self._flush_touches()
+                    self.conn.commit()
+        return json.loads(row[0])
+
+    def _flush_touches(self):
+        """
+        把攒下的访问时间写入当前事务 (调用方负责提交)
+        """
+        if self._pending_touches:
+            self.conn.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(t, key) for key, t in self._pending_touches.items()]
+            )
+            self._pending_touches.clear()
+
+    def flush(self):
+        with self._lock:
+            self._flush_touches()
+            self.conn.commit()
+
+    def set(self, key, value):
+        data = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._pending_touches.pop(key, None)
+            # 淘汰前先补上命中记录，刚被读过的条目不会被当成最久未访问
+            self._flush_touches()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data), time.time())
+            )
+            self._evict()
+            self.conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._pending_touches.pop(key, None)
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._pending_touches.clear()
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _evict(self):
+        if self.max_entries:
+            count = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_access ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+        if self.max_bytes:
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                # 从最久未访问的开始删，直到总大小回到上限以内
+                excess = total - self.max_bytes
+                rows = self.conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall()
+                doomed = []
+                for key, size in rows:
+                    if excess <= 0:
+                        break
+                    doomed.append((key,))
+                    excess -= size
+                self.conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
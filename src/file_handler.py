@@ -1,30 +1,124 @@
 import os
 import shutil
-import pypdf
+import re
+import hashlib
+from .config import Config
+from .profiling import profiled
 
+def compute_file_hash(file_path, block_size=1 << 20):
+    """
+    按块流式计算文件内容的 sha256，避免大文件一次性读入内存
+    """
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+# 中日韩统一表意文字，BERT 系分词器逐字切分
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# 近似 WordPiece 预切分：汉字逐字、其余单词与标点分别计为 token
+_TOKEN_RE = re.compile(rf"[{_CJK}]|[^\W{_CJK}]+|[^\w\s]")
+# 窗口切分单位：单个汉字，或连续的非空白非汉字串；前导空白用于还原原文间隔
+_UNIT_RE = re.compile(rf"(\s*)([{_CJK}]|[^\s{_CJK}]+)")
+
+# chunk 切分方式版本号，切分规则变化时递增，旧索引会被重新入库
+CHUNKER_VERSION = 3
+
+def count_tokens(text):
+    """
+    近似 token 数，chunk 切分与 RAG 上下文预算共用
+    """
+    return len(_TOKEN_RE.findall(text))
+
+def iter_pdf_pages(file_path):
+    """
+    逐页读取 PDF，yield (页码, 文本)，页码从 1 开始，过滤掉太短的页
+    """
+    import pypdf
+    reader = pypdf.PdfReader(file_path)
+    for i, page in enumerate(reader.pages):
+        page_text = page.extract_text()
+        if page_text and len(page_text) > 50:
+            yield i + 1, page_text
+
+def iter_token_windows(pages, max_tokens=None, overlap=None):
+    """
+    把 (页码, 文本) 流切成按 token 数限定、相邻窗口有重叠的 chunk。
+    只缓存当前窗口，整本书也不会一次性读入内存。
+    yield {'text', 'page' (起始页), 'page_end', 'chunk' (序号)}
+    """
+    max_tokens = max_tokens or Config.CHUNK_MAX_TOKENS
+    overlap = Config.CHUNK_OVERLAP_TOKENS if overlap is None else overlap
+    overlap = min(overlap, max_tokens // 2)
+
+    window = []       # [(前导间隔, 单位, 页码, token 数)]
+    window_tokens = 0
+    fresh_tokens = 0  # 上次输出之后新加入的 token 数
+    index = 0
+
+    def make_chunk():
+        # 汉字之间不加空格，其余单位之间以单个空格分隔
+        return {
+            "text": window[0][1] + "".join(sep + unit for sep, unit, _, _ in window[1:]),
+            "page": window[0][2],
+            "page_end": window[-1][2],
+            "chunk": index,
+        }
+
+    for page_no, text in pages:
+        for match in _UNIT_RE.finditer(text):
+            unit = match.group(2)
+            n = count_tokens(unit)
+            # 页与页之间按空白处理
+            sep = " " if match.group(1) or match.start() == 0 else ""
+            window.append((sep, unit, page_no, n))
+            window_tokens += n
+            fresh_tokens += n
+            if window_tokens >= max_tokens:
+                yield make_chunk()
+                index += 1
+                # 保留末尾约 overlap 个 token 作为下一窗口的开头
+                keep, kept_tokens = [], 0
+                for item in reversed(window):
+                    if kept_tokens + item[3] > overlap:
+                        break
+                    keep.append(item)
+                    kept_tokens += item[3]
+                window = keep[::-1]
+                window_tokens = kept_tokens
+                fresh_tokens = 0
+
+    if window and fresh_tokens:
+        yield make_chunk()
+
+@profiled("pdf.extract", items=len)
 def extract_text_from_pdf(file_path):
     """
-    返回一个列表，每个元素是字典: {'text': string, 'page': int}
+    返回一个列表，每个元素是字典: {'text': string, 'page': int, 'page_end': int, 'chunk': int}
     """
     chunks = []
     try:
-        reader = pypdf.PdfReader(file_path)
-        # 读取前 10 页 (可根据需要调整)
-        num_pages = min(len(reader.pages), 10) 
-        
-        for i in range(num_pages):
-            page_text = reader.pages[i].extract_text()
-            if page_text and len(page_text) > 50: # 过滤掉太短的页
-                chunks.append({
-                    "text": page_text,
-                    "page": i + 1  # 页码从 1 开始
-                })
+        for chunk in iter_token_windows(iter_pdf_pages(file_path)):
+            chunks.append(chunk)
     except Exception as e:
         print(f"PDF 读取错误 {file_path}: {e}")
     return chunks
 
+def format_page_span(meta):
+    """
+    chunk 的页码描述，跨页时显示范围
+    """
+    page_end = meta.get('page_end', meta['page'])
+    if page_end != meta['page']:
+        return f"{meta['page']}-{page_end}"
+    return f"{meta['page']}"
+
 def move_file_to_category(file_path, category):
     base_dir = os.path.dirname(file_path)
+    # 已经在对应分类目录下 (重新入库时)，不再嵌套移动
+    if os.path.basename(os.path.normpath(base_dir)) == category:
+        return file_path
     target_dir = os.path.join(base_dir, category)
     
     if not os.path.exists(target_dir):
@@ -0,0 +1,211 @@
+import io
+import os
+import time
+import sqlite3
+import threading
+from PIL import Image, PngImagePlugin
+from .config import Config
+from .file_handler import compute_file_hash
+from .image_loader import load_image_rgb
+
+# 缓存文件的缩放/编码方式版本号，规则变化时递增，旧文件不再命中并随容量淘汰
+IMAGE_CACHE_VERSION = 1
+
+
+def _parse_size(text):
+    try:
+        width, height = text.split("x")
+        return int(width), int(height)
+    except (AttributeError, ValueError):
+        return None
+
+
+class ImageCache:
+    """
+    缩小后图片的内容寻址磁盘缓存: CLIP / Florence-2 的模型输入 (无损 PNG) 与图库缩略图 (JPEG)。
+    - 缓存文件按 (内容哈希, 尺寸) 命名，复制或移动过的同一张图共享缓存
+    - 记录每个源文件的 (大小, mtime_ns, 内容哈希)，文件未变时不必重新读取计算哈希，变化后自动换到新条目
+    - 总大小超过上限时按最近访问时间淘汰
+    可在多线程间共享 (图片预取线程池)。
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or os.path.join(Config.CACHE_DIR, "images")
+        self.max_bytes = Config.IMAGE_CACHE_MAX_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+        # 命中时也要更新访问时间，WAL 下提交不必每次刷盘
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sources (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                name TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self.conn.commit()
+        self._total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, path):
+        """
+        文件内容的 sha256 (与 compute_file_hash 一致)；大小与 mtime 未变时直接返回记录值
+        """
+        st = os.stat(path)
+        with self._lock:
+            row = self.conn.execute("SELECT size, mtime_ns, hash FROM sources WHERE path = ?", (path,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = compute_file_hash(path)
+        self.remember({path: (st.st_size, st.st_mtime_ns, digest)})
+        return digest
+
+    def remember(self, records):
+        """
+        登记已经算过哈希的文件 (如图片清单扫描时)，records: {path: (size, mtime_ns, hash)}
+        """
+        if not records:
+            return
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sources (path, size, mtime_ns, hash) VALUES (?, ?, ?, ?)",
+                [(p, size, mtime_ns, digest) for p, (size, mtime_ns, digest) in records.items()]
+            )
+            self.conn.commit()
+
+    def _file(self, name):
+        return os.path.join(self.directory, name[:2], name)
+
+    def _touch(self, name):
+        with self._lock:
+            self.hits += 1
+            self.conn.execute("UPDATE entries SET last_access = ? WHERE name = ?", (time.time(), name))
+            self.conn.commit()
+
+    def _open(self, name):
+        try:
+            image = Image.open(self._file(name))
+            image.load()
+        except (OSError, SyntaxError):
+            # 不存在或已损坏 (写入中断)，当作未命中重新生成
+            return None
+        self._touch(name)
+        return image
+
+    def _put(self, name, image, format, **params):
+        buf = io.BytesIO()
+        image.save(buf, format, **params)
+        data = buf.getvalue()
+        file = self._file(name)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        # 先写临时文件再原子替换，并发写同一条目也不会读到半个文件
+        tmp = f"{file}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, file)
+
+        with self._lock:
+            self.misses += 1
+            row = self.conn.execute("SELECT size FROM entries WHERE name = ?", (name,)).fetchone()
+            self._total += len(data) - (row[0] if row else 0)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (name, size, last_access) VALUES (?, ?, ?)",
+                (name, len(data), time.time())
+            )
+            self._evict(keep=name)
+            self.conn.commit()
+        return file
+
+    def _evict(self, keep):
+        if not self.max_bytes or self._total <= self.max_bytes:
+            return
+        # 从最久未访问的开始删，留出 10% 余量，避免每次写入都触发淘汰
+        target = self.max_bytes * 0.9
+        doomed = []
+        for name, size in self.conn.execute("SELECT name, size FROM entries ORDER BY last_access ASC"):
+            if self._total <= target:
+                break
+            if name == keep:
+                continue
+            doomed.append(name)
+            self._total -= size
+        self.conn.executemany("DELETE FROM entries WHERE name = ?", [(n,) for n in doomed])
+        for name in doomed:
+            try:
+                os.remove(self._file(name))
+            except OSError:
+                pass
+
+    def load(self, path, min_side):
+        """
+        返回短边缩放到 min_side 的 RGB 图片 (模型输入)，与 load_image_rgb(path, min_side) 像素一致。
+        原图尺寸保存在 image.info["source_size"]，坐标类输出需要换算回原图时使用。
+        """
+        name = f"{self.content_hash(path)}_s{min_side}_v{IMAGE_CACHE_VERSION}.png"
+        image = self._open(name)
+        if image is not None:
+            source_size = _parse_size(image.info.get("source_size"))
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.info["source_size"] = source_size or image.size
+            return image
+
+        image = load_image_rgb(path, min_side)
+        pnginfo = PngImagePlugin.PngInfo()
+        pnginfo.add_text("source_size", "%dx%d" % image.info["source_size"])
+        # 压缩级别 1: 编码快，解码速度与高压缩级别相同
+        self._put(name, image, "PNG", compress_level=1, pnginfo=pnginfo)
+        return image
+
+    def thumbnail(self, path, max_side=None):
+        """
+        返回图库缩略图的文件路径 (JPEG，长边不超过 max_side)，可以直接交给 st.image
+        """
+        max_side = max_side or Config.THUMBNAIL_SIZE
+        name = f"{self.content_hash(path)}_t{max_side}_v{IMAGE_CACHE_VERSION}.jpg"
+        file = self._file(name)
+        if os.path.exists(file):
+            self._touch(name)
+            return file
+
+        image = Image.open(path)
+        image.draft("RGB", (max_side, max_side))
+        image = image.convert("RGB")
+        image.thumbnail((max_side, max_side), Image.BICUBIC)
+        return self._put(name, image, "JPEG", quality=85)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+def open_image_cache():
+    """
+    Config.IMAGE_CACHE_MAX_MB 为 0 时关闭缓存，返回 None
+    """
+    if not Config.IMAGE_CACHE_MAX_MB:
+        return None
+    return ImageCache()
@@ -0,0 +1,84 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tiff'}
+
+
+def list_image_files(directory):
+    """
+    递归收集目录下所有图片路径 (按路径排序，保证批次稳定)
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        for f in files:
+            if os.path.splitext(f)[1].lower() in IMAGE_EXTS:
+                paths.append(os.path.join(root, f))
+    paths.sort()
+    return paths
+
+
+def load_image_rgb(file_path, min_side=None):
+    """
+    打开图片 (路径或文件对象) 并转为 RGB。
+    指定 min_side 时先按短边缩放到 min_side (JPEG 会直接以降采样方式解码)，
+    后续 processor 只需处理小图。原图尺寸记在 image.info["source_size"]。
+    """
+    image = Image.open(file_path)
+    source_size = image.size
+    if min_side:
+        # draft 保证解码尺寸不小于请求尺寸，仅对 JPEG 生效
+        image.draft("RGB", (min_side, min_side))
+    image = fit_rgb(image, min_side)
+    image.info["source_size"] = source_size
+    return image
+
+
+def fit_rgb(image, min_side=None):
+    """
+    已打开的图片转为 RGB，短边大于 min_side 时等比缩小到 min_side
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    else:
+        image.load()
+
+    if min_side:
+        short = min(image.width, image.height)
+        if short > min_side:
+            scale = min_side / short
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(new_size, Image.BICUBIC)
+    return image
+
+
+def iter_image_batches(paths, batch_size=32, num_workers=4, min_side=None, cache=None):
+    """
+    预取式批量加载：后台线程池解码下一批图片的同时，调用方处理当前批次。
+    传入 cache (ImageCache) 且指定 min_side 时，缩小后的图片从磁盘缓存读取，不再解码原图。
+    每次 yield (成功路径列表, 图片列表, [(失败路径, 异常), ...])
+    """
+    paths = list(paths)
+    batches = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+    if not batches:
+        return
+
+    load = cache.load if cache is not None and min_side else load_image_rgb
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        def submit(batch):
+            return [pool.submit(load, p, min_side) for p in batch]
+
+        pending = submit(batches[0])
+        for idx, batch in enumerate(batches):
+            futures = pending
+            # 先提交下一批，再把当前批交给调用方，解码与推理重叠
+            pending = submit(batches[idx + 1]) if idx + 1 < len(batches) else None
+
+            ok_paths, images, errors = [], [], []
+            for path, future in zip(batch, futures):
+                try:
+                    images.append(future.result())
+                    ok_paths.append(path)
+                except Exception as e:
+                    errors.append((path, e))
+            yield ok_paths, images, errors
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+from .config import Config
+from .file_handler import compute_file_hash
+
+
+def canonical_path(path):
+    """
+    清单与图片索引使用的规范路径 (绝对路径，解析符号链接)：./imgs、imgs 与指向它的软链接对应同一条记录
+    """
+    return os.path.realpath(path)
+
+
+# 清单格式版本 (PRAGMA user_version)：1 起所有路径为 canonical_path
+SCHEMA_VERSION = 1
+
+
+class ImageManifest:
+    """
+    图片索引清单：记录每个已入库文件的 (大小, mtime, 内容哈希, 模型)，
+    用于增量扫描时判断哪些文件需要重新编码。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.IMAGE_MANIFEST_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                hash TEXT NOT NULL,
+                model TEXT NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def migrate(self, rename_ids=None):
+        """
+        旧版本按调用方原样路径 (如相对路径) 记录，一次性改写为规范路径。
+        rename_ids({旧路径: 新路径 或 None}) 在清单提交前调用，用于同步改写向量库中的图片 ID
+        (None 表示同一文件已有规范路径的记录，旧条目直接删除)。返回改写的条目数
+        """
+        with self._lock:
+            if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+                return 0
+            existing = {path for (path,) in self.conn.execute("SELECT path FROM images")}
+            renames = {}
+            for path in sorted(existing):
+                new = canonical_path(path)
+                if new != path:
+                    renames[path] = None if new in existing or new in renames.values() else new
+            if renames and rename_ids:
+                rename_ids(renames)
+            for old, new in renames.items():
+                if new is None:
+                    self.conn.execute("DELETE FROM images WHERE path = ?", (old,))
+                else:
+                    self.conn.execute("UPDATE images SET path = ? WHERE path = ?", (new, old))
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.conn.commit()
+        return len(renames)
+
+    def entries_under(self, directory):
+        """
+        返回目录下所有清单记录: {path: (size, mtime_ns, hash, model)}
+        只读取该目录前缀范围内的行 (主键区间查询)，耗时与目录大小相关、与整个清单无关
+        """
+        root = canonical_path(directory)
+        prefix = root.rstrip(os.sep) + os.sep
+        # [prefix, prefix 末字符 + 1) 恰好是以 prefix 开头的所有字符串，区分大小写且走主键索引
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime_ns, hash, model FROM images WHERE path = ? OR (path >= ? AND path < ?)",
+                (root, prefix, upper)
+            ).fetchall()
+        return {path: (size, mtime_ns, digest, model) for path, size, mtime_ns, digest, model in rows}
+
+    def plan(self, paths, directory, model_id, force=False):
+        """
+        对比磁盘与清单，返回:
+        - to_embed: {path: (size, mtime_ns, hash)} 新增/内容变化/模型变化的文件
+        - touched: {path: (size, mtime_ns, hash)} 仅 mtime 变化、内容未变的文件
+        - removed: [path] 已从磁盘删除的文件
+        - unchanged: 无需处理的文件数
+        路径一律按 canonical_path 规范化后比较与返回
+        """
+        paths = list(dict.fromkeys(canonical_path(p) for p in paths))
+        known = self.entries_under(directory)
+        to_embed, touched, unchanged = {}, {}, 0
+
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            old = known.get(path)
+            if not force and old and old[3] == model_id and old[0] == st.st_size and old[1] == st.st_mtime_ns:
+                unchanged += 1
+                continue
+
+            try:
+                digest = compute_file_hash(path)
+            except OSError:
+                continue
+            record = (st.st_size, st.st_mtime_ns, digest)
+            if not force and old and old[3] == model_id and old[2] == digest:
+                touched[path] = record
+            else:
+                to_embed[path] = record
+
+        seen = set(paths)
+        removed = [p for p in known if p not in seen]
+        return to_embed, touched, removed, unchanged
+
+    def record(self, records, model_id):
+        """
+        records: {path: (size, mtime_ns, hash)}
+        """
+        if not records:
+            return
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO images (path, size, mtime_ns, hash, model) VALUES (?, ?, ?, ?, ?)",
+                [(canonical_path(p), size, mtime_ns, digest, model_id)
+                 for p, (size, mtime_ns, digest) in records.items()]
+            )
+            self.conn.commit()
+
+    def remove(self, paths):
+        if not paths:
+            return
+        with self._lock:
+            self.conn.executemany("DELETE FROM images WHERE path = ?", [(p,) for p in paths])
+            self.conn.commit()
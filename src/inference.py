@@ -0,0 +1,80 @@
+import threading
+from .config import Config
+
+# 启动时偏差检查用的样例文本
+DRIFT_SAMPLE_TEXTS = [
+    "Transformer models rely on multi-head self-attention.",
+    "A convolutional neural network for image classification.",
+    "Reinforcement learning agents maximize expected reward.",
+    "一只在草地上睡觉的猫",
+    "Low-rank adaptation fine-tunes large language models efficiently.",
+    "a photo of a red car parked on the street",
+]
+
+_configured = False
+_configure_lock = threading.Lock()
+_warned_backends = set()
+
+
+def configure_torch():
+    """
+    进程内只执行一次: 按 Config.TORCH_THREADS 设置 CPU 推理线程数
+    """
+    global _configured
+    if _configured:
+        return
+    with _configure_lock:
+        if not _configured:
+            import torch
+            if Config.TORCH_THREADS:
+                torch.set_num_threads(Config.TORCH_THREADS)
+            _configured = True
+
+
+def inference_backend():
+    backend = (Config.INFERENCE_BACKEND or "fp32").lower()
+    if backend not in ("fp32", "int8"):
+        if backend not in _warned_backends:
+            _warned_backends.add(backend)
+            print(f"⚠️ 未知的推理后端 {backend}，使用 fp32")
+        return "fp32"
+    return backend
+
+
+def quantize_dynamic(model):
+    """
+    nn.Linear 权重动态量化为 int8 (激活值运行时量化)，返回量化后的副本，原模型不变
+    """
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def cosine_drift(reference, candidate):
+    """
+    逐条计算两组向量的余弦相似度，返回 (平均值, 最小值)
+    """
+    import torch
+    reference = torch.as_tensor(reference, dtype=torch.float32)
+    candidate = torch.as_tensor(candidate, dtype=torch.float32)
+    sims = torch.nn.functional.cosine_similarity(reference, candidate, dim=-1)
+    return sims.mean().item(), sims.min().item()
+
+
+def report_drift(name, reference, candidate):
+    mean_sim, min_sim = cosine_drift(reference, candidate)
+    flag = "✅" if min_sim >= Config.QUANT_DRIFT_MIN_COSINE else "⚠️"
+    print(f"{flag} {name} int8 与 fp32 向量偏差: 平均余弦 {mean_sim:.4f}，最小 {min_sim:.4f}")
+    return mean_sim, min_sim
+
+
+def drift_sample_images():
+    """
+    不依赖任何图片文件的确定性样例图
+    """
+    from PIL import Image
+    gradient = Image.linear_gradient("L").resize((256, 256))
+    radial = Image.radial_gradient("L").resize((256, 256))
+    return [
+        Image.merge("RGB", (gradient, radial, gradient.rotate(90))),
+        Image.merge("RGB", (radial, gradient.rotate(180), radial)),
+    ]
@@ -0,0 +1,209 @@
+import time
+import asyncio
+import inspect
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from .config import Config
+from .file_handler import extract_text_from_pdf, move_file_to_category, compute_file_hash
+from .paper_ingest import resolve_existing, INDEXED, DUPLICATE, EMPTY, FAILED
+from .profiling import PROFILER
+
+_DONE = object()  # 阶段结束标记
+
+
+def _extract_timed(file_path):
+    """
+    在解析进程内计时，耗时随结果带回主进程记录 (子进程里记录的 span 主进程看不到)
+    """
+    start = time.perf_counter()
+    chunks = extract_text_from_pdf(file_path)
+    return chunks, time.perf_counter() - start
+
+
+class IngestPipeline:
+    """
+    流水线式论文入库:
+      [去重 + PDF 解析 (进程池)] -> [LLM 批量分类 (有界并发)] -> [合并批量编码 + 写入]
+    各阶段之间用有界队列衔接，整体吞吐取决于最慢的阶段，内存占用保持平稳。
+    """
+
+    def __init__(self, db, llm, topics, parse_workers=None, classify_concurrency=None,
+                 classify_batch_size=None, embed_batch_size=None, queue_size=None, on_result=None):
+        self.db = db
+        self.llm = llm
+        self.topics = topics
+        self.parse_workers = parse_workers or Config.INGEST_PARSE_WORKERS
+        self.classify_concurrency = classify_concurrency or Config.INGEST_CLASSIFY_CONCURRENCY
+        self.classify_batch_size = classify_batch_size or Config.CLASSIFY_BATCH_SIZE
+        self.embed_batch_size = embed_batch_size or Config.INGEST_EMBED_BATCH
+        self.queue_size = queue_size or Config.INGEST_QUEUE_SIZE
+        # on_result(原路径, 状态, 分类, 最终路径 或 错误信息)
+        self.on_result = on_result
+        self.stats = {}
+
+    def run(self, files):
+        """
+        处理文件列表，返回各状态的数量统计
+        """
+        self.stats = {}
+        asyncio.run(self._run(list(files)))
+        return self.stats
+
+    def _report(self, file_path, status, category=None, detail=None):
+        self.stats[status] = self.stats.get(status, 0) + 1
+        if self.on_result:
+            self.on_result(file_path, status, category, detail)
+
+    async def _run(self, files):
+        parsed_q = asyncio.Queue(maxsize=self.queue_size)
+        classified_q = asyncio.Queue(maxsize=self.queue_size)
+
+        # spawn 方式启动解析进程，避免 fork 已加载 torch 的主进程
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.parse_workers, mp_context=ctx) as parse_pool, \
+                ThreadPoolExecutor(max_workers=self.classify_concurrency) as io_pool, \
+                ThreadPoolExecutor(max_workers=1) as embed_pool:
+            classifiers = [
+                asyncio.create_task(self._classify_stage(parsed_q, classified_q, io_pool))
+                for _ in range(self.classify_concurrency)
+            ]
+            embedder = asyncio.create_task(self._embed_stage(classified_q, embed_pool))
+
+            await self._parse_stage(files, parsed_q, parse_pool, io_pool)
+            for _ in classifiers:
+                await parsed_q.put(_DONE)
+            await asyncio.gather(*classifiers)
+            await classified_q.put(_DONE)
+            await embedder
+
+        if hasattr(self.llm, "aclose"):
+            await self.llm.aclose()
+
+    async def _parse_stage(self, files, parsed_q, parse_pool, io_pool):
+        loop = asyncio.get_running_loop()
+        # 同时在途的解析任务数有上限，避免一次性读入全部文档
+        slots = asyncio.Semaphore(self.parse_workers * 2)
+        # 本次运行内已出现过的内容哈希 (同一批里的重复文件尚未写入库，查库查不到)
+        seen_hashes = set()
+
+        async def prepare(file_path):
+            try:
+                doc_hash = await loop.run_in_executor(io_pool, compute_file_hash, file_path)
+                if doc_hash in seen_hashes:
+                    self._report(file_path, DUPLICATE)
+                    return
+                seen_hashes.add(doc_hash)
+                resolved = await loop.run_in_executor(io_pool, resolve_existing, file_path, doc_hash, self.db)
+                if resolved:
+                    status, category, new_path = resolved
+                    self._report(file_path, status, category, new_path)
+                    return
+
+                chunks, seconds = await loop.run_in_executor(parse_pool, _extract_timed, file_path)
+                PROFILER.record("pdf.extract", seconds, len(chunks))
+                if not chunks:
+                    self._report(file_path, EMPTY)
+                    return
+                await parsed_q.put((file_path, doc_hash, chunks))
+            except Exception as e:
+                self._report(file_path, FAILED, detail=str(e))
+            finally:
+                slots.release()
+
+        tasks = set()
+        for file_path in files:
+            await slots.acquire()
+            task = asyncio.create_task(prepare(file_path))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+
+    async def _next_batch(self, parsed_q):
+        """
+        取出一批待分类论文：至少等到一篇，之后短暂等待凑满 classify_batch_size 篇。
+        返回 (论文列表, 是否已收到结束标记)
+        """
+        item = await parsed_q.get()
+        if item is _DONE:
+            return [], True
+        batch = [item]
+        while len(batch) < self.classify_batch_size:
+            try:
+                item = await asyncio.wait_for(parsed_q.get(), timeout=0.2)
+            except asyncio.TimeoutError:
+                break
+            if item is _DONE:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _classify_stage(self, parsed_q, classified_q, io_pool):
+        loop = asyncio.get_running_loop()
+        finished = False
+        while not finished:
+            batch, finished = await self._next_batch(parsed_q)
+            if not batch:
+                continue
+            # 使用第一块内容进行分类
+            snippets = [chunks[0]['text'] for _, _, chunks in batch]
+            try:
+                if inspect.iscoroutinefunction(getattr(self.llm, "classify_papers", None)):
+                    # AsyncLLMClient: 多篇摘要打包进一个请求，直接在事件循环上并发
+                    categories = await self.llm.classify_papers(snippets, self.topics)
+                elif hasattr(self.llm, "classify_papers"):
+                    categories = await loop.run_in_executor(io_pool, self.llm.classify_papers, snippets, self.topics)
+                else:
+                    categories = await asyncio.gather(*(
+                        loop.run_in_executor(io_pool, self.llm.classify_paper, snippet, self.topics)
+                        for snippet in snippets
+                    ))
+            except Exception as e:
+                for file_path, _, _ in batch:
+                    self._report(file_path, FAILED, detail=str(e))
+                continue
+
+            for (file_path, doc_hash, chunks), category in zip(batch, categories):
+                try:
+                    new_path = await loop.run_in_executor(io_pool, move_file_to_category, file_path, category)
+                except Exception as e:
+                    self._report(file_path, FAILED, category, str(e))
+                    continue
+                await classified_q.put({
+                    "origin": file_path,
+                    "file_path": new_path,
+                    "chunks": chunks,
+                    "category": category,
+                    "doc_hash": doc_hash,
+                })
+
+    async def _embed_stage(self, classified_q, embed_pool):
+        loop = asyncio.get_running_loop()
+        pending, pending_chunks = [], 0
+
+        async def flush():
+            nonlocal pending, pending_chunks
+            if not pending:
+                return
+            batch, pending, pending_chunks = pending, [], 0
+            try:
+                await loop.run_in_executor(embed_pool, self.db.add_paper_batch, batch)
+                for paper in batch:
+                    self._report(paper['origin'], INDEXED, paper['category'], paper['file_path'])
+            except Exception as e:
+                for paper in batch:
+                    self._report(paper['origin'], FAILED, paper['category'], str(e))
+
+        while True:
+            try:
+                # 上游暂时没有新数据时先把已攒的批次写掉，不让结果长时间积压
+                item = await asyncio.wait_for(classified_q.get(), timeout=1.0)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            if item is _DONE:
+                await flush()
+                return
+            pending.append(item)
+            pending_chunks += len(item['chunks'])
+            if pending_chunks >= self.embed_batch_size:
+                await flush()
@@ -0,0 +1,225 @@
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from .config import Config
+from .profiling import profiled
+
+# 表结构 / 切词规则版本，变化时递增
+SCHEMA_VERSION = 3
+
+_CJK = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+# 英文/数字按词切分 (统一小写)，连续汉字整段取出后再切成重叠的双字词
+_TERM_RE = re.compile(rf"(?P<cjk>[{_CJK}]+)|[^\W{_CJK}]+")
+
+
+def tokenize(text):
+    terms = []
+    for match in _TERM_RE.finditer(text):
+        run = match.group("cjk")
+        if run is None:
+            terms.append(match.group().lower())
+        elif len(run) == 1:
+            terms.append(run)
+        else:
+            # 单字几乎出现在每个 chunk 里，双字词的区分度高得多
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+class LexicalIndex:
+    """
+    基于 SQLite 倒排表的 BM25 索引，与论文向量库同步增量维护。
+    精确术语、缩写、公式名这类向量检索容易漏掉的词靠它召回。可在多线程间共享。
+
+    查询开销有上限: 文档频率超过 max_df_ratio 的词 (停用词、常用词) 直接跳过，
+    其余每个词最多取 term_postings 条 tf 最高的倒排 (chunk 按 token 窗口切分、长度相近，
+    tf 顺序即近似 BM25 贡献顺序)，打分的行数不随语料规模增长。
+    """
+
+    def __init__(self, path=None, k1=1.5, b=0.75, max_df_ratio=None, term_postings=None):
+        self.path = path or Config.LEXICAL_INDEX_PATH
+        self.k1 = k1
+        self.b = b
+        self.max_df_ratio = Config.LEXICAL_MAX_DF_RATIO if max_df_ratio is None else max_df_ratio
+        self.term_postings = term_postings or Config.LEXICAL_TERM_POSTINGS
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # 旧格式直接丢弃，DBManager 发现条目数不一致后会从向量库重建
+            self.conn.executescript(
+                "DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS docs; "
+                "DROP TABLE IF EXISTS terms; DROP TABLE IF EXISTS totals;"
+            )
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        # 倒排表冗余存放文档长度并用整数文档号，打分时无需回表，可在 SQLite 内一次聚合完成；
+        # 主键按 (词, tf 降序) 排列，取某个词 tf 最高的若干条只需顺序读主键。
+        # 文档频率与总长度单独维护，查询时不必扫描倒排或文档表
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                docno INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                length INTEGER NOT NULL,
+                source TEXT,
+                doc_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_docs_source ON docs(source);
+            CREATE INDEX IF NOT EXISTS idx_docs_hash ON docs(doc_hash);
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                docno INTEGER NOT NULL,
+                PRIMARY KEY (term, tf DESC, length, docno)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_doc ON postings(docno);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                df INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                docs INTEGER NOT NULL,
+                length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO totals (id, docs, length) VALUES (0, 0, 0);
+            """
+        )
+        self.conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT docs FROM totals").fetchone()[0]
+
+    def _delete_docnos(self, docnos):
+        docnos = list(docnos)
+        for i in range(0, len(docnos), 500):
+            part = docnos[i:i + 500]
+            marks = ",".join("?" * len(part))
+            removed = self.conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE docno IN ({marks}) GROUP BY term", part
+            ).fetchall()
+            self.conn.executemany("UPDATE terms SET df = df - ? WHERE term = ?", [(n, term) for term, n in removed])
+            count, length = self.conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs WHERE docno IN ({marks})", part
+            ).fetchone()
+            self.conn.execute("UPDATE totals SET docs = docs - ?, length = length - ?", (count, length))
+            self.conn.execute(f"DELETE FROM postings WHERE docno IN ({marks})", part)
+            self.conn.execute(f"DELETE FROM docs WHERE docno IN ({marks})", part)
+        if docnos:
+            self.conn.execute("DELETE FROM terms WHERE df <= 0")
+
+    def _select_docnos(self, column, values):
+        values = list(values)
+        docnos = set()
+        for i in range(0, len(values), 500):
+            part = values[i:i + 500]
+            marks = ",".join("?" * len(part))
+            rows = self.conn.execute(f"SELECT docno FROM docs WHERE {column} IN ({marks})", part)
+            docnos.update(row[0] for row in rows)
+        return docnos
+
+    def add(self, ids, documents, metadatas):
+        """
+        写入 (或覆盖) 一批 chunk，metadatas 中的 source / doc_hash 用于之后按论文删除
+        """
+        with self._lock:
+            self._delete_docnos(self._select_docnos("id", ids))
+            df = Counter()
+            total_length = 0
+            for doc_id, text, meta in zip(ids, documents, metadatas):
+                terms = tokenize(text)
+                counts = Counter(terms)
+                docno = self.conn.execute(
+                    "INSERT INTO docs (id, length, source, doc_hash) VALUES (?, ?, ?, ?)",
+                    (doc_id, len(terms), meta.get("source"), meta.get("doc_hash"))
+                ).lastrowid
+                self.conn.executemany(
+                    "INSERT INTO postings (term, tf, length, docno) VALUES (?, ?, ?, ?)",
+                    [(term, tf, len(terms), docno) for term, tf in counts.items()]
+                )
+                df.update(counts.keys())
+                total_length += len(terms)
+            self.conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items()
+            )
+            self.conn.execute("UPDATE totals SET docs = docs + ?, length = length + ?", (len(ids), total_length))
+            self.conn.commit()
+
+    def delete_papers(self, sources=(), doc_hashes=()):
+        """
+        删除这些路径或内容哈希对应的全部 chunk
+        """
+        with self._lock:
+            doomed = self._select_docnos("source", sources) | self._select_docnos("doc_hash", doc_hashes)
+            self._delete_docnos(doomed)
+            self.conn.commit()
+
+    def update_source(self, doc_hash, new_path):
+        with self._lock:
+            self.conn.execute("UPDATE docs SET source = ? WHERE doc_hash = ?", (new_path, doc_hash))
+            self.conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM docs")
+            self.conn.execute("DELETE FROM terms")
+            self.conn.execute("UPDATE totals SET docs = 0, length = 0")
+            self.conn.commit()
+
+    @profiled("lexical.search", items=len)
+    def search(self, query, n_results=10):
+        """
+        BM25 打分，返回 [(chunk id, 分数), ...]，按分数从高到低。
+        查询词全部过于常见时返回空列表，混合检索此时退化为纯向量检索
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+
+        with self._lock:
+            total_docs, total_length = self.conn.execute("SELECT docs, length FROM totals").fetchone()
+            if not total_docs:
+                return []
+            avg_length = (total_length / total_docs) or 1
+            marks = ",".join("?" * len(terms))
+            df = dict(self.conn.execute(f"SELECT term, df FROM terms WHERE term IN ({marks})", terms))
+            # 小语料里所有词都保留；倒排不超过 term_postings 条的词无论多常见都不跳过
+            max_df = max(self.max_df_ratio * total_docs, self.term_postings)
+            weights = [
+                (math.log(1 + (total_docs - n + 0.5) / (n + 0.5)), term) for term, n in df.items() if n <= max_df
+            ]
+            if not weights:
+                return []
+
+            # 每个词只取 tf 最高的 term_postings 条倒排，BM25 求和与 top-k 在 SQLite 内完成
+            # (常数均为内部浮点数，直接写入 SQL)
+            k1, b = self.k1, self.b
+            hits = " UNION ALL ".join(
+                "SELECT * FROM (SELECT docno, tf, length, ? AS idf FROM postings "
+                "WHERE term = ? ORDER BY tf DESC, length LIMIT ?)"
+                for _ in weights
+            )
+            rows = self.conn.execute(
+                f"""
+                SELECT docno, SUM(idf * tf * {k1 + 1!r} / (tf + {k1!r} * ({1 - b!r} + {b / avg_length!r} * length))) AS score
+                FROM ({hits})
+                GROUP BY docno
+                ORDER BY score DESC
+                LIMIT ?
+                """,
+                [x for idf, term in weights for x in (idf, term, self.term_postings)] + [int(n_results)]
+            ).fetchall()
+            if not rows:
+                return []
+            marks = ",".join("?" * len(rows))
+            ids = dict(self.conn.execute(
+                f"SELECT docno, id FROM docs WHERE docno IN ({marks})", [docno for docno, _ in rows]
+            ))
+        return [(ids[docno], score) for docno, score in rows]
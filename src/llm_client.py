@@ -1,5 +1,132 @@
-from openai import OpenAI
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import threading
+import weakref
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 from .config import Config
+from .disk_cache import DiskCache, make_key
+from .profiling import profiled
+
+CLASSIFY_PROMPT = """
+        你是一个专业的学术助手。请根据以下论文摘要，将其归类到以下类别之一：{topics}。
+        如果文本主要讨论的是 Deep Learning, Neural Networks 等，优先归类为 'Deep Learning' 或相关具体的子领域。
+
+        论文摘要：
+        {snippet}...
+
+        请严格只返回类别名称，不要包含其他字符。如果无法确定，返回 "Uncategorized"。
+        """
+
+CLASSIFY_BATCH_PROMPT = """
+        你是一个专业的学术助手。下面有 {count} 篇论文摘要，请将每一篇分别归类到以下类别之一：{topics}。
+        如果文本主要讨论的是 Deep Learning, Neural Networks 等，优先归类为 'Deep Learning' 或相关具体的子领域。
+        如果无法确定某一篇的类别，该篇返回 "Uncategorized"。
+
+        {documents}
+
+        请严格只返回一个 JSON 对象，键为论文编号，值为类别名称，例如 {{"1": "NLP", "2": "Uncategorized"}}，不要包含其他字符。
+        """
+
+CHAT_PROMPT = """
+        请基于以下参考文档片段（Context），回答用户的学术问题。
+        
+        [参考文档]:
+        {context}
+        
+        [用户问题]: {query}
+        
+        要求：
+        1. 回答要简洁、专业。
+        2. 如果参考文档中没有答案，请直接说“根据现有文档无法回答”。
+        3. 请使用中文回答。
+        4. 引用参考文档时在句末标注其编号，例如 [1]。
+        """
+
+# 模板内容变化时缓存键随之变化，旧的分类结果自动失效
+CLASSIFY_PROMPT_VERSION = hashlib.sha256(
+    (CLASSIFY_PROMPT + CLASSIFY_BATCH_PROMPT).encode("utf-8")
+).hexdigest()[:12]
+
+
+def _classification_key(model_name, topics, snippet):
+    """
+    缓存键: (模型, 归一化后的类别集合, 摘要前 1000 字符的哈希, 模板版本)
+    """
+    topic_set = sorted({t.strip().lower() for t in topics.split(',') if t.strip()})
+    snippet_hash = hashlib.sha256(snippet[:1000].encode("utf-8")).hexdigest()
+    return make_key("classify", model_name, topic_set, snippet_hash, CLASSIFY_PROMPT_VERSION)
+
+
+def _match_topic(category, topics):
+    clean_topics = [t.strip() for t in topics.split(',')]
+    for topic in clean_topics:
+        if topic.lower() in category.lower():
+            return topic
+    return "Uncategorized"
+
+
+def _build_batch_prompt(snippets, topics):
+    documents = "\n\n        ".join(
+        f"[{i + 1}]\n        {snippet[:1000]}..." for i, snippet in enumerate(snippets)
+    )
+    return CLASSIFY_BATCH_PROMPT.format(count=len(snippets), topics=topics, documents=documents)
+
+
+def _parse_batch_labels(content, count):
+    """
+    解析批量分类的 JSON 输出，返回 {序号(从 0 开始): 原始类别}，解析不了的序号不出现在结果里
+    """
+    text = re.sub(r"^```(?:json)?|```$", "", content.strip()).strip()
+    try:
+        # 整段就是 JSON (对象，或按顺序排列的类别列表)
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        # 前后夹带说明文字时截取其中的 JSON 对象
+        start, end = text.find("{"), text.rfind("}")
+        if start == -1 or end <= start:
+            return {}
+        try:
+            data = json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
+    if isinstance(data, list):
+        data = {str(i + 1): value for i, value in enumerate(data)}
+    if not isinstance(data, dict):
+        return {}
+    labels = {}
+    for key, value in data.items():
+        key = str(key).strip().strip("[]")
+        if key.isdigit() and 1 <= int(key) <= count and isinstance(value, str) and value.strip():
+            labels[int(key) - 1] = value.strip()
+    return labels
+
+
+def _lookup_cached(cache, snippets, topics):
+    """
+    返回 (结果列表, 未命中缓存的下标列表)，结果列表中未命中的位置为 None
+    """
+    results, misses = [], []
+    for i, snippet in enumerate(snippets):
+        cached = cache.get(_classification_key(Config.MODEL_NAME, topics, snippet))
+        if cached is None:
+            results.append(None)
+            misses.append(i)
+        else:
+            results.append(_match_topic(cached, topics))
+    return results, misses
+
+
+def _open_classify_cache():
+    return DiskCache(
+        os.path.join(Config.CACHE_DIR, "classify_cache.db"),
+        max_entries=Config.CLASSIFY_CACHE_MAX_ENTRIES
+    )
+
 
 class LLMClient:
     def __init__(self):
@@ -7,17 +134,20 @@ class LLMClient:
             api_key=Config.API_KEY,
             base_url=Config.BASE_URL
         )
+        self.classify_cache = _open_classify_cache()
 
+    def clear_classification_cache(self):
+        self.classify_cache.clear()
+
+    @profiled("llm.classify")
     def classify_paper(self, text_snippet, topics):
-        prompt = f"""
-        你是一个专业的学术助手。请根据以下论文摘要，将其归类到以下类别之一：{topics}。
-        如果文本主要讨论的是 Deep Learning, Neural Networks 等，优先归类为 'Deep Learning' 或相关具体的子领域。
-        
-        论文摘要：
-        {text_snippet[:1000]}...
+        # 缓存的是模型原始输出，再按本次传入的类别名匹配，保证返回值的大小写与用户输入一致
+        cache_key = _classification_key(Config.MODEL_NAME, topics, text_snippet)
+        cached = self.classify_cache.get(cache_key)
+        if cached is not None:
+            return _match_topic(cached, topics)
 
-        请严格只返回类别名称，不要包含其他字符。如果无法确定，返回 "Uncategorized"。
-        """
+        prompt = CLASSIFY_PROMPT.format(topics=topics, snippet=text_snippet[:1000])
         try:
             response = self.client.chat.completions.create(
                 model=Config.MODEL_NAME,
@@ -25,32 +155,48 @@ class LLMClient:
                 temperature=0.1
             )
             category = response.choices[0].message.content.strip()
-            clean_topics = [t.strip() for t in topics.split(',')]
-            for topic in clean_topics:
-                if topic.lower() in category.lower():
-                    return topic
-            return "Uncategorized"
+            self.classify_cache.set(cache_key, category)
+            return _match_topic(category, topics)
         except Exception as e:
             print(f"LLM 分类失败: {e}")
             return "Uncategorized"
 
+    @profiled("llm.classify_batch", items=len)
+    def classify_papers(self, snippets, topics, batch_size=None):
+        """
+        批量分类：每 batch_size 篇摘要打包成一个请求，按 JSON 解析出每篇的类别。
+        批量输出解析失败的论文单独回退到 classify_paper。
+        """
+        batch_size = batch_size or Config.CLASSIFY_BATCH_SIZE
+        results, misses = _lookup_cached(self.classify_cache, snippets, topics)
+        for start in range(0, len(misses), batch_size):
+            group = misses[start:start + batch_size]
+            group_snippets = [snippets[i] for i in group]
+            labels = {}
+            if len(group) > 1:
+                try:
+                    response = self.client.chat.completions.create(
+                        model=Config.MODEL_NAME,
+                        messages=[{"role": "user", "content": _build_batch_prompt(group_snippets, topics)}],
+                        temperature=0.1
+                    )
+                    labels = _parse_batch_labels(response.choices[0].message.content, len(group))
+                except Exception as e:
+                    print(f"LLM 批量分类失败，逐篇重试: {e}")
+            for j, i in enumerate(group):
+                if j in labels:
+                    self.classify_cache.set(_classification_key(Config.MODEL_NAME, topics, snippets[i]), labels[j])
+                    results[i] = _match_topic(labels[j], topics)
+                else:
+                    results[i] = self.classify_paper(snippets[i], topics)
+        return results
+
+    @profiled("llm.chat")
     def chat_with_context(self, query, context):
         """
         RAG 核心方法
         """
-        prompt = f"""
-        请基于以下参考文档片段（Context），回答用户的学术问题。
-        
-        [参考文档]:
-        {context}
-        
-        [用户问题]: {query}
-        
-        要求：
-        1. 回答要简洁、专业。
-        2. 如果参考文档中没有答案，请直接说“根据现有文档无法回答”。
-        3. 请使用中文回答。
-        """
+        prompt = CHAT_PROMPT.format(context=context, query=query)
         try:
             response = self.client.chat.completions.create(
                 model=Config.MODEL_NAME, 
@@ -59,4 +205,209 @@ class LLMClient:
             )
             return response.choices[0].message.content
         except Exception as e:
-            return f"生成回答失败: {e}"
\ No newline at end of file
+            return f"生成回答失败: {e}"
+
+    @profiled("llm.chat_stream")
+    def stream_chat_with_context(self, query, context):
+        """
+        RAG 流式版本：逐段 yield 模型生成的文本，首个 token 到达即可显示
+        """
+        prompt = CHAT_PROMPT.format(context=context, query=query)
+        try:
+            stream = self.client.chat.completions.create(
+                model=Config.MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                stream=True
+            )
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        except Exception as e:
+            yield f"生成回答失败: {e}"
+
+
+class _TokenBucket:
+    """
+    令牌桶限速：平均每秒 rate 个请求，允许 capacity 个突发
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def _is_retryable(error):
+    if isinstance(error, (RateLimitError, APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncLLMClient:
+    """
+    异步 LLM 客户端：并发数上限 + 令牌桶限速 + 429/5xx 指数退避重试，
+    同一事件循环内复用 HTTP 连接。用于批量分类等需要大量并发请求的场景。
+    """
+
+    def __init__(self, concurrency=None, rate_limit=None, max_retries=None):
+        self.concurrency = concurrency or Config.LLM_CONCURRENCY
+        self.rate_limit = Config.LLM_RATE_LIMIT if rate_limit is None else rate_limit
+        self.max_retries = Config.LLM_MAX_RETRIES if max_retries is None else max_retries
+        self.classify_cache = _open_classify_cache()
+        # httpx 连接池、信号量与令牌桶都与事件循环绑定，按循环分别创建。
+        # 同一个实例可被多个线程各自的 asyncio.run 同时使用 (如 Web 界面多个会话)，互不干扰
+        self._states = weakref.WeakKeyDictionary()
+        self._states_lock = threading.Lock()
+
+    def _ensure_client(self):
+        """
+        返回当前事件循环的 (client, semaphore, bucket)，首次使用时创建
+        """
+        loop = asyncio.get_running_loop()
+        with self._states_lock:
+            state = self._states.get(loop)
+            if state is None:
+                client = AsyncOpenAI(
+                    api_key=Config.API_KEY,
+                    base_url=Config.BASE_URL,
+                    max_retries=0,  # 重试由本类统一处理
+                    timeout=Config.LLM_TIMEOUT,
+                    http_client=httpx.AsyncClient(
+                        limits=httpx.Limits(
+                            max_connections=self.concurrency,
+                            max_keepalive_connections=self.concurrency
+                        )
+                    )
+                )
+                bucket = _TokenBucket(self.rate_limit) if self.rate_limit else None
+                state = self._states[loop] = (client, asyncio.Semaphore(self.concurrency), bucket)
+        return state
+
+    async def aclose(self):
+        """
+        只关闭当前事件循环的连接，其他循环 (其他会话) 正在使用的不受影响
+        """
+        with self._states_lock:
+            state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].close()
+
+    async def _complete(self, **kwargs):
+        client, semaphore, bucket = self._ensure_client()
+        attempt = 0
+        while True:
+            async with semaphore:
+                if bucket:
+                    await bucket.acquire()
+                try:
+                    return await client.chat.completions.create(**kwargs)
+                except Exception as e:
+                    if attempt >= self.max_retries or not _is_retryable(e):
+                        raise
+                    delay = _retry_after(e)
+            # 在信号量之外等待，退避期间不占用并发名额
+            if delay is None:
+                delay = Config.LLM_BACKOFF_BASE * (2 ** attempt)
+            await asyncio.sleep(delay * (0.5 + random.random()))
+            attempt += 1
+
+    @profiled("llm.classify")
+    async def classify_paper(self, text_snippet, topics):
+        cache_key = _classification_key(Config.MODEL_NAME, topics, text_snippet)
+        cached = self.classify_cache.get(cache_key)
+        if cached is not None:
+            return _match_topic(cached, topics)
+
+        prompt = CLASSIFY_PROMPT.format(topics=topics, snippet=text_snippet[:1000])
+        try:
+            response = await self._complete(
+                model=Config.MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.1
+            )
+            category = response.choices[0].message.content.strip()
+            self.classify_cache.set(cache_key, category)
+            return _match_topic(category, topics)
+        except Exception as e:
+            print(f"LLM 分类失败: {e}")
+            return "Uncategorized"
+
+    async def _classify_group(self, snippets, topics):
+        labels = {}
+        if len(snippets) > 1:
+            try:
+                response = await self._complete(
+                    model=Config.MODEL_NAME,
+                    messages=[{"role": "user", "content": _build_batch_prompt(snippets, topics)}],
+                    temperature=0.1
+                )
+                labels = _parse_batch_labels(response.choices[0].message.content, len(snippets))
+            except Exception as e:
+                print(f"LLM 批量分类失败，逐篇重试: {e}")
+
+        async def resolve(j, snippet):
+            if j in labels:
+                self.classify_cache.set(_classification_key(Config.MODEL_NAME, topics, snippet), labels[j])
+                return _match_topic(labels[j], topics)
+            return await self.classify_paper(snippet, topics)
+
+        return await asyncio.gather(*(resolve(j, s) for j, s in enumerate(snippets)))
+
+    @profiled("llm.classify_batch", items=len)
+    async def classify_papers(self, snippets, topics, batch_size=None):
+        """
+        批量分类：每 batch_size 篇摘要打包成一个请求，各批并发发送，
+        批量输出解析失败的论文单独回退到 classify_paper。返回与输入顺序一致的类别列表。
+        """
+        batch_size = batch_size or Config.CLASSIFY_BATCH_SIZE
+        results, misses = _lookup_cached(self.classify_cache, snippets, topics)
+        groups = [misses[i:i + batch_size] for i in range(0, len(misses), batch_size)]
+        outputs = await asyncio.gather(
+            *(self._classify_group([snippets[i] for i in group], topics) for group in groups)
+        )
+        for group, labels in zip(groups, outputs):
+            for i, label in zip(group, labels):
+                results[i] = label
+        return results
+
+    @profiled("llm.chat")
+    async def chat_with_context(self, query, context):
+        prompt = CHAT_PROMPT.format(context=context, query=query)
+        try:
+            response = await self._complete(
+                model=Config.MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            return f"生成回答失败: {e}"
@@ -0,0 +1,53 @@
+import os
+from .file_handler import extract_text_from_pdf, move_file_to_category, compute_file_hash, CHUNKER_VERSION
+
+# 入库结果状态
+INDEXED = "indexed"      # 新论文，已分类并编码入库
+MOVED = "moved"          # 已入库论文被移动/重命名，仅更新路径
+DUPLICATE = "duplicate"  # 内容与库中另一份仍存在的文件相同，跳过
+SKIPPED = "skipped"      # 该路径已入库且内容未变，跳过
+EMPTY = "empty"          # 未提取到文本
+FAILED = "failed"        # 处理出错
+
+
+def resolve_existing(file_path, doc_hash, db):
+    """
+    检查内容哈希是否已入库。已入库时处理移动/重复并返回 (状态, 分类, 最终路径)，
+    新论文返回 None。
+    """
+    existing = db.find_paper(doc_hash)
+    if not existing or existing.get('chunker') != CHUNKER_VERSION:
+        # 未入库，或用旧切分方式入库 (只有前 10 页、整页一块) 需要重新入库
+        return None
+
+    category = existing.get('category')
+    old_source = existing.get('source')
+    if old_source and os.path.abspath(old_source) == os.path.abspath(file_path):
+        return SKIPPED, category, file_path
+    if old_source and os.path.exists(old_source):
+        return DUPLICATE, category, file_path
+    # 原文件已不在：视为移动/重命名，复用已有分类和向量
+    new_path = move_file_to_category(file_path, category)
+    db.update_paper_source(doc_hash, new_path)
+    return MOVED, category, new_path
+
+
+def ingest_paper(file_path, topics, db, llm):
+    """
+    单篇论文入库：先按内容哈希去重，只有新内容才会调用 LLM 分类和文本编码。
+    返回 (状态, 分类, 最终路径)
+    """
+    doc_hash = compute_file_hash(file_path)
+    resolved = resolve_existing(file_path, doc_hash, db)
+    if resolved:
+        return resolved
+
+    chunks = extract_text_from_pdf(file_path)
+    if not chunks:
+        return EMPTY, None, file_path
+
+    # 使用第一页内容进行分类
+    category = llm.classify_paper(chunks[0]['text'], topics)
+    new_path = move_file_to_category(file_path, category)
+    db.add_paper_chunks(new_path, chunks, category, doc_hash=doc_hash)
+    return INDEXED, category, new_path
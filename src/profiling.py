@@ -0,0 +1,255 @@
+import sys
+import json
+import time
+import inspect
+import threading
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，不记录内存
+    resource = None
+
+# 每个 span 保留最近多少次耗时用于计算分位数
+SAMPLE_SIZE = 2048
+
+
+def peak_rss_bytes():
+    """
+    进程启动以来的峰值常驻内存 (字节)，不支持的平台返回 0
+    """
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))]
+
+
+class Span:
+    """
+    一次计时区间，区间内可以随时设置 items (本次处理的条数)
+    """
+    __slots__ = ("name", "items")
+
+    def __init__(self, name, items=0):
+        self.name = name
+        self.items = items
+
+
+class _SpanStats:
+    __slots__ = ("count", "errors", "total", "max", "items", "peak_rss", "rss_growth", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.items = 0
+        self.peak_rss = 0     # span 结束时观测到的进程峰值内存
+        self.rss_growth = 0   # span 执行期间把进程峰值内存抬高了多少 (累计)
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+
+class Profiler:
+    """
+    进程内的轻量计时器: 按 span 名称汇总调用次数、耗时、处理条数与峰值内存。
+    每次记录只有一次 perf_counter、两次 getrusage 和一次加锁，常开也几乎没有开销。
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, name, items=0):
+        current = Span(name, items)
+        if not self.enabled:
+            yield current
+            return
+        rss_before = peak_rss_bytes()
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield current
+        except GeneratorExit:
+            # 生成器被提前关闭 (调用方不再迭代) 不算出错
+            raise
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, current.items, failed,
+                        rss_before=rss_before, rss_after=peak_rss_bytes())
+
+    def record(self, name, seconds, items=0, failed=False, rss_before=None, rss_after=None):
+        """
+        直接记录一次耗时，用于在别处 (如子进程) 测得的时间；不传 rss_* 时不计内存
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = _SpanStats()
+            stats.count += 1
+            stats.errors += int(failed)
+            stats.total += seconds
+            stats.max = max(stats.max, seconds)
+            stats.items += items or 0
+            stats.samples.append(seconds)
+            if rss_after is not None:
+                stats.peak_rss = max(stats.peak_rss, rss_after)
+                if rss_before is not None:
+                    stats.rss_growth += max(0, rss_after - rss_before)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started = time.time()
+
+    def summary(self):
+        """
+        各 span 的汇总，按总耗时从高到低排序
+        """
+        with self._lock:
+            snapshot = [(name, s.count, s.errors, s.total, s.max, s.items, s.peak_rss, s.rss_growth, sorted(s.samples))
+                        for name, s in self._stats.items()]
+        rows = []
+        for name, count, errors, total, max_s, items, peak_rss, rss_growth, samples in snapshot:
+            rows.append({
+                "span": name,
+                "count": count,
+                "errors": errors,
+                "total_s": total,
+                "mean_ms": total / count * 1000,
+                "p50_ms": _percentile(samples, 50) * 1000,
+                "p95_ms": _percentile(samples, 95) * 1000,
+                "max_ms": max_s * 1000,
+                "items": items,
+                "items_per_sec": items / total if items and total > 0 else 0.0,
+                "peak_rss_mb": peak_rss / 2 ** 20,
+                "rss_growth_mb": rss_growth / 2 ** 20,
+            })
+        rows.sort(key=lambda r: r["total_s"], reverse=True)
+        return rows
+
+    def to_dict(self):
+        return {
+            "started": self.started,
+            "generated": time.time(),
+            "peak_rss_mb": peak_rss_bytes() / 2 ** 20,
+            "spans": self.summary(),
+        }
+
+    def format_table(self):
+        rows = self.summary()
+        if not rows:
+            return "(没有记录到任何 span)"
+        width = max(24, max(len(r["span"]) for r in rows) + 2)
+        lines = [f"{'span':<{width}}{'次数':>8}{'总耗时(s)':>12}{'平均(ms)':>11}{'p95(ms)':>11}"
+                 f"{'最大(ms)':>11}{'条数':>9}{'条/秒':>10}{'峰值内存(MB)':>14}"]
+        for r in rows:
+            lines.append(f"{r['span']:<{width}}{r['count']:>8}{r['total_s']:>12.3f}{r['mean_ms']:>11.2f}"
+                         f"{r['p95_ms']:>11.2f}{r['max_ms']:>11.2f}{r['items']:>9}{r['items_per_sec']:>10.1f}"
+                         f"{r['peak_rss_mb']:>14.1f}")
+        lines.append(f"进程峰值内存: {peak_rss_bytes() / 2 ** 20:.1f} MB")
+        return "\n".join(lines)
+
+    def prometheus_text(self, prefix="lma"):
+        """
+        Prometheus 文本格式 (0.0.4)，可直接作为 /metrics 响应或交给 node_exporter textfile 收集
+        """
+        rows = self.summary()
+
+        def label(name):
+            return name.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def family(metric, kind, help_text, samples):
+            out = [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} {kind}"]
+            out += [f"{prefix}_{metric}{suffix} {value!r}" for suffix, value in samples]
+            return out
+
+        lines = []
+        seconds = []
+        for r in rows:
+            span = label(r["span"])
+            seconds += [
+                (f'{{span="{span}",quantile="0.5"}}', r["p50_ms"] / 1000),
+                (f'{{span="{span}",quantile="0.95"}}', r["p95_ms"] / 1000),
+                (f'_sum{{span="{span}"}}', r["total_s"]),
+                (f'_count{{span="{span}"}}', r["count"]),
+            ]
+        lines += family("span_seconds", "summary", "Wall time spent in each span.", seconds)
+        lines += family("span_errors_total", "counter", "Spans that ended with an exception.",
+                        [(f'{{span="{label(r["span"])}"}}', r["errors"]) for r in rows])
+        lines += family("span_items_total", "counter", "Items processed inside each span.",
+                        [(f'{{span="{label(r["span"])}"}}', r["items"]) for r in rows])
+        lines += family("span_seconds_max", "gauge", "Slowest single call of each span.",
+                        [(f'{{span="{label(r["span"])}"}}', r["max_ms"] / 1000) for r in rows])
+        lines += family("span_peak_rss_bytes", "gauge", "Process peak RSS observed when each span ended.",
+                        [(f'{{span="{label(r["span"])}"}}', int(r["peak_rss_mb"] * 2 ** 20)) for r in rows])
+        lines += family("process_peak_rss_bytes", "gauge", "Process peak resident set size.",
+                        [("", peak_rss_bytes())])
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def write_prometheus(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+
+
+# 进程级单例，各模块共享
+PROFILER = Profiler()
+
+
+def span(name, items=0):
+    return PROFILER.span(name, items)
+
+
+def profiled(name, items=None):
+    """
+    装饰器: 每次调用记录一个 span。
+    items(返回值) -> 本次处理的条数；生成器函数按 yield 的次数计数。
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with PROFILER.span(name) as current:
+                    result = await fn(*args, **kwargs)
+                    if items is not None:
+                        current.items = items(result)
+                    return result
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                with PROFILER.span(name) as current:
+                    for value in fn(*args, **kwargs):
+                        current.items += 1
+                        yield value
+            return gen_wrapper
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with PROFILER.span(name) as current:
+                result = fn(*args, **kwargs)
+                if items is not None:
+                    current.items = items(result)
+                return result
+        return wrapper
+    return decorate
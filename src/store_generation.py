@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import threading
+from .config import Config
+
+
+class StoreGenerations:
+    """
+    各集合的写入代数，持久化在 SQLite 中，CLI、常驻服务与 Web 界面等多个进程共享。
+    每次写入后 +1；检索结果缓存的 key 带上当时的代数，任一进程写入后其他进程的旧缓存自然不再命中。
+    """
+
+    def __init__(self, path=None):
+        self.path = path or Config.STORE_GENERATION_PATH
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS generations (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def get(self, name):
+        """
+        读取集合的当前代数 (每次检索读一次，单行主键查询)
+        """
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM generations WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name):
+        """
+        集合写入完成后调用，返回新的代数
+        """
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO generations (name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (name,)
+            )
+            self.conn.commit()
+            return self.conn.execute("SELECT value FROM generations WHERE name = ?", (name,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
@@ -0,0 +1,460 @@
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+_DEFAULT_GET_INCLUDE = ("documents", "metadatas")
+_DEFAULT_QUERY_INCLUDE = ("documents", "metadatas", "distances")
+
+
+class VectorStore:
+    """
+    向量库接口: 方法名、参数与返回格式沿用 chromadb Collection 的常用子集，
+    DBManager 切换后端时其余代码不需要改动。距离一律为余弦距离 (1 - cos)。
+    """
+
+    def count(self):
+        raise NotImplementedError
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        raise NotImplementedError
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        raise NotImplementedError
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_GET_INCLUDE):
+        raise NotImplementedError
+
+    def delete(self, ids=None, where=None):
+        raise NotImplementedError
+
+    def query(self, query_embeddings, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        raise NotImplementedError
+
+
+class ChromaVectorStore(VectorStore):
+    """
+    chromadb 集合 (HNSW 近似检索) 的薄封装
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def count(self):
+        return self.collection.count()
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        self.collection.update(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_GET_INCLUDE):
+        return self.collection.get(ids=ids, where=where, limit=limit, offset=offset, include=list(include))
+
+    def delete(self, ids=None, where=None):
+        self.collection.delete(ids=ids, where=where)
+
+    def query(self, query_embeddings, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        return self.collection.query(
+            query_embeddings=query_embeddings, n_results=n_results, where=where, include=list(include)
+        )
+
+
+def _compare(value, op, target):
+    if op == "$eq":
+        return value == target
+    if op == "$ne":
+        return value != target
+    if op == "$in":
+        return value in target
+    if op == "$nin":
+        return value not in target
+    if value is None:
+        return False
+    if op == "$gt":
+        return value > target
+    if op == "$gte":
+        return value >= target
+    if op == "$lt":
+        return value < target
+    if op == "$lte":
+        return value <= target
+    raise ValueError(f"不支持的过滤操作符: {op}")
+
+
+def match_where(metadata, where):
+    """
+    按 Chroma where 语法判断一条 metadata 是否满足过滤条件
+    (字段等值、$eq/$ne/$in/$nin/$gt/$gte/$lt/$lte、$and/$or)
+    """
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(match_where(metadata, c) for c in condition):
+                return False
+        elif key == "$or":
+            if not any(match_where(metadata, c) for c in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            if not all(_compare(value, op, target) for op, target in condition.items()):
+                return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    精确检索后端: 归一化向量存放在磁盘上的连续矩阵里 (np.memmap，float32 或 float16)，
+    查询为一次矩阵乘法 + argpartition 取 top-k，多个查询向量合并成一次计算。
+    id / 文本 / metadata 存在同目录的 SQLite 中，metadata 常驻内存用于过滤。
+    删除的行留作空位，之后写入时复用。可在多线程间共享。
+
+    多个进程 (如 Streamlit 与 CLI) 可以同时打开同一目录:
+    写入在 SQLite 写锁 (BEGIN IMMEDIATE) 内进行，空位与新行都从 SQLite 分配；
+    每次写入递增持久化的 generation，读写前发现 generation 变化就重新加载内存映射与 id 表。
+    """
+
+    def __init__(self, directory, dtype="float32", block_rows=65536):
+        self.directory = directory
+        self.block_rows = block_rows
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.RLock()
+        # 其他进程持有写锁时最多等待 60 秒
+        self.conn = sqlite3.connect(os.path.join(directory, "items.db"), timeout=60, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        has_free = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'free'"
+        ).fetchone()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS items (
+                row INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                document TEXT,
+                metadata TEXT
+            );
+            CREATE TABLE IF NOT EXISTS info (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS free (
+                row INTEGER PRIMARY KEY
+            );
+            """
+        )
+
+        self._requested_dtype = dtype
+        self._generation = None
+        self.dim = None
+        self.capacity = 0
+        self._matrix = None
+        self._row_ids = {}     # row -> id
+        self._id_rows = {}     # id -> row
+        self._metadatas = {}   # row -> metadata
+        self._size = 0         # 已使用过的行数 (含空位)
+        self._alive = np.zeros(0, dtype=bool)  # 行 -> 是否有数据，无过滤查询时按块切片屏蔽空位
+        if not has_free:
+            # 旧版本目录没有空位表，按 items 中的空洞补上
+            with self._write():
+                used = sorted(self._row_ids)
+                gaps = sorted(set(range(used[-1] + 1)) - set(used)) if used else []
+                self.conn.executemany("INSERT OR IGNORE INTO free (row) VALUES (?)", [(row,) for row in gaps])
+        self._refresh()
+
+    # ---------- 跨进程同步 ----------
+    def _stored_generation(self):
+        row = self.conn.execute("SELECT value FROM info WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row else 0
+
+    def generation(self):
+        """
+        持久化的写入计数，任何进程写入后都会变化，可用作结果缓存的版本号
+        """
+        with self._lock:
+            return self._stored_generation()
+
+    def _refresh(self):
+        """
+        其他进程写入过 (generation 变化) 时重新加载矩阵形状与 id / metadata 映射
+        """
+        generation = self._stored_generation()
+        if generation == self._generation:
+            return
+        info = dict(self.conn.execute("SELECT key, value FROM info").fetchall())
+        # 已有数据时以磁盘上的精度为准
+        self.dtype = np.dtype(info.get("dtype", self._requested_dtype))
+        dim = int(info["dim"]) if "dim" in info else None
+        capacity = int(info.get("capacity", 0))
+        if self._matrix is None or (dim, capacity) != (self.dim, self.capacity):
+            self.dim, self.capacity = dim, capacity
+            self._open_matrix()
+
+        self._row_ids, self._id_rows, self._metadatas = {}, {}, {}
+        for row, doc_id, meta in self.conn.execute("SELECT row, id, metadata FROM items"):
+            self._row_ids[row] = doc_id
+            self._id_rows[doc_id] = row
+            self._metadatas[row] = json.loads(meta) if meta else None
+        self._size = max(self._row_ids, default=-1) + 1
+        self._alive = np.zeros(max(self.capacity, self._size), dtype=bool)
+        self._alive[np.fromiter(self._row_ids, dtype=np.int64, count=len(self._row_ids))] = True
+        self._generation = generation
+
+    def _mark_alive(self, rows, value):
+        """
+        写入/删除时同步更新存活行掩码，长度不足时按容量扩展
+        """
+        if len(self._alive) < self._size:
+            alive = np.zeros(max(self.capacity, self._size), dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+        self._alive[rows] = value
+
+    @contextmanager
+    def _write(self):
+        """
+        写事务: 持有 SQLite 写锁 (跨进程互斥)，先同步其他进程的写入，提交时递增 generation
+        """
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                yield
+                generation = self._stored_generation() + 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO info (key, value) VALUES ('generation', ?)", (str(generation),)
+                )
+                self.conn.commit()
+                self._generation = generation
+            except BaseException:
+                self.conn.rollback()
+                # 内存映射可能已部分修改，下次访问时从磁盘重新加载
+                self._generation = None
+                raise
+
+    def _allocate(self, count):
+        """
+        在写事务内分配 count 个行号: 先复用最小的空位，不足时追加到末尾
+        """
+        last = self.conn.execute(
+            "SELECT MAX(m) FROM (SELECT MAX(row) AS m FROM items UNION ALL SELECT MAX(row) FROM free)"
+        ).fetchone()[0]
+        end = 0 if last is None else last + 1
+        rows = [row for (row,) in self.conn.execute("SELECT row FROM free ORDER BY row LIMIT ?", (count,))]
+        self.conn.executemany("DELETE FROM free WHERE row = ?", [(row,) for row in rows])
+        rows.extend(range(end, end + count - len(rows)))
+        return rows
+
+    # ---------- 矩阵文件 ----------
+    @property
+    def _matrix_path(self):
+        return os.path.join(self.directory, "vectors.bin")
+
+    def _open_matrix(self):
+        if self.dim is None or self.capacity == 0:
+            self._matrix = None
+            return
+        self._matrix = np.memmap(self._matrix_path, dtype=self.dtype, mode="r+", shape=(self.capacity, self.dim))
+
+    def _save_info(self):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)",
+            [("dim", str(self.dim)), ("dtype", self.dtype.name), ("capacity", str(self.capacity))]
+        )
+
+    def _reserve(self, rows_needed):
+        """
+        容量不足时按倍数扩展矩阵文件 (行优先存储，扩展只需在文件末尾追加)
+        """
+        if rows_needed <= self.capacity:
+            return
+        capacity = max(rows_needed, self.capacity * 2, 1024)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._matrix_path, "ab") as f:
+            f.truncate(capacity * self.dim * self.dtype.itemsize)
+        self.capacity = capacity
+        self._save_info()
+        self._open_matrix()
+
+    @staticmethod
+    def _normalized(embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # ---------- 写入 ----------
+    def count(self):
+        with self._lock:
+            self._refresh()
+            return len(self._id_rows)
+
+    def upsert(self, ids, embeddings, documents=None, metadatas=None):
+        ids = list(ids)
+        if not ids:
+            return
+        if len(set(ids)) != len(ids):
+            raise ValueError("upsert 的 id 不能重复")
+        vectors = self._normalized(embeddings)
+        with self._write():
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._save_info()
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"向量维度 {vectors.shape[1]} 与集合维度 {self.dim} 不一致")
+
+            new_ids = [doc_id for doc_id in ids if doc_id not in self._id_rows]
+            new_rows = dict(zip(new_ids, self._allocate(len(new_ids))))
+            rows = [self._id_rows[doc_id] if doc_id in self._id_rows else new_rows[doc_id] for doc_id in ids]
+            self._size = max(self._size, max(rows) + 1)
+            self._reserve(self._size)
+
+            self._matrix[rows] = vectors.astype(self.dtype)
+            self._matrix.flush()
+            records = []
+            for i, (doc_id, row) in enumerate(zip(ids, rows)):
+                meta = metadatas[i] if metadatas is not None else None
+                document = documents[i] if documents is not None else None
+                self._row_ids[row] = doc_id
+                self._id_rows[doc_id] = row
+                self._metadatas[row] = meta
+                records.append((row, doc_id, document, json.dumps(meta, ensure_ascii=False) if meta is not None else None))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO items (row, id, document, metadata) VALUES (?, ?, ?, ?)", records
+            )
+            self._mark_alive(rows, True)
+
+    def update(self, ids, embeddings=None, documents=None, metadatas=None):
+        with self._write():
+            known = [(i, self._id_rows[doc_id]) for i, doc_id in enumerate(ids) if doc_id in self._id_rows]
+            if not known:
+                return
+            if embeddings is not None:
+                vectors = self._normalized([embeddings[i] for i, _ in known])
+                self._matrix[[row for _, row in known]] = vectors.astype(self.dtype)
+                self._matrix.flush()
+            for i, row in known:
+                if metadatas is not None:
+                    self._metadatas[row] = metadatas[i]
+                    self.conn.execute(
+                        "UPDATE items SET metadata = ? WHERE row = ?",
+                        (json.dumps(metadatas[i], ensure_ascii=False), row)
+                    )
+                if documents is not None:
+                    self.conn.execute("UPDATE items SET document = ? WHERE row = ?", (documents[i], row))
+
+    def delete(self, ids=None, where=None):
+        with self._write():
+            rows = self._select_rows(ids, where)
+            for row in rows:
+                del self._id_rows[self._row_ids.pop(row)]
+                del self._metadatas[row]
+            self._mark_alive(rows, False)
+            self.conn.executemany("DELETE FROM items WHERE row = ?", [(row,) for row in rows])
+            self.conn.executemany("INSERT OR IGNORE INTO free (row) VALUES (?)", [(row,) for row in rows])
+
+    # ---------- 读取 ----------
+    def _select_rows(self, ids=None, where=None):
+        if ids is not None:
+            rows = [self._id_rows[doc_id] for doc_id in dict.fromkeys(ids) if doc_id in self._id_rows]
+        else:
+            rows = sorted(self._row_ids)
+        if where:
+            rows = [row for row in rows if match_where(self._metadatas[row] or {}, where)]
+        return rows
+
+    def _documents(self, rows):
+        documents = {}
+        for i in range(0, len(rows), 500):
+            part = rows[i:i + 500]
+            marks = ",".join("?" * len(part))
+            documents.update(self.conn.execute(f"SELECT row, document FROM items WHERE row IN ({marks})", part))
+        return [documents.get(row) for row in rows]
+
+    def get(self, ids=None, where=None, limit=None, offset=None, include=_DEFAULT_GET_INCLUDE):
+        with self._lock:
+            self._refresh()
+            rows = self._select_rows(ids, where)
+            start = offset or 0
+            rows = rows[start:start + limit] if limit is not None else rows[start:]
+            return {
+                "ids": [self._row_ids[row] for row in rows],
+                "documents": self._documents(rows) if "documents" in include else None,
+                "metadatas": [self._metadatas[row] for row in rows] if "metadatas" in include else None,
+                "embeddings": (
+                    self._matrix[rows].astype(np.float32).tolist() if rows else []
+                ) if "embeddings" in include else None,
+            }
+
+    def query(self, query_embeddings, n_results=10, where=None, include=_DEFAULT_QUERY_INCLUDE):
+        queries = self._normalized(query_embeddings)
+        with self._lock:
+            self._refresh()
+            size = self._size
+            if where:
+                candidate_rows = np.array(self._select_rows(where=where), dtype=np.int64)
+            else:
+                candidate_rows = None
+                alive = self._alive
+
+            best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+            best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+            if self._matrix is not None and n_results > 0:
+                if candidate_rows is not None:
+                    blocks = [candidate_rows[i:i + self.block_rows] for i in range(0, len(candidate_rows), self.block_rows)]
+                else:
+                    blocks = [np.arange(i, min(i + self.block_rows, size)) for i in range(0, size, self.block_rows)]
+
+                # 分块计算，控制 float16 转 float32 的临时内存；每块取 top-k 后与已有候选合并
+                for rows in blocks:
+                    if candidate_rows is not None:
+                        block = np.asarray(self._matrix[rows], dtype=np.float32)
+                        scores = queries @ block.T
+                    else:
+                        block = np.asarray(self._matrix[rows[0]:rows[-1] + 1], dtype=np.float32)
+                        scores = queries @ block.T
+                        scores[:, ~alive[rows[0]:rows[-1] + 1]] = -np.inf
+                    scores = np.concatenate([best_scores, scores], axis=1)
+                    all_rows = np.concatenate([best_rows, np.broadcast_to(rows, (len(queries), len(rows)))], axis=1)
+                    k = min(n_results, scores.shape[1])
+                    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                    best_scores = np.take_along_axis(scores, top, axis=1)
+                    best_rows = np.take_along_axis(all_rows, top, axis=1)
+
+            result = {key: [] for key in ("ids", "documents", "metadatas", "distances")}
+            for scores, rows in zip(best_scores, best_rows):
+                order = np.argsort(-scores, kind="stable")
+                picked = [int(rows[j]) for j in order if np.isfinite(scores[j])]
+                result["ids"].append([self._row_ids[row] for row in picked])
+                result["distances"].append([float(1 - scores[j]) for j in order if np.isfinite(scores[j])])
+                result["metadatas"].append([self._metadatas[row] for row in picked])
+                result["documents"].append(self._documents(picked) if "documents" in include else None)
+
+            return {
+                "ids": result["ids"],
+                "documents": result["documents"] if "documents" in include else None,
+                "metadatas": result["metadatas"] if "metadatas" in include else None,
+                "distances": result["distances"] if "distances" in include else None,
+                "embeddings": None,
+            }
+
+
+def copy_store(source, target, page_size=5000):
+    """
+    把一个向量库的全部条目 (向量、文本、metadata) 复制到另一个，返回复制条数
+    """
+    total = source.count()
+    for offset in range(0, total, page_size):
+        batch = source.get(limit=page_size, offset=offset, include=["embeddings", "documents", "metadatas"])
+        if batch['ids']:
+            target.upsert(batch['ids'], batch['embeddings'], batch['documents'], batch['metadatas'])
+    return total
@@ -1,11 +1,71 @@
-from transformers import AutoProcessor, AutoModelForCausalLM
+import io
+import hashlib
 from PIL import Image
 from .config import Config
-import torch
+from .disk_cache import DiskCache, make_key
+from .file_handler import compute_file_hash
+from .image_cache import open_image_cache
+from .image_loader import iter_image_batches, load_image_rgb, fit_rgb
+from .profiling import profiled, span
+import os
+import threading
 import traceback # 引入详细报错工具
 
+# Florence-2 输入为 768x768，批量解码时先缩到这个尺寸
+FLORENCE_INPUT_SIZE = 768
+
 class VisionExpert:
+    """
+    Florence-2 体积很大 (2-3 GB)，构造时不加载，首次分析图片时才加载 (torch / transformers 同样延迟 import)
+    """
+
     def __init__(self):
+        self.model = None
+        self.processor = None
+        self.device = None
+        self.torch_dtype = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        # 两个缓存同样在首次使用时才打开，不用视觉模型的命令不碰缓存文件
+        self._cache_lock = threading.Lock()
+        self._cache = None
+        self._image_cache = None
+
+    # 分析结果持久化缓存 key: (图片内容哈希, 任务, 问题, 模型路径)
+    @property
+    def cache(self):
+        if self._cache is None:
+            with self._cache_lock:
+                if self._cache is None:
+                    self._cache = DiskCache(
+                        os.path.join(Config.CACHE_DIR, "vision_cache.db"),
+                        max_bytes=Config.VISION_CACHE_MAX_MB * 1024 * 1024
+                    )
+        return self._cache
+
+    # 缩小到 768px 的输入图缓存 (与 DBManager 共用同一目录，关闭时为 None)
+    @property
+    def image_cache(self):
+        if self._image_cache is None:
+            with self._cache_lock:
+                if self._image_cache is None:
+                    self._image_cache = open_image_cache() or False
+        return self._image_cache or None
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return self.model is not None
+        with self._load_lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+        return self.model is not None
+
+    @profiled("load.florence")
+    def _load(self):
+        import torch
+        from transformers import AutoProcessor, AutoModelForCausalLM
+
         print(f"👁️ 正在加载 Florence-2 视觉专家: {Config.VISION_MODEL_PATH} ...")
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
         self.torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
@@ -27,21 +87,60 @@ class VisionExpert:
             print(f"❌ 加载失败: {e}")
             self.model = None
 
-    def analyze_image(self, image_path, prompt_type="<MORE_DETAILED_CAPTION>", user_question=None):
-        if not self.model:
-            return "❌ 模型未加载"
-            
-        try:
-            # 1. 语言检查
-            if user_question:
-                for char in user_question:
-                    if '\u4e00' <= char <= '\u9fff':
-                        return "⚠️ Florence-2 仅支持英文提问 (Only English supported)."
+    def analyze_image(self, image, prompt_type="<MORE_DETAILED_CAPTION>", user_question=None):
+        return self.analyze_image_tasks(image, [(prompt_type, user_question)])[0]
 
-            print(f"🔍 Debug: 正在打开图片 {image_path}")
-            image = Image.open(image_path)
-            if image.mode != "RGB":
-                image = image.convert("RGB")
+    def _content_hash(self, image):
+        """
+        分析缓存用的内容哈希。文件与其原始字节 (如网页上传) 的哈希相同，共享缓存结果
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return hashlib.sha256(image).hexdigest()
+        if isinstance(image, Image.Image):
+            h = hashlib.sha256(f"{image.mode}:{image.width}x{image.height}:".encode("ascii"))
+            h.update(image.tobytes())
+            return h.hexdigest()
+        if self.image_cache is not None:
+            return self.image_cache.content_hash(image)
+        return compute_file_hash(image)
+
+    def _load_input(self, image):
+        """
+        得到缩小到 FLORENCE_INPUT_SIZE 的 RGB 输入图。
+        路径输入有磁盘缓存时不再解码原图；字节与 PIL 图片只在内存中处理，不落盘
+        """
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            return load_image_rgb(io.BytesIO(image), FLORENCE_INPUT_SIZE)
+        if isinstance(image, Image.Image):
+            resized = fit_rgb(image, FLORENCE_INPUT_SIZE)
+            if resized is not image:
+                resized.info["source_size"] = image.size
+            return resized
+        if self.image_cache is not None:
+            return self.image_cache.load(image, FLORENCE_INPUT_SIZE)
+        return load_image_rgb(image, FLORENCE_INPUT_SIZE)
+
+    def _cache_key(self, image_hash, task_prompt, user_question=None):
+        return make_key("florence", image_hash, task_prompt, user_question, Config.VISION_MODEL_PATH)
+
+    @profiled("vision.analyze", items=len)
+    def analyze_image_tasks(self, image, tasks):
+        """
+        同一张图片执行多个任务：图片只预处理、只过一次视觉编码器，各任务的解码共享图像特征。
+        image: 图片路径、原始文件字节 (bytes) 或 PIL 图片
+        tasks: [prompt_type 或 (prompt_type, user_question), ...]，按顺序返回结果列表
+        """
+        results = [None] * len(tasks)
+        pending = []  # (序号, task_prompt, text_input, cache_key)
+        image_hash = None
+
+        for i, task in enumerate(tasks):
+            prompt_type, user_question = (task, None) if isinstance(task, str) else task
+
+            # 1. 语言检查
+            if user_question and any('\u4e00' <= char <= '\u9fff' for char in user_question):
+                results[i] = "⚠️ Florence-2 仅支持英文提问 (Only English supported)."
+                continue
 
             # 2. 构建 Prompt
             # 关键：<VQA> 后面必须有空格，防止与问题粘连
@@ -52,43 +151,152 @@ class VisionExpert:
                 task_prompt = prompt_type
                 text_input = task_prompt
 
-            # 3. 处理输入
-            inputs = self.processor(text=text_input, images=image, return_tensors="pt")
-            inputs = inputs.to(self.device, self.torch_dtype)
+            # 3. 查缓存：同一张图 (按内容哈希) 的同一任务/问题只生成一次，命中时无需加载模型
+            if image_hash is None:
+                try:
+                    image_hash = self._content_hash(image)
+                except OSError as e:
+                    print(f"❌ 分析错误: {e}")
+                    return [r if r is not None else f"Error: {e}" for r in results]
+            cache_key = self._cache_key(image_hash, task_prompt, user_question)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.append((i, task_prompt, text_input, cache_key))
+
+        if not pending:
+            return results
+        if not self._ensure_loaded():
+            for i, *_ in pending:
+                results[i] = "❌ 模型未加载"
+            return results
+
+        try:
+            import torch
+            if isinstance(image, (str, os.PathLike)):
+                print(f"🔍 Debug: 正在打开图片 {image}")
+            image = self._load_input(image)
+
+            with torch.inference_mode():
+                # 视觉编码器 (DaViT) 整张图只跑一次
+                with span("vision.encode_image"):
+                    pixel_values = self.processor.image_processor(image, return_tensors="pt")["pixel_values"]
+                    image_features = self.model._encode_image(pixel_values.to(self.device, self.torch_dtype))
+
+                for i, task_prompt, text_input, cache_key in pending:
+                    result = self._generate(image, image_features, task_prompt, text_input)
+                    self.cache.set(cache_key, result)
+                    results[i] = result
+            
+        except Exception as e:
+            print(f"❌ 分析错误: {e}")
+            traceback.print_exc()
+            for i, *_ in pending:
+                if results[i] is None:
+                    results[i] = f"Error: {e}"
+        return results
 
-            # 4. 生成 (强制 Greedy Search)
+    @profiled("vision.generate")
+    def _generate(self, image, image_features, task_prompt, text_input):
+        # 处理输入：只对文本分词，图像特征直接拼接到 prompt 的 embedding 前
+        prompt = self.processor._construct_prompts([text_input])
+        input_ids = self.processor.tokenizer(prompt, return_tensors="pt")["input_ids"].to(self.device)
+        inputs_embeds = self.model.get_input_embeddings()(input_ids)
+        inputs_embeds, attention_mask = self.model._merge_input_ids_with_image_features(image_features, inputs_embeds)
+
+        # 生成 (强制 Greedy Search，使用 KV cache)
+        generated_ids = self.model.generate(
+            input_ids=None,
+            inputs_embeds=inputs_embeds,
+            attention_mask=attention_mask,
+            max_new_tokens=1024,
+            num_beams=1,
+            do_sample=False
+        )
+
+        return self._decode(generated_ids[0], input_ids.shape[1], task_prompt, image)
+
+    def _decode(self, generated_ids, input_token_len, task_prompt, image):
+        """
+        解码单条生成结果
+        """
+        # 【物理切片修复】只保留新生成的 token，彻底去除 Prompt 回显
+        # 只取输入长度之后的部分（即纯粹的回答）
+        new_tokens = generated_ids[input_token_len:]
+        
+        # 解码
+        answer = self.processor.decode(new_tokens, skip_special_tokens=True).strip()
+
+        # 兜底检查：如果模型还是发疯输出了 <loc> 标签
+        if "<loc" in answer or answer == "":
+            # 尝试用官方后处理再救一次
+            full_text = self.processor.decode(generated_ids, skip_special_tokens=False)
+            parsed = self.processor.post_process_generation(
+                full_text, 
+                task=task_prompt, 
+                image_size=image.info.get("source_size", image.size)
+            )
+            return parsed.get(task_prompt, answer)
+        
+        return answer
+
+    @profiled("vision.generate_batch", items=len)
+    def _generate_batch(self, images, task_prompt):
+        """
+        同一任务的多张图片 padding 成一批，一次 generate
+        """
+        import torch
+        inputs = self.processor(text=[task_prompt] * len(images), images=images,
+                                return_tensors="pt", padding=True)
+        inputs = inputs.to(self.device, self.torch_dtype)
+        with torch.inference_mode():
             generated_ids = self.model.generate(
                 input_ids=inputs["input_ids"],
                 pixel_values=inputs["pixel_values"],
                 max_new_tokens=1024,
                 num_beams=1,
-                do_sample=False,
-                use_cache=False 
+                do_sample=False
             )
+        input_token_len = inputs["input_ids"].shape[1]
+        return [self._decode(ids, input_token_len, task_prompt, image)
+                for ids, image in zip(generated_ids, images)]
 
-            # 5. 【物理切片修复】只保留新生成的 token，彻底去除 Prompt 回显
-            # 获取输入部分的长度
-            input_token_len = inputs["input_ids"].shape[1]
-            # 只取输入长度之后的部分（即纯粹的回答）
-            new_tokens = generated_ids[0][input_token_len:]
-            
-            # 6. 解码
-            answer = self.processor.decode(new_tokens, skip_special_tokens=True).strip()
-
-            # 7. 兜底检查：如果模型还是发疯输出了 <loc> 标签
-            if "<loc" in answer or answer == "":
-                # 尝试用官方后处理再救一次
-                full_text = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
-                parsed = self.processor.post_process_generation(
-                    full_text, 
-                    task=task_prompt, 
-                    image_size=(image.width, image.height)
-                )
-                return parsed.get(task_prompt, answer)
-            
-            return answer
-            
-        except Exception as e:
-            print(f"❌ 分析错误: {e}")
-            traceback.print_exc()
-            return f"Error: {e}"
\ No newline at end of file
+    def caption_images(self, paths, batch_size=None, prompt_type="<MORE_DETAILED_CAPTION>", num_workers=None):
+        """
+        批量生成图片描述：后台线程预取解码下一批图片，当前批 padding 后一次生成。
+        分析缓存中已有的描述直接复用 (与 analyze_image 共用缓存)。
+        每批 yield (成功路径列表, 描述列表, [(失败路径, 错误信息), ...])
+        """
+        batch_size = batch_size or Config.CAPTION_BATCH_SIZE
+        num_workers = num_workers or Config.IMAGE_LOADER_WORKERS
+
+        for ok_paths, images, errors in iter_image_batches(paths, batch_size, num_workers, FLORENCE_INPUT_SIZE,
+                                                           self.image_cache):
+            failures = [(p, str(e)) for p, e in errors]
+            captions, keys = {}, {}
+            for path in ok_paths:
+                try:
+                    keys[path] = self._cache_key(self._content_hash(path), prompt_type)
+                except OSError as e:
+                    failures.append((path, str(e)))
+                    continue
+                cached = self.cache.get(keys[path])
+                if cached is not None:
+                    captions[path] = cached
+
+            todo = [(p, image) for p, image in zip(ok_paths, images) if p in keys and p not in captions]
+            if todo:
+                if not self._ensure_loaded():
+                    raise RuntimeError("Florence-2 模型未加载")
+                try:
+                    generated = self._generate_batch([image for _, image in todo], prompt_type)
+                    for (path, _), caption in zip(todo, generated):
+                        captions[path] = caption
+                        self.cache.set(keys[path], caption)
+                except Exception as e:
+                    print(f"❌ 批量生成失败: {e}")
+                    failures.extend((path, str(e)) for path, _ in todo)
+
+            done = [p for p in ok_paths if p in captions]
+            yield done, [captions[p] for p in done], failures
@@ -0,0 +1,78 @@
+import pytest
+
+from src.batch_search import BatchSearch, read_queries
+from src.config import Config
+
+
+def _write(tmp_path, lines):
+    path = tmp_path / "queries.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_read_queries_ids_and_blank_lines(tmp_path):
+    path = _write(tmp_path, ['"plain query"', "", '{"query": "with id", "id": "q7"}', '{"query": "no id"}'])
+    assert list(read_queries(path)) == [(1, "plain query"), ("q7", "with id"), (4, "no id")]
+
+
+@pytest.mark.parametrize("bad, message", [
+    ("[1, 2]", "应为 JSON 对象或字符串"),
+    ('{"id": 3}', '缺少字符串类型的 "query" 字段'),
+    ('{"query": 42}', '缺少字符串类型的 "query" 字段'),
+    ('{"query": "unterminated', "不是合法的 JSON"),
+])
+def test_read_queries_reports_malformed_line_number(tmp_path, bad, message):
+    path = _write(tmp_path, ['"first"', "", '{"query": "third"}', bad, '"fifth"'])
+    read = []
+    with pytest.raises(ValueError) as excinfo:
+        for record in read_queries(path):
+            read.append(record)
+    # 出错前的行照常产出，错误信息指明文件与行号
+    assert read == [(1, "first"), (3, "third")]
+    assert f"{path} 第 4 行" in str(excinfo.value)
+    assert message in str(excinfo.value)
+
+
+@pytest.fixture
+def numpy_db(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    pytest.importorskip("dotenv")
+    from benchmarks.stub_models import StubDBManager
+    from benchmarks.synthetic import make_chunks
+
+    for name, file in (("VECTOR_STORE_DIR", "store"), ("LEXICAL_INDEX_PATH", "lexical.db"),
+                       ("STORE_GENERATION_PATH", "gen.db"), ("CACHE_DIR", "cache")):
+        monkeypatch.setattr(Config, name, str(tmp_path / file))
+    db = StubDBManager()
+    db._paper_collection = db.open_store("papers", "numpy")
+    db.add_paper_batch(make_chunks(200, seed=3))
+    return db
+
+
+@pytest.mark.parametrize("hybrid", [True, False])
+def test_batch_results_match_single_queries(numpy_db, monkeypatch, hybrid):
+    from benchmarks.synthetic import random_queries, term_queries
+
+    monkeypatch.setattr(Config, "HYBRID_SEARCH", hybrid)
+    queries = random_queries(7, seed=5) + term_queries(6, 20, seed=6)
+    records = []
+    stats = BatchSearch(numpy_db, n_results=4, batch_size=5, with_text=True, on_result=records.append).run(
+        [(f"q{i}", q) for i, q in enumerate(queries)]
+    )
+    assert stats["queries"] == len(queries)
+    # 输出保持输入顺序
+    assert [r["id"] for r in records] == [f"q{i}" for i in range(len(queries))]
+
+    # 清空缓存后逐条检索作为对照
+    numpy_db.result_cache.clear()
+    numpy_db.embedding_cache.clear()
+    for record, query in zip(records, queries):
+        single = numpy_db.search_papers(query, n_results=4)
+        assert record["query"] == query
+        assert [hit["id"] for hit in record["results"]] == single["ids"][0]
+        assert [hit["document"] for hit in record["results"]] == single["documents"][0]
+        assert [hit["metadata"] for hit in record["results"]] == single["metadatas"][0]
+        assert [hit["score"] for hit in record["results"]] == pytest.approx(
+            [1 - d for d in single["distances"][0]], abs=1e-5
+        )
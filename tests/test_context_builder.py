@@ -0,0 +1,89 @@
+import re
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.context_builder import ContextBuilder
+from src.file_handler import count_tokens
+
+
+class _BagOfWords:
+    """
+    测试用编码器: 词袋向量，共享词越多越相似，完全相同的句子余弦为 1
+    """
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, texts):
+        words = [re.findall(r"\w+", text.lower()) for text in texts]
+        for ws in words:
+            for w in ws:
+                self.vocab.setdefault(w, len(self.vocab))
+        vectors = np.zeros((len(texts), max(len(self.vocab), 1)), dtype=np.float32)
+        for row, ws in enumerate(words):
+            for w in ws:
+                vectors[row, self.vocab[w]] += 1
+        return vectors
+
+
+def _results(chunks):
+    return {
+        "ids": [[f"c{i}" for i in range(len(chunks))]],
+        "documents": [[text for _, text in chunks]],
+        "metadatas": [[{"source": source, "page": i + 1} for i, (source, _) in enumerate(chunks)]],
+        "distances": [[0.1 * i for i in range(len(chunks))]],
+    }
+
+
+CHUNKS = [
+    ("a.pdf", "Transformers rely on self attention. Attention weights mix token values. "
+              "The paper also reports training cost on large clusters."),
+    ("b.pdf", "Convolutional networks use local filters. Pooling layers shrink feature maps."),
+    ("c.pdf", "Self attention compares every token pair. Multi head attention splits the projection."),
+    ("d.pdf", "Reinforcement learning agents maximise reward. Policies are updated with gradients."),
+    ("e.pdf", "Sparse attention patterns cut the quadratic token cost."),
+    # 中间一句无关: 同时选中首尾两句时中间要插入省略号
+    ("f.pdf", "Self attention weights tokens. Bread dough rises overnight in a warm kitchen. "
+              "Attention weights tokens by similarity."),
+]
+QUERY = "how does self attention weight tokens"
+
+
+@pytest.mark.parametrize("max_tokens", range(6, 160))
+def test_context_never_exceeds_budget_including_headers(max_tokens):
+    built = ContextBuilder(_BagOfWords(), max_tokens=max_tokens, dedup_threshold=1.1).build(QUERY, _results(CHUNKS))
+    assert built["tokens"] == count_tokens(built["context"])
+    assert built["tokens"] <= max_tokens
+    if built["sentences"]:
+        # 每个被引用的 chunk 都有一行来源标注
+        assert built["context"].count("文档:") == len(built["citations"])
+
+
+def test_near_duplicate_sentences_from_overlapping_windows_are_dropped():
+    repeated = "Self attention compares every token pair."
+    chunks = [
+        ("a.pdf", f"Attention weights mix token values. {repeated}"),
+        ("a.pdf", f"{repeated} Multi head attention splits the projection."),
+    ]
+    built = ContextBuilder(_BagOfWords(), max_tokens=500).build(QUERY, _results(chunks))
+    assert built["context"].count(repeated) == 1
+    assert built["sentences"] == 3
+
+
+def test_citation_refs_match_renumbered_blocks():
+    # 只有 a.pdf / c.pdf / e.pdf 的句子与问题相关，预算只够放下它们中的一部分
+    builder = ContextBuilder(_BagOfWords(), max_tokens=60, dedup_threshold=1.1)
+    built = builder.build(QUERY, _results(CHUNKS))
+
+    headers = re.findall(r"^\[(\d+)\] 文档: (\S+) \(第 (\S+) 页\)$", built["context"], flags=re.M)
+    assert [int(ref) for ref, _, _ in headers] == list(range(1, len(headers) + 1))
+    assert [(c["ref"], c["source"], c["page"]) for c in built["citations"]] == [
+        (int(ref), source, page) for ref, source, page in headers
+    ]
+    sources = [c["source"] for c in built["citations"]]
+    assert "b.pdf" not in sources and "d.pdf" not in sources
+    # 编号连续，没有沿用检索结果中的原始序号
+    assert sources[0] == "a.pdf" and built["citations"][0]["ref"] == 1
+    assert len(sources) >= 2
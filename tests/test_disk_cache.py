@@ -0,0 +1,44 @@
+from src.disk_cache import DiskCache
+
+
+def _age(cache, key, last_access):
+    with cache._lock:
+        cache.conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (last_access, key))
+        cache.conn.commit()
+
+
+def test_recent_hits_do_not_write(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.db"))
+    cache.set("k", {"v": 1})
+    before = cache.conn.total_changes
+    for _ in range(100):
+        assert cache.get("k") == {"v": 1}
+    assert cache.conn.total_changes == before
+    assert cache.hits == 100
+
+
+def test_stale_hit_is_recorded_before_eviction(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.db"), max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    _age(cache, "a", 1.0)
+    _age(cache, "b", 2.0)
+
+    # a 的命中只攒在内存里，下一次 set 淘汰前写入，所以被淘汰的是 b
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_pending_touches_flush_in_batches(tmp_path):
+    cache = DiskCache(str(tmp_path / "c.db"), touch_batch=3)
+    for key in "abc":
+        cache.set(key, key)
+        _age(cache, key, 1.0)
+    cache.get("a")
+    cache.get("b")
+    assert cache.conn.execute("SELECT COUNT(*) FROM entries WHERE last_access > 1").fetchone()[0] == 0
+    cache.get("c")
+    assert cache.conn.execute("SELECT COUNT(*) FROM entries WHERE last_access > 1").fetchone()[0] == 3
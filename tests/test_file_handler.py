@@ -0,0 +1,33 @@
+from src.file_handler import count_tokens, iter_token_windows
+
+CHINESE_PAGE = "近年来，多模态大模型在图像理解与文本生成方面取得了显著进展。" * 60
+
+
+def test_count_tokens_counts_each_cjk_character():
+    assert count_tokens("多模态模型") == 5
+    assert count_tokens("CLIP 模型。") == 4
+    assert count_tokens("hello, world") == 3
+
+
+def test_chinese_pages_are_split_under_token_limit():
+    pages = [(1, CHINESE_PAGE), (2, CHINESE_PAGE)]
+    chunks = list(iter_token_windows(pages, max_tokens=200, overlap=20))
+    assert len(chunks) > 10
+    for chunk in chunks:
+        assert count_tokens(chunk["text"]) <= 200
+    # 汉字之间不插入空格
+    assert " " not in chunks[0]["text"]
+    assert chunks[0]["page"] == 1 and chunks[-1]["page_end"] == 2
+
+
+def test_windows_overlap_and_keep_word_spacing():
+    words = " ".join(f"w{i}" for i in range(50))
+    chunks = list(iter_token_windows([(1, words)], max_tokens=10, overlap=4))
+    assert chunks[0]["text"] == " ".join(f"w{i}" for i in range(10))
+    assert chunks[1]["text"].startswith("w6 w7 w8 w9 w10")
+    assert chunks[-1]["text"].endswith("w49")
+
+
+def test_mixed_text_is_reconstructed():
+    chunks = list(iter_token_windows([(1, "基于 CLIP 的检索 model,works")], max_tokens=100))
+    assert chunks == [{"text": "基于 CLIP 的检索 model,works", "page": 1, "page_end": 1, "chunk": 0}]
@@ -0,0 +1,107 @@
+import os
+
+import pytest
+
+from src.image_manifest import ImageManifest, canonical_path
+
+MODEL = "clip-test"
+
+
+def _make_images(root):
+    os.makedirs(root / "imgs" / "sub")
+    for name in ("a.jpg", "sub/b.png"):
+        (root / "imgs" / name).write_bytes(name.encode())
+    return [str(root / "imgs" / "a.jpg"), str(root / "imgs" / "sub" / "b.png")]
+
+
+def _plan(manifest, directory, model=MODEL):
+    paths = []
+    for base, _, files in os.walk(directory):
+        paths.extend(os.path.join(base, f) for f in files)
+    return manifest.plan(paths, directory, model)
+
+
+def test_equivalent_directory_spellings_share_records(tmp_path, monkeypatch):
+    _make_images(tmp_path)
+    os.symlink(tmp_path / "imgs", tmp_path / "link")
+    monkeypatch.chdir(tmp_path)
+    manifest = ImageManifest(str(tmp_path / "manifest.db"))
+
+    to_embed, touched, removed, unchanged = _plan(manifest, "./imgs")
+    assert sorted(to_embed) == sorted(canonical_path(p) for p in ("imgs/a.jpg", "imgs/sub/b.png"))
+    manifest.record(to_embed, MODEL)
+
+    for spelling in ("imgs", "./imgs/", str(tmp_path / "imgs"), "link", "imgs/../imgs"):
+        to_embed, touched, removed, unchanged = _plan(manifest, spelling)
+        assert (to_embed, touched, removed, unchanged) == ({}, {}, [], 2), spelling
+
+
+def _insert_legacy(manifest, path, digest="x"):
+    # 旧版本按原样路径写入的记录
+    st = os.stat(path)
+    with manifest._lock:
+        manifest.conn.execute(
+            "INSERT INTO images VALUES (?, ?, ?, ?, ?)", (path, st.st_size, st.st_mtime_ns, digest, MODEL)
+        )
+        manifest.conn.execute("PRAGMA user_version = 0")
+        manifest.conn.commit()
+
+
+def test_legacy_relative_entries_are_migrated_once(tmp_path, monkeypatch):
+    _make_images(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    manifest = ImageManifest(str(tmp_path / "manifest.db"))
+    _insert_legacy(manifest, "imgs/a.jpg")
+    _insert_legacy(manifest, "./imgs/a.jpg")
+
+    renamed = []
+    assert manifest.migrate(renamed.append) == 2
+    assert renamed == [{"./imgs/a.jpg": canonical_path("imgs/a.jpg"), "imgs/a.jpg": None}]
+    assert manifest.migrate(renamed.append) == 0
+
+    # 迁移后记录已是规范路径: a.jpg 未变化，只需编码 b.png
+    to_embed, touched, removed, unchanged = _plan(manifest, "imgs")
+    assert (sorted(to_embed), removed, unchanged) == ([canonical_path("imgs/sub/b.png")], [], 1)
+
+
+def test_entries_under_only_returns_rows_below_directory(tmp_path):
+    manifest = ImageManifest(str(tmp_path / "manifest.db"))
+    root = canonical_path(str(tmp_path))
+    record = (1, 1, "h")
+    manifest.record({
+        os.path.join(root, "imgs", "a.jpg"): record,
+        os.path.join(root, "imgs", "sub", "b.png"): record,
+        os.path.join(root, "imgs2", "c.jpg"): record,
+        os.path.join(root, "IMGS", "d.jpg"): record,
+        os.path.join(root, "img%", "e.jpg"): record,
+    }, MODEL)
+    assert sorted(manifest.entries_under(os.path.join(root, "imgs"))) == [
+        os.path.join(root, "imgs", "a.jpg"), os.path.join(root, "imgs", "sub", "b.png"),
+    ]
+    assert list(manifest.entries_under(os.path.join(root, "img%"))) == [os.path.join(root, "img%", "e.jpg")]
+
+
+def test_migration_moves_image_vectors_to_canonical_ids(tmp_path, monkeypatch):
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    from src.config import Config
+    from src.db_manager import DBManager
+
+    _make_images(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, "VECTOR_STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(Config, "IMAGE_MANIFEST_PATH", str(tmp_path / "manifest.db"))
+    monkeypatch.setattr(Config, "STORE_GENERATION_PATH", str(tmp_path / "gen.db"))
+
+    db = DBManager()
+    db._image_collection = db.open_store("images", "numpy")
+    vector = [1.0, 0.0, 0.0, 0.0]
+    db.image_collection.upsert(ids=["imgs/a.jpg"], embeddings=[vector], metadatas=[{"source": "imgs/a.jpg"}])
+    _insert_legacy(ImageManifest(), "imgs/a.jpg")
+
+    assert db.image_manifest.entries_under("imgs")
+    new_id = canonical_path("imgs/a.jpg")
+    stored = db.image_collection.get(include=["embeddings", "metadatas"])
+    assert stored["ids"] == [new_id]
+    assert stored["metadatas"] == [{"source": new_id}]
+    assert np.allclose(stored["embeddings"][0], vector)
@@ -0,0 +1,45 @@
+from src.lexical_index import LexicalIndex, tokenize
+
+
+def _index(tmp_path, **kwargs):
+    return LexicalIndex(str(tmp_path / "lexical.db"), **kwargs)
+
+
+def test_tokenize_splits_chinese_into_bigrams():
+    assert tokenize("基于注意力的 BERT-base") == ["基于", "于注", "注意", "意力", "力的", "bert", "base"]
+    assert tokenize("图 A") == ["图", "a"]
+
+
+def test_rare_term_outranks_common_terms(tmp_path):
+    index = _index(tmp_path, max_df_ratio=0.1, term_postings=5)
+    ids = [f"c{i}" for i in range(100)]
+    docs = ["the model uses attention layers" for _ in ids]
+    docs[42] = "the model uses LoRA adapters"
+    index.add(ids, docs, [{"source": f"p{i // 10}.pdf"} for i in range(100)])
+
+    assert index.search("LoRA model", n_results=3)[0][0] == "c42"
+    # 全是高频词时不做词法检索
+    assert index.search("the model", n_results=3) == []
+
+
+def test_postings_per_term_are_capped(tmp_path):
+    index = _index(tmp_path, max_df_ratio=1.0, term_postings=4)
+    ids = [f"c{i}" for i in range(20)]
+    docs = [" ".join(["graph"] * (i + 1)) for i in range(20)]
+    index.add(ids, docs, [{"source": "p.pdf"} for _ in ids])
+    hits = index.search("graph", n_results=10)
+    assert [doc_id for doc_id, _ in hits] == ["c19", "c18", "c17", "c16"]
+
+
+def test_counts_follow_deletes_and_overwrites(tmp_path):
+    index = _index(tmp_path)
+    index.add(["a", "b"], ["alpha beta", "beta gamma"], [{"source": "x.pdf"}, {"source": "y.pdf"}])
+    index.add(["b"], ["delta"], [{"source": "y.pdf"}])
+    assert len(index) == 2
+    assert index.search("gamma") == []
+    index.delete_papers(sources=["x.pdf"])
+    assert len(index) == 1
+    assert index.search("alpha") == []
+    assert [doc_id for doc_id, _ in index.search("delta")] == ["b"]
+    rows = dict(index.conn.execute("SELECT term, df FROM terms"))
+    assert rows == {"delta": 1}
@@ -0,0 +1,98 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("httpx")
+
+from src.disk_cache import DiskCache
+from src.llm_client import AsyncLLMClient, LLMClient, _parse_batch_labels
+
+TOPICS = "Computer Vision, NLP, Robotics"
+SNIPPETS = ["vision paper", "language paper", "robot paper"]
+SINGLE_LABEL = "Robotics"
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+class _FakeCompletions:
+    """
+    批量请求 (提示里带 [1] 编号) 依次返回 batch_outputs，单篇请求固定返回 SINGLE_LABEL
+    """
+
+    def __init__(self, batch_outputs):
+        self.batch_outputs = list(batch_outputs)
+        self.batch_calls = 0
+        self.single_calls = 0
+
+    def create(self, model, messages, temperature):
+        if "[1]" in messages[0]["content"]:
+            self.batch_calls += 1
+            return _response(self.batch_outputs.pop(0))
+        self.single_calls += 1
+        return _response(SINGLE_LABEL)
+
+
+def _sync_client(tmp_path, batch_outputs):
+    client = LLMClient.__new__(LLMClient)
+    client.classify_cache = DiskCache(str(tmp_path / "classify.db"))
+    completions = _FakeCompletions(batch_outputs)
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client, completions
+
+
+@pytest.mark.parametrize("content, expected", [
+    ('{"1": "Computer Vision", "2": "NLP", "3": "Robotics"}', {0: "Computer Vision", 1: "NLP", 2: "Robotics"}),
+    ('```json\n{"1": "NLP", "2": "NLP"}\n```', {0: "NLP", 1: "NLP"}),
+    ('结果如下: {"[1]": " NLP ", "[2]": "Robotics"} 以上', {0: "NLP", 1: "Robotics"}),
+    ('["NLP", "Robotics", "Computer Vision"]', {0: "NLP", 1: "Robotics", 2: "Computer Vision"}),
+    ('["NLP", "Robotics"]', {0: "NLP", 1: "Robotics"}),
+    ('["NLP", "Robotics", "NLP", "NLP"]', {0: "NLP", 1: "Robotics", 2: "NLP"}),
+    ('{"1": "NLP", "2": "", "3": 5, "4": "NLP", "0": "NLP", "x": "NLP"}', {0: "NLP"}),
+    ("NLP\nRobotics\nComputer Vision", {}),
+    ('{"1": "NLP", ', {}),
+])
+def test_parse_batch_labels(content, expected):
+    assert _parse_batch_labels(content, 3) == expected
+
+
+def test_classify_papers_well_formed_uses_one_request(tmp_path):
+    client, completions = _sync_client(tmp_path, ['{"1": "computer vision", "2": "NLP", "3": "Robotics"}'])
+    assert client.classify_papers(SNIPPETS, TOPICS) == ["Computer Vision", "NLP", "Robotics"]
+    assert (completions.batch_calls, completions.single_calls) == (1, 0)
+
+    # 结果已缓存，再次分类不发请求
+    assert client.classify_papers(SNIPPETS, TOPICS) == ["Computer Vision", "NLP", "Robotics"]
+    assert (completions.batch_calls, completions.single_calls) == (1, 0)
+
+
+def test_classify_papers_falls_back_for_missing_and_misnumbered(tmp_path):
+    # 缺第 2 篇，另有一个越界的编号 5
+    client, completions = _sync_client(tmp_path, ['{"1": "NLP", "3": "Computer Vision", "5": "NLP"}'])
+    assert client.classify_papers(SNIPPETS, TOPICS) == ["NLP", SINGLE_LABEL, "Computer Vision"]
+    assert (completions.batch_calls, completions.single_calls) == (1, 1)
+
+
+def test_classify_papers_wrong_count_and_garbage(tmp_path):
+    # 第一批只返回两篇，第二批完全无法解析
+    client, completions = _sync_client(tmp_path, ['{"1": "NLP", "2": "NLP"}', "抱歉，我无法分类。"])
+    snippets = SNIPPETS + ["another vision paper", "another language paper"]
+    assert client.classify_papers(snippets, TOPICS, batch_size=3) == ["NLP", "NLP"] + [SINGLE_LABEL] * 3
+    assert (completions.batch_calls, completions.single_calls) == (2, 3)
+
+
+def test_async_classify_papers_falls_back_per_paper(tmp_path):
+    client = AsyncLLMClient.__new__(AsyncLLMClient)
+    client.classify_cache = DiskCache(str(tmp_path / "classify.db"))
+    completions = _FakeCompletions(['{"2": "NLP", "3": "NLP", "4": "NLP"}'])
+
+    async def complete(model, messages, temperature):
+        return completions.create(model, messages, temperature)
+
+    client._complete = complete
+    labels = asyncio.run(client.classify_papers(SNIPPETS, TOPICS))
+    assert labels == [SINGLE_LABEL, "NLP", "NLP"]
+    assert (completions.batch_calls, completions.single_calls) == (1, 1)
@@ -0,0 +1,80 @@
+import time
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("PIL")
+
+from src.config import Config
+from src.db_manager import DBManager
+
+
+class _SlowReranker:
+    def __init__(self, pair_seconds):
+        self.pair_seconds = pair_seconds
+        self.pairs = 0
+
+    def predict(self, pairs):
+        time.sleep(self.pair_seconds * len(pairs))
+        self.pairs += len(pairs)
+        return [-len(doc) for _, doc in pairs]
+
+
+def _results(count):
+    docs = ["x" * (count - i) for i in range(count)]
+    return {
+        "ids": [[f"c{i}" for i in range(count)]],
+        "documents": [docs],
+        "metadatas": [[{} for _ in range(count)]],
+        "distances": [[i / count for i in range(count)]],
+    }
+
+
+def test_batch_that_exceeds_budget_is_not_run(monkeypatch):
+    monkeypatch.setattr(Config, "RERANK_BATCH_SIZE", 16)
+    db = DBManager()
+    # 每条 10ms，20 个候选要 200ms，预算只有 50ms
+    db._reranker = _SlowReranker(0.01)
+
+    start = time.perf_counter()
+    result, complete = db._rerank("q", _results(20), 3, budget_ms=50)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    assert not complete
+    assert result["ids"] == [["c0", "c1", "c2"]]
+    assert elapsed_ms < 50
+    # 只打了测量用的一条
+    assert db._reranker.pairs == 1
+
+    # 单条耗时已知仍然很慢: 每次查询只多打一条重新测量，整批不会执行
+    result, complete = db._rerank("q", _results(20), 3, budget_ms=50)
+    assert not complete
+    assert db._reranker.pairs == 2
+
+
+def test_rerank_recovers_after_slow_measurement(monkeypatch):
+    monkeypatch.setattr(Config, "RERANK_BATCH_SIZE", 16)
+    db = DBManager()
+    # 一次偶然的慢测量 (如冷启动的第一次 predict)
+    db._reranker = _SlowReranker(0.01)
+    _, complete = db._rerank("q", _results(20), 3, budget_ms=50)
+    assert not complete
+
+    # 之后打分恢复正常，下一次查询重新测量后完成重排
+    db._reranker.pair_seconds = 0
+    result, complete = db._rerank("q", _results(20), 3, budget_ms=50)
+    assert complete
+    assert result["ids"] == [["c19", "c18", "c17"]]
+    assert db._reranker.pairs == 21
+
+
+def test_rerank_within_budget_reorders(monkeypatch):
+    monkeypatch.setattr(Config, "RERANK_BATCH_SIZE", 16)
+    db = DBManager()
+    db._reranker = _SlowReranker(0)
+
+    result, complete = db._rerank("q", _results(20), 3, budget_ms=1000)
+    assert complete
+    # 文档越短分数越高
+    assert result["ids"] == [["c19", "c18", "c17"]]
+    assert db._reranker.pairs == 20
@@ -0,0 +1,54 @@
+import pytest
+
+from src.config import Config
+from src.store_generation import StoreGenerations
+
+
+def test_generations_are_shared_between_instances(tmp_path):
+    path = str(tmp_path / "gen.db")
+    a = StoreGenerations(path)
+    b = StoreGenerations(path)
+    assert a.get("papers") == 0
+    assert b.bump("papers") == 1
+    assert b.bump("papers") == 2
+    assert a.get("papers") == 2
+    assert a.get("images") == 0
+
+
+class _CountingStore:
+    def __init__(self):
+        self.queries = 0
+
+    def query(self, query_embeddings, n_results, include=None):
+        self.queries += 1
+        return {
+            "ids": [[f"v{self.queries}"] for _ in query_embeddings],
+            "documents": [["d"] for _ in query_embeddings],
+            "metadatas": [[{}] for _ in query_embeddings],
+            "distances": [[0.0] for _ in query_embeddings],
+        }
+
+
+def test_result_cache_expires_after_write_in_another_manager(tmp_path, monkeypatch):
+    pytest.importorskip("numpy")
+    pytest.importorskip("PIL")
+    from src.db_manager import DBManager
+
+    monkeypatch.setattr(Config, "STORE_GENERATION_PATH", str(tmp_path / "gen.db"))
+    reader, writer = DBManager(), DBManager()
+    store = _CountingStore()
+
+    first = reader._cached_query("images", store, [1.0, 0.0], 3)
+    assert reader._cached_query("images", store, [1.0, 0.0], 3) == first
+    assert store.queries == 1
+
+    # 另一个进程 (这里是另一个 DBManager) 写入了 images，读方不再命中旧结果
+    writer._invalidate("images")
+    second = reader._cached_query("images", store, [1.0, 0.0], 3)
+    assert store.queries == 2
+    assert second["ids"] == [["v2"]]
+
+    # 其他集合的写入不影响
+    writer._invalidate("captions")
+    reader._cached_query("images", store, [1.0, 0.0], 3)
+    assert store.queries == 2
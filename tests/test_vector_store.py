@@ -0,0 +1,80 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from src.vector_store import NumpyVectorStore
+
+
+def _vec(i, dim=8):
+    v = np.zeros(dim, dtype=np.float32)
+    v[i % dim] = 1.0
+    return v.tolist()
+
+
+def test_two_instances_on_one_directory_do_not_overwrite_rows(tmp_path):
+    seed = NumpyVectorStore(str(tmp_path))
+    seed.upsert(["seed"], [_vec(0)], documents=["s"], metadatas=[{"k": 0}])
+
+    a = NumpyVectorStore(str(tmp_path))
+    b = NumpyVectorStore(str(tmp_path))
+    a.upsert(["from_a"], [_vec(1)], documents=["a"], metadatas=[{"k": 1}])
+    b.upsert(["from_b"], [_vec(2)], documents=["b"], metadatas=[{"k": 2}])
+
+    fresh = NumpyVectorStore(str(tmp_path))
+    for store in (a, b, fresh):
+        assert store.count() == 3
+        assert sorted(store.get()["ids"]) == ["from_a", "from_b", "seed"]
+        # 每个 id 的向量仍是自己写入的那一条
+        for i, doc_id in enumerate(["seed", "from_a", "from_b"]):
+            assert store.query([_vec(i)], n_results=1)["ids"] == [[doc_id]]
+
+
+def test_deletes_and_row_reuse_are_seen_by_other_instances(tmp_path):
+    a = NumpyVectorStore(str(tmp_path))
+    b = NumpyVectorStore(str(tmp_path))
+    a.upsert(["x", "y"], [_vec(0), _vec(1)])
+    assert b.count() == 2
+
+    b.delete(ids=["x"])
+    assert a.get()["ids"] == ["y"]
+    # 空位只被分配一次
+    a.upsert(["p"], [_vec(2)])
+    b.upsert(["q"], [_vec(3)])
+    for store in (a, b):
+        assert sorted(store.get()["ids"]) == ["p", "q", "y"]
+        assert store.query([_vec(3)], n_results=1)["ids"] == [["q"]]
+        assert store.query([_vec(2)], n_results=1)["ids"] == [["p"]]
+
+
+def test_capacity_growth_in_another_instance(tmp_path):
+    a = NumpyVectorStore(str(tmp_path))
+    b = NumpyVectorStore(str(tmp_path))
+    a.upsert(["first"], [_vec(0)])
+    assert b.count() == 1
+    ids = [f"id{i}" for i in range(3000)]
+    b.upsert(ids, [_vec(i) for i in range(3000)])
+    assert a.count() == 3001
+    assert a.get(ids=["id2999"], include=["embeddings"])["embeddings"][0] == pytest.approx(_vec(2999))
+
+
+def test_generation_changes_on_every_write(tmp_path):
+    a = NumpyVectorStore(str(tmp_path))
+    b = NumpyVectorStore(str(tmp_path))
+    before = b.generation()
+    a.upsert(["x"], [_vec(0)])
+    assert b.generation() > before
+
+
+def test_unfiltered_query_skips_deleted_rows_across_growth(tmp_path):
+    a = NumpyVectorStore(str(tmp_path))
+    b = NumpyVectorStore(str(tmp_path))
+    a.upsert([f"id{i}" for i in range(2000)], [_vec(i) for i in range(2000)])
+    a.delete(ids=[f"id{i}" for i in range(0, 2000, 8)])
+    # 另一个实例写入后扩容，两边的存活行掩码都要跟上
+    b.upsert([f"new{i}" for i in range(1500)], [_vec(0) for _ in range(1500)])
+
+    for store in (a, b):
+        assert store.count() == 2000 - 250 + 1500
+        hits = store.query([_vec(0)], n_results=5000)["ids"][0]
+        assert len(hits) == store.count()
+        assert not any(doc_id in hits for doc_id in ("id0", "id8", "id1992"))